@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 
+"""Print the chat messages for the box score page on stdin."""
+
+import argparse
+import contextlib
+import os
 import sys
+from typing import cast
 
-from lib import analyze
+from lib import analyze, extract, profiling
 
 
 # if (
@@ -15,8 +21,27 @@ from lib import analyze
 
 
 def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__)
+    _ = p.add_argument(
+        "--profile",
+        action="store_true",
+        help="profile the analysis with cProfile and tracemalloc",
+    )
+    _ = p.add_argument(
+        "--profile-dest",
+        default=profiling.dest,
+        help="directory or gs://bucket/prefix for profiles (default: %(default)s)",
+    )
+    args = p.parse_args()
+    backend = os.environ.get(extract.BACKEND_ENV_VAR, extract.DEFAULT_BACKEND)
     data = sys.stdin.read()
-    messages = analyze.analyze(data)
+    profile = (
+        profiling.profile("analyze_stdin", cast(str, args.profile_dest))
+        if cast(bool, args.profile)
+        else contextlib.nullcontext()
+    )
+    with profile:
+        messages = analyze.analyze(data, backend)
     if messages:
         print(" ".join(messages))
         # pc = pcweb.PcWeb("1000")
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+"""Run the current detectors over every stored box score.
+
+Writes one JSON line per game to OUTPUT. Rerunning with the same OUTPUT
+picks up where an interrupted run stopped.
+"""
+
+import argparse
+import os
+from pathlib import Path
+from typing import cast
+
+from lib import backfill, extract
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__)
+    _ = p.add_argument(
+        "source",
+        nargs="?",
+        default="gs://pc256-box-scores",
+        help="gs://bucket or a local directory (default: %(default)s)",
+    )
+    _ = p.add_argument("-o", "--output", type=Path, required=True, help="JSONL file")
+    _ = p.add_argument("--year", action="append", help="only this year (repeatable)")
+    _ = p.add_argument("--day", action="append", help="only this day (repeatable)")
+    _ = p.add_argument("--downloads", type=int, default=16, help="concurrent downloads")
+    _ = p.add_argument(
+        "--workers", type=int, default=None, help="analysis processes (default: CPUs)"
+    )
+    args = p.parse_args()
+    years = cast(list[str] | None, args.year)
+    days = cast(list[str] | None, args.day)
+    count = backfill.backfill(
+        backfill.source_for(cast(str, args.source)),
+        cast(Path, args.output),
+        years=set(years) if years else None,
+        days=set(days) if days else None,
+        downloads=cast(int, args.downloads),
+        workers=cast(int | None, args.workers),
+        backend=os.environ.get(extract.BACKEND_ENV_VAR, extract.DEFAULT_BACKEND),
+    )
+    print(f"analyzed {count} box scores")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+"""Time turning extracted tables into ProcessedData.
+
+Compares process_raw_tables, which uses decoders and totalers generated
+from the record schemas, with hand-written decoding that builds a dict per
+player and converts it field by field, as the code used to.
+"""
+
+import argparse
+import functools
+import re
+import sys
+import timeit
+from dataclasses import fields, replace
+from pathlib import Path
+from typing import TYPE_CHECKING, cast
+
+from lib import analyze, extract
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+def hand_batter(raw: dict[str, str], opponents: dict[str, str]) -> analyze.BatterRecord:
+    team = raw["Team"]
+    return analyze.BatterRecord(
+        Name=raw["Name"],
+        Pos=raw["Pos"],
+        Team=team,
+        Opponent=opponents[team],
+        H=(h := int(raw["H"])),
+        Double=(double := int(raw["2B"])),
+        Triple=(triple := int(raw["3B"])),
+        HR=(hr := int(raw["HR"])),
+        Single=h - double - triple - hr,
+        AB=int(raw["AB"]),
+        R=int(raw["R"]),
+        RBI=int(raw["RBI"]),
+        BB=int(raw["BB"]),
+        K=int(raw["K"]),
+        SH=int(raw["SH"]),
+        SB=int(raw["SB"]),
+        CS=int(raw["CS"]),
+        E=int(raw["E"]),
+        D=int(raw["D"]),
+    )
+
+
+def hand_pitcher(
+    raw: dict[str, str], opponents: dict[str, str]
+) -> analyze.PitcherRecord:
+    team = raw["Team"]
+    m = re.match(r"^(\d*)\.([0-9])(?:\.|$)", raw["IP"])
+    if not m:
+        msg = "Innings pitched didn't match regex"
+        raise analyze.BoxscoreError(msg)
+    innings, thirds = m.groups()
+    return analyze.PitcherRecord(
+        Name=raw["Name"],
+        Team=team,
+        Opponent=opponents[team],
+        OUT=int(innings) * 3 + int(thirds),
+        H=int(raw["H"]),
+        HR=int(raw["HR"]),
+        R=int(raw["R"]),
+        ER=int(raw["ER"]),
+        BB=int(raw["BB"]),
+        K=int(raw["K"]),
+        WP=int(raw["WP"]),
+        HB=int(raw["HB"]),
+        PC=int(raw["PC"]),
+    )
+
+
+def hand_total[T: (analyze.BatterRecord, analyze.PitcherRecord)](records: list[T]) -> T:
+    int_names = [f.name for f in fields(records[0]) if f.type is int]
+    strs = {f.name: "" for f in fields(records[0]) if f.type is not int}
+    return replace(
+        records[0],
+        **{name: sum(getattr(r, name) for r in records) for name in int_names},
+        **strs,
+    )
+
+
+def hand_rows(raw_table: extract.RawTable) -> list[dict[str, str]]:
+    players: list[dict[str, str]] = []
+    for team, row in analyze.player_rows(raw_table):
+        player = dict(zip(raw_table[0][1:], row[1:], strict=True))
+        player["Team"] = team
+        name, pos = analyze.split_name(row[0])
+        player["Name"] = name
+        if pos is not None:
+            player["Pos"] = pos
+        players.append(player)
+    return players
+
+
+def hand_process(raw_tables: list[extract.RawTable]) -> analyze.ProcessedData:
+    box_score, batting, pitching = analyze.box_score_tables(raw_tables)
+    lob_index = box_score[0].index("LOB")
+    nicknames = [row[0] for row in box_score[1:3]]
+    opponents = {nicknames[i]: nicknames[1 - i] for i in range(2)}
+    batters = [hand_batter(b, opponents) for b in hand_rows(batting)]
+    pitchers = [hand_pitcher(p, opponents) for p in hand_rows(pitching)]
+    return analyze.ProcessedData(
+        nicknames,
+        opponents,
+        [int(row[lob_index]) for row in box_score[1:3]],
+        batters,
+        {t: hand_total([b for b in batters if b.Team == t]) for t in nicknames},
+        pitchers,
+        {t: hand_total([p for p in pitchers if p.Team == t]) for t in nicknames},
+    )
+
+
+def process_all(
+    process: Callable[[list[extract.RawTable]], analyze.ProcessedData],
+    games: list[list[extract.RawTable]],
+) -> None:
+    for raw_tables in games:
+        _ = process(raw_tables)
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__)
+    _ = p.add_argument("-n", "--number", type=int, default=500, help="timing loops")
+    args = p.parse_args()
+    number = cast(int, args.number)
+    games = [
+        extract.extract_raw_tables(p.read_text())
+        for p in sorted(Path("testdata").glob("*_analyze_input.html"))
+    ]
+    if not games:
+        sys.exit("no testdata")
+    for raw_tables in games:
+        if hand_process(raw_tables) != analyze.process_raw_tables(raw_tables):
+            sys.exit("hand-written and generated decoding disagree")
+    scale = 1e6 / number / len(games)
+    for label, process in (
+        ("generated", analyze.process_raw_tables),
+        ("hand", hand_process),
+    ):
+        seconds = timeit.timeit(
+            functools.partial(process_all, process, games), number=number
+        )
+        print(f"{label:<10} {seconds * scale:>8.1f} us/game")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+"""Show how per-game detector cost grows with the number of rules.
+
+Pads the built-in rules with never-matching batter and pitcher rules and
+times Detectors.find_events_many over the testdata games, next to a naive
+engine that makes a separate pass over the players for every rule.
+"""
+
+import argparse
+import functools
+import sys
+import timeit
+from dataclasses import fields
+from pathlib import Path
+from typing import cast
+
+from lib import analyze, rules
+
+
+def padded(base: list[rules.Rule], extra: int) -> list[rules.Rule]:
+    return base + [
+        rules.Rule(f"pad {i}", f"H >= {100 + i}", "{Name}", screen=f"H >= {100 + i}")
+        for i in range(extra)
+    ]
+
+
+class PerRulePasses:
+    """Stand-in for hand-written detectors: one loop over the records per rule."""
+
+    def __init__(
+        self,
+        batter_rules: list[rules.Rule],
+        pitcher_rules: list[rules.Rule],
+        team_rules: list[rules.Rule],
+    ) -> None:
+        self.batter_detectors = [
+            rules.compile_detector([rule], field_names(analyze.BatterRecord))
+            for rule in batter_rules
+        ]
+        self.pitcher_detectors = [
+            rules.compile_detector([rule], field_names(analyze.PitcherRecord))
+            for rule in pitcher_rules
+        ]
+        self.team_detectors = [
+            rules.compile_detector([rule], field_names(analyze.TeamRecord))
+            for rule in team_rules
+        ]
+
+    def find_events(self, processed_data: analyze.ProcessedData) -> list[str]:
+        messages: list[str] = []
+        for detect in self.batter_detectors:
+            for batter in processed_data.batters:
+                detect(batter, messages)
+        for detect in self.pitcher_detectors:
+            for pitcher in processed_data.pitchers:
+                detect(pitcher, messages)
+        teams = analyze.team_records(processed_data)
+        for detect in self.team_detectors:
+            for team in teams:
+                detect(team, messages)
+        return messages
+
+    def find_events_many(self, games: list[analyze.ProcessedData]) -> list[list[str]]:
+        return [self.find_events(processed_data) for processed_data in games]
+
+
+def field_names(record_type: type) -> list[str]:
+    return [f.name for f in fields(record_type)]
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__)
+    _ = p.add_argument("-n", "--number", type=int, default=200, help="timing loops")
+    args = p.parse_args()
+    number = cast(int, args.number)
+    games = [
+        analyze.process_data(p.read_text())
+        for p in sorted(Path("testdata").glob("*_analyze_input.html"))
+    ]
+    if not games:
+        sys.exit("no testdata")
+    print(f"{'rules':>6} {'compiled us/game':>17} {'per-rule us/game':>17}")
+    for extra in (0, 10, 30, 100, 300):
+        batter_rules = padded(analyze.BATTER_RULES, extra // 2)
+        pitcher_rules = padded(analyze.PITCHER_RULES, extra - extra // 2)
+        rule_count = len(batter_rules) + len(pitcher_rules) + len(analyze.TEAM_RULES)
+        compiled = analyze.Detectors(batter_rules, pitcher_rules, analyze.TEAM_RULES)
+        naive = PerRulePasses(batter_rules, pitcher_rules, analyze.TEAM_RULES)
+        expected = analyze.DETECTORS.find_events_many(games)
+        if compiled.find_events_many(games) != expected:
+            sys.exit("padding rules changed the events")
+        compiled_us = timeit.timeit(
+            functools.partial(compiled.find_events_many, games), number=number
+        )
+        naive_us = timeit.timeit(
+            functools.partial(naive.find_events_many, games), number=number
+        )
+        scale = 1e6 / number / len(games)
+        print(f"{rule_count:>6} {compiled_us * scale:>17.1f} {naive_us * scale:>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+"""Check that every parser backend gives identical ProcessedData, and time them.
+
+Runs each backend over testdata/*_analyze_input.html plus every file in the
+given corpus directories (gzipped files are decompressed), compares
+asdict(process_data(...)) across backends, and reports per-backend parse time
+and peak allocation. Exits non-zero if any backend disagrees.
+"""
+
+import argparse
+import gzip
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict
+from pathlib import Path
+from typing import cast
+
+import bs4
+
+from lib import analyze, extract
+
+
+def read_box_score(path: Path) -> str:
+    raw = path.read_bytes()
+    if raw[:2] == b"\x1f\x8b":
+        raw = gzip.decompress(raw)
+    return raw.decode()
+
+
+def corpus_paths(dirs: list[Path]) -> list[Path]:
+    paths = sorted(Path("testdata").glob("*_analyze_input.html"))
+    for d in dirs:
+        paths.extend(sorted(p for p in d.iterdir() if p.is_file()))
+    return paths
+
+
+def outcome(data: str, backend: str) -> object:
+    try:
+        return asdict(analyze.process_data(data, backend))
+    except analyze.BoxscoreError as e:
+        return f"BoxscoreError: {e}"
+
+
+class Comparison:
+    def __init__(self, backends: list[str], repeat: int) -> None:
+        self.backends = backends
+        self.repeat = repeat
+        self.times: dict[str, list[float]] = {b: [] for b in backends}
+        self.peaks: dict[str, int] = dict.fromkeys(backends, 0)
+        self.unavailable: set[str] = set()
+        self.mismatches = 0
+
+    def run(self, path: Path) -> None:
+        data = read_box_score(path)
+        reference: object = None
+        reference_backend = None
+        for backend in self.backends:
+            if backend in self.unavailable:
+                continue
+            try:
+                actual = outcome(data, backend)
+            except bs4.FeatureNotFound as e:
+                print(f"{backend}: unavailable ({e})", file=sys.stderr)
+                self.unavailable.add(backend)
+                continue
+            if reference_backend is None:
+                reference, reference_backend = actual, backend
+            elif actual != reference:
+                print(f"MISMATCH {path}: {backend} differs from {reference_backend}")
+                self.mismatches += 1
+            best = float("inf")
+            for _ in range(self.repeat):
+                start = time.perf_counter()
+                _ = outcome(data, backend)
+                best = min(best, time.perf_counter() - start)
+            self.times[backend].append(best)
+            tracemalloc.start()
+            _ = outcome(data, backend)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.peaks[backend] = max(self.peaks[backend], peak)
+
+    def report(self) -> None:
+        print(f"{'backend':<12} {'median ms':>10} {'total ms':>10} {'peak KiB':>10}")
+        for backend in self.backends:
+            times = self.times[backend]
+            if not times:
+                continue
+            median_ms = statistics.median(times) * 1000
+            total_ms = sum(times) * 1000
+            peak_kib = self.peaks[backend] // 1024
+            print(f"{backend:<12} {median_ms:>10.2f} {total_ms:>10.1f} {peak_kib:>10}")
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description=__doc__)
+    _ = p.add_argument("corpus", nargs="*", type=Path, help="extra box score dirs")
+    _ = p.add_argument(
+        "-b",
+        "--backends",
+        default=",".join(dict.fromkeys([extract.DEFAULT_BACKEND, *extract.BACKENDS])),
+        help="comma-separated backends to compare, first available is the reference",
+    )
+    _ = p.add_argument("-r", "--repeat", type=int, default=3, help="timing runs")
+    args = p.parse_args()
+    backends = cast(str, args.backends).split(",")
+    for backend in backends:
+        _ = extract.get_backend(backend)
+
+    paths = corpus_paths(cast(list[Path], args.corpus))
+    comparison = Comparison(backends, cast(int, args.repeat))
+    for path in paths:
+        comparison.run(path)
+    print(f"{len(paths)} box scores")
+    comparison.report()
+    if comparison.mismatches:
+        print(f"{comparison.mismatches} mismatches")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,6 +12,11 @@ LOGS_BUCKET=gs://${PROJECT}_build-logs
 REPO=artifacts
 PYVER=3.14
 BASE_IMAGE=${LOCATION}-docker.pkg.dev/serverless-runtimes/google-24/runtimes/python${PYVER/./}
+# Requests Cloud Run sends an instance at once, up to the 8 gunicorn
+# threads. Above 1 it needs a whole CPU, about 5x the cost per instance:
+#   CONCURRENCY=8 CPU=1 ./deploy.sh
+CONCURRENCY=${CONCURRENCY:-1}
+CPU=${CPU:-0.2}
 
 TIMESTAMP="$(date -u +'%Y-%m-%dT%H:%M:%S.%NZ')"
 BUILD_LOG="/tmp/${PROJECT}-${SERVICE}-build-${TIMESTAMP}.log"
@@ -29,10 +34,10 @@ cd "$(realpath "$(dirname "${BASH_SOURCE[0]}")")" &&
 	   --base-image=${BASE_IMAGE} \
 	   --region=${LOCATION} \
            --no-allow-unauthenticated \
-	   --concurrency=1 \
+	   --concurrency=${CONCURRENCY} \
 	   --max-instances=5 \
 	   --timeout=900 \
-	   --cpu=0.2 \
+	   --cpu=${CPU} \
 	   --memory=256Mi \
 	   --cpu-boost \
 	   ${SERVICE} |& ts |& tee "${DEPLOY_LOG}" &&
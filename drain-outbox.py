@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+"""Post the chat messages process-box-score queued in PC_OUTBOX_PATH."""
+
+import argparse
+import os
+import time
+from pathlib import Path
+from typing import cast
+
+from lib import ledger, outbox, pcweb
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__)
+    _ = p.add_argument(
+        "outbox",
+        nargs="?",
+        type=Path,
+        default=os.environ.get("PC_OUTBOX_PATH"),
+        help="sqlite outbox file (default: $PC_OUTBOX_PATH)",
+    )
+    _ = p.add_argument(
+        "--ledger",
+        type=Path,
+        default=os.environ.get("PC_LEDGER_PATH"),
+        help="sqlite ledger of posted messages (default: $PC_LEDGER_PATH)",
+    )
+    _ = p.add_argument(
+        "--interval", type=float, default=2.0, help="seconds between chat posts"
+    )
+    _ = p.add_argument("--limit", type=int, default=100, help="items per drain")
+    _ = p.add_argument(
+        "--poll", type=float, help="keep draining, this many seconds apart"
+    )
+    args = p.parse_args()
+    path = cast(Path | None, args.outbox)
+    if path is None:
+        p.error("no outbox given and PC_OUTBOX_PATH is not set")
+    queue = outbox.SqliteOutbox(path)
+    ledger_path = cast(Path | None, args.ledger)
+    chat_ledger = ledger.SqliteLedger(ledger_path) if ledger_path else None
+    sessions = pcweb.SessionManager(store=pcweb.GcsSessionStore())
+    limiter = outbox.RateLimiter(cast(float, args.interval))
+    poll = cast(float | None, args.poll)
+    while True:
+        result = outbox.drain(
+            queue,
+            sessions,
+            limit=cast(int, args.limit),
+            limiter=limiter,
+            ledger=chat_ledger,
+        )
+        posted, already_sent = len(result.posted), len(result.already_sent)
+        print(
+            f"posted {posted}, already sent {already_sent}, failed {len(result.failed)}"
+        )
+        if poll is None:
+            break
+        time.sleep(poll)
+
+
+if __name__ == "__main__":
+    main()
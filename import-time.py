@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+"""Report what importing a module costs, and check it against its budget.
+
+For each module (by default, every module in tests/import_budget.json) this
+imports it in fresh interpreters under python -X importtime, prints its
+cumulative import time against its budget, and lists the imports that
+took longest themselves, indented by nesting as -X importtime does. Exits
+non-zero if any module is over budget. --record writes new budgets of
+twice the measured times.
+"""
+
+import argparse
+import json
+import math
+import sys
+from typing import cast
+
+from lib import importtime
+
+
+HEADROOM = 2.0  # --record allows this multiple of the measured time
+
+
+def report(module: str, times: dict[str, importtime.ImportTime], top: int) -> None:
+    print(f"{'self ms':>8} {'cumul ms':>9}  imported package")
+    slowest = sorted(times.values(), key=lambda t: t.self_us, reverse=True)[:top]
+    for t in slowest:
+        name = "  " * t.depth + t.module
+        print(f"{t.self_us / 1000:>8.1f} {t.cumulative_us / 1000:>9.1f}  {name}")
+    print(f"{module}: {len(times)} imports")
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description=__doc__)
+    _ = p.add_argument("modules", nargs="*", help="modules to import")
+    _ = p.add_argument("-t", "--top", type=int, default=15, help="imports to list")
+    _ = p.add_argument("-r", "--runs", type=int, default=3, help="imports to time")
+    _ = p.add_argument("--record", action="store_true", help="write new budgets")
+    args = p.parse_args()
+    record = cast(bool, args.record)
+    budgets = importtime.load_budgets()
+    modules = cast(list[str], args.modules) or sorted(budgets)
+    over = 0
+    for module in modules:
+        times = importtime.measure(module, cast(int, args.runs))
+        report(module, times, cast(int, args.top))
+        cumulative_us = times[module].cumulative_us
+        budget = budgets.get(module)
+        verdict = "no budget" if budget is None else f"budget {budget / 1000:.1f} ms"
+        if budget is not None and cumulative_us > budget:
+            verdict += ", OVER"
+            over += 1
+        print(f"{module}: {cumulative_us / 1000:.1f} ms ({verdict})\n")
+        if record:
+            # Rounded up to a whole 10 ms.
+            budgets[module] = math.ceil(cumulative_us * HEADROOM / 10_000) * 10_000
+    if record:
+        _ = importtime.BUDGET_PATH.write_text(json.dumps(budgets, indent=2) + "\n")
+        print(f"wrote {importtime.BUDGET_PATH}")
+        return 0
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
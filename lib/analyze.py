@@ -1,29 +1,56 @@
 import re
-from dataclasses import dataclass, fields, replace
+from dataclasses import dataclass, field, fields
+from typing import TYPE_CHECKING
 
-import bs4
+from lib import extract, rules, schema, timing
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+
+    from _typeshed import DataclassInstance
 
 
 NBSP = "\xa0"
 
+# Detector thresholds, shared by the rules and their screens.
+MULTI_HOME_RUN_MIN = 4
+STRIKEOUT_MIN = 18
+NO_HITTER_MAX_HITS = 0
 
-@dataclass
+
+class BoxscoreError(Exception):
+    pass
+
+
+def ip_to_outs(raw_ip: str) -> int:
+    """Convert innings pitched, e.g. "6.1" for 6 1/3, to outs."""
+    innings, dot, rest = raw_ip.partition(".")
+    if not (
+        dot and innings.isdecimal() and rest[:1].isdecimal() and rest[1:2] in {"", "."}
+    ):
+        msg = "Innings pitched didn't match regex"
+        raise BoxscoreError(msg)
+    return int(innings) * 3 + int(rest[0])
+
+
+@dataclass(slots=True)
 class PlayerRecord:
     Name: str
     Team: str
     Opponent: str
 
 
-@dataclass
+@dataclass(slots=True)
 class BatterRecord(PlayerRecord):
     Pos: str
     AB: int
     R: int
     H: int
     RBI: int
-    Single: int
-    Double: int
-    Triple: int
+    Single: int = field(metadata={schema.DERIVED: "H - Double - Triple - HR"})
+    Double: int = field(metadata={schema.COLUMN: "2B"})
+    Triple: int = field(metadata={schema.COLUMN: "3B"})
     HR: int
     BB: int
     K: int
@@ -34,9 +61,9 @@ class BatterRecord(PlayerRecord):
     D: int
 
 
-@dataclass
+@dataclass(slots=True)
 class PitcherRecord(PlayerRecord):
-    OUT: int
+    OUT: int = field(metadata={schema.COLUMN: "IP", schema.DECODE: ip_to_outs})
     H: int
     HR: int
     R: int
@@ -48,14 +75,9 @@ class PitcherRecord(PlayerRecord):
     PC: int
 
 
-class BoxscoreError(Exception):
-    pass
-
-
-def process_raw_table(raw_table: list[list[str]]) -> list[dict[str, str]]:
-    headers = raw_table[0].copy()
-    # Note: don't use the player text as a unique key. Hence we use an array not a map
-    players: list[dict[str, str]] = []
+def player_rows(raw_table: list[list[str]]) -> Iterator[tuple[str, list[str]]]:
+    """Yield (team, row) for each player row of a batting or pitching table."""
+    headers = raw_table[0]
     team: str | None = None
     for row in raw_table:
         if row[1:] == headers[1:]:
@@ -66,91 +88,66 @@ def process_raw_table(raw_table: list[list[str]]) -> list[dict[str, str]]:
             continue
         if not team:
             continue
-        player = dict(zip(headers[1:], row[1:], strict=True))
-        player["Team"] = team
-        raw_name = re.sub("^\xa0+[a-z]+-", "", row[0])
-        if raw_name.find(NBSP) > 0:
-            player["Name"], player["Pos"] = raw_name.split(NBSP, 1)
-        else:
-            player["Name"] = raw_name
-        players.append(player)
-    return players
-
-
-def make_batter(raw_batter: dict[str, str], opponents: dict[str, str]) -> BatterRecord:
-    team = raw_batter["Team"]
-    return BatterRecord(
-        Name=raw_batter["Name"],
-        Pos=raw_batter["Pos"],
-        Team=team,
-        Opponent=opponents[team],
-        H=(h := int(raw_batter["H"])),
-        Double=(double := int(raw_batter["2B"])),
-        Triple=(triple := int(raw_batter["3B"])),
-        HR=(hr := int(raw_batter["HR"])),
-        Single=h - double - triple - hr,
-        AB=int(raw_batter["AB"]),
-        R=int(raw_batter["R"]),
-        RBI=int(raw_batter["RBI"]),
-        BB=int(raw_batter["BB"]),
-        K=int(raw_batter["K"]),
-        SH=int(raw_batter["SH"]),
-        SB=int(raw_batter["SB"]),
-        CS=int(raw_batter["CS"]),
-        E=int(raw_batter["E"]),
-        D=int(raw_batter["D"]),
-    )
+        yield team, row
+
+
+def split_name(cell: str) -> tuple[str, str | None]:
+    """Split a player cell into the name and, for batters, the position."""
+    raw_name = re.sub("^\xa0+[a-z]+-", "", cell)
+    if raw_name.find(NBSP) > 0:
+        name, pos = raw_name.split(NBSP, 1)
+        return name, pos
+    return raw_name, None
+
+
+def make_batter(
+    decode: Callable[..., BatterRecord],
+    team: str,
+    row: list[str],
+    opponents: dict[str, str],
+) -> BatterRecord:
+    name, pos = split_name(row[0])
+    if pos is None:
+        msg = f"No position for batter {name!r}"
+        raise BoxscoreError(msg)
+    return decode(row, Name=name, Team=team, Opponent=opponents[team], Pos=pos)
 
 
 def make_pitcher(
-    raw_pitcher: dict[str, str], opponents: dict[str, str]
+    decode: Callable[..., PitcherRecord],
+    team: str,
+    row: list[str],
+    opponents: dict[str, str],
 ) -> PitcherRecord:
-    team = raw_pitcher["Team"]
-    raw_ip = raw_pitcher["IP"]
-    m = re.match(r"^(\d*)\.([0-9])(?:\.|$)", raw_ip)
-    if not m:
-        msg = "Innings pitched didn't match regex"
-        raise BoxscoreError(msg)
-    innings, thirds = m.groups()
-    out = int(innings) * 3 + int(thirds)
-    return PitcherRecord(
-        Name=raw_pitcher["Name"],
-        Team=team,
-        Opponent=opponents[team],
-        OUT=out,
-        H=int(raw_pitcher["H"]),
-        HR=int(raw_pitcher["HR"]),
-        R=int(raw_pitcher["R"]),
-        ER=int(raw_pitcher["ER"]),
-        BB=int(raw_pitcher["BB"]),
-        K=int(raw_pitcher["K"]),
-        WP=int(raw_pitcher["WP"]),
-        HB=int(raw_pitcher["HB"]),
-        PC=int(raw_pitcher["PC"]),
-    )
+    name, _ = split_name(row[0])
+    return decode(row, Name=name, Team=team, Opponent=opponents[team])
+
+
+def compile_decoder[T: DataclassInstance](
+    record_type: type[T], headers: list[str]
+) -> Callable[..., T]:
+    try:
+        return schema.compile_decoder(record_type, headers)
+    except schema.SchemaError as e:
+        raise BoxscoreError(str(e)) from None
+
+
+_total_batting = schema.compile_totaler(BatterRecord)
+_total_pitching = schema.compile_totaler(PitcherRecord)
 
 
 def get_team_batting_totals(batters: list[BatterRecord]) -> BatterRecord:
-    int_names = [f.name for f in fields(BatterRecord) if f.type is int]
-    return replace(
-        batters[0],
-        **{name: sum(getattr(b, name) for b in batters) for name in int_names},
-        Name="",
-        Pos="",
-        Team="",
-        Opponent="",
-    )
+    if not batters:
+        msg = "No batters for a team"
+        raise BoxscoreError(msg)
+    return _total_batting(batters)
 
 
 def get_team_pitching_totals(pitchers: list[PitcherRecord]) -> PitcherRecord:
-    int_names = [f.name for f in fields(PitcherRecord) if f.type is int]
-    return replace(
-        pitchers[0],
-        **{name: sum(getattr(b, name) for b in pitchers) for name in int_names},
-        Name="",
-        Team="",
-        Opponent="",
-    )
+    if not pitchers:
+        msg = "No pitchers for a team"
+        raise BoxscoreError(msg)
+    return _total_pitching(pitchers)
 
 
 @dataclass
@@ -164,21 +161,26 @@ class ProcessedData:
     team_pitching_totals: dict[str, PitcherRecord]
 
 
-def process_data(data: str) -> ProcessedData:
-    soup = bs4.BeautifulSoup(data, "html.parser")
-    html_tables = soup.select("table")
-    raw_tables = [
-        [
-            [cell.get_text() for cell in row.select("td")]
-            for row in html_table.select("tr")
-        ]
-        for html_table in html_tables[:3]
-    ]
+def box_score_tables(
+    raw_tables: list[extract.RawTable],
+) -> tuple[extract.RawTable, extract.RawTable, extract.RawTable]:
+    """Split out the line score, batting and pitching tables."""
     if len(raw_tables) < 3:  # noqa: PLR2004
         msg = f"Expected at least 3 top-level tables, found {len(raw_tables)}"
         raise BoxscoreError(msg)
+    box_score_raw_table, batting_raw_table, pitching_raw_table = raw_tables[:3]
+    return box_score_raw_table, batting_raw_table, pitching_raw_table
+
+
+def column_indexes(headers: list[str]) -> dict[str, int]:
+    """Map column names to indexes; if a name repeats, the last column wins."""
+    return {name: i for i, name in enumerate(headers) if i > 0}
 
-    box_score_raw_table, batting_raw_table, pitching_raw_table = raw_tables
+
+def process_raw_tables(raw_tables: list[extract.RawTable]) -> ProcessedData:
+    box_score_raw_table, batting_raw_table, pitching_raw_table = box_score_tables(
+        raw_tables
+    )
 
     lob_index = box_score_raw_table[0].index("LOB")
 
@@ -186,14 +188,21 @@ def process_data(data: str) -> ProcessedData:
     nicknames = [row[0] for row in box_score_raw_table[1:3]]
     opponents = {nicknames[i]: nicknames[1 - i] for i in range(2)}
     lob = [int(row[lob_index]) for row in box_score_raw_table[1:3]]
-    raw_batters = process_raw_table(batting_raw_table)
-    raw_pitchers = process_raw_table(pitching_raw_table)
-    batters = [make_batter(b, opponents) for b in raw_batters]
+    # Note: don't use the player text as a unique key. Hence we use an array not a map
+    decode_batter = compile_decoder(BatterRecord, batting_raw_table[0])
+    batters = [
+        make_batter(decode_batter, team, row, opponents)
+        for team, row in player_rows(batting_raw_table)
+    ]
     team_batting_totals = {
         team: get_team_batting_totals([b for b in batters if b.Team == team])
         for team in nicknames
     }
-    pitchers = [make_pitcher(b, opponents) for b in raw_pitchers]
+    decode_pitcher = compile_decoder(PitcherRecord, pitching_raw_table[0])
+    pitchers = [
+        make_pitcher(decode_pitcher, team, row, opponents)
+        for team, row in player_rows(pitching_raw_table)
+    ]
     team_pitching_totals = {
         team: get_team_pitching_totals([p for p in pitchers if p.Team == team])
         for team in nicknames
@@ -209,65 +218,209 @@ def process_data(data: str) -> ProcessedData:
     )
 
 
-def analyze(data: str) -> list[str]:
-    processed_data = process_data(data)
-    messages: list[str] = []
-    for batter in processed_data.batters:
-        opponent = batter.Opponent
-        if (
-            batter.Single > 0
-            and batter.Double > 0
-            and batter.Triple > 0
-            and batter.HR > 0
-        ):
-            messages.append(
-                (  # noqa: UP034
-                    f"{batter.Team}: {batter.Name} "
-                    f"hit for the cycle against the {opponent}!"
-                )
-            )
-        if batter.HR >= 4:  # noqa: PLR2004
-            messages.append(
-                (  # noqa: UP034
-                    f"{batter.Team}: {batter.Name} "
-                    f"hit {batter.HR} home runs against the {opponent}!"
-                )
-            )
+def process_data(data: str, backend: str = extract.DEFAULT_BACKEND) -> ProcessedData:
+    return process_raw_tables(extract.get_backend(backend)(data))
 
-    for pitcher in processed_data.pitchers:
-        opponent = pitcher.Opponent
-        if pitcher.K >= 18:  # noqa: PLR2004
-            messages.append(
-                (  # noqa: UP034
-                    f"{pitcher.Team}: {pitcher.Name} "
-                    f"struck out {pitcher.K} batters against the {opponent}"
-                )
-            )
+
+@dataclass
+class TeamRecord:
+    """How one team's pitchers fared in a game, for team rules."""
+
+    Team: str
+    Opponent: str
+    Pitchers: str
+    H: int  # hits allowed
+    E: int  # errors committed by the team's fielders
+    LOB: int  # opponent runners left on base
+    BB: int
+    HB: int
+
+
+def team_records(processed_data: ProcessedData) -> list[TeamRecord]:
+    records: list[TeamRecord] = []
     for index in range(2):
         pitching_index = index
         batting_index = 1 - index
         pitching_team = processed_data.nicknames[pitching_index]
         batting_team = processed_data.nicknames[batting_index]
-        hit_count = processed_data.team_batting_totals[batting_team].H
-        if hit_count <= 0:
-            pitchers_str = " and ".join(
-                [p.Name for p in processed_data.pitchers if p.Team == pitching_team]
-            )
-            if (
-                processed_data.team_batting_totals[pitching_team].E == 0
-                and processed_data.lob[batting_index] == 0
-                and processed_data.team_pitching_totals[pitching_team].BB == 0
-                and processed_data.team_pitching_totals[pitching_team].HB == 0
-            ):
-                game = "perfect game"
-            else:
-                game = ("no-" if hit_count == 0 else f"{hit_count}-") + "hitter"
-            messages.append(
-                (  # noqa: UP034
-                    f"{pitching_team}: {pitchers_str} "
-                    f"threw a {game} against the {batting_team}!"
-                )
+        records.append(
+            TeamRecord(
+                Team=pitching_team,
+                Opponent=batting_team,
+                Pitchers=" and ".join(
+                    p.Name for p in processed_data.pitchers if p.Team == pitching_team
+                ),
+                H=processed_data.team_batting_totals[batting_team].H,
+                E=processed_data.team_batting_totals[pitching_team].E,
+                LOB=processed_data.lob[batting_index],
+                BB=processed_data.team_pitching_totals[pitching_team].BB,
+                HB=processed_data.team_pitching_totals[pitching_team].HB,
             )
-    # messages.append(pprint.pformat(team_batting_totals))
-    # messages.append(pprint.pformat(team_pitching_totals))
-    return messages
+        )
+    return records
+
+
+PERFECT = "E == 0 and LOB == 0 and BB == 0 and HB == 0"
+BATTER_RULES = [
+    # A single, double, triple and home run take at least four hits.
+    rules.Rule(
+        "cycle",
+        "Single > 0 and Double > 0 and Triple > 0 and HR > 0",
+        "{Team}: {Name} hit for the cycle against the {Opponent}!",
+        screen="HR >= 1 and H >= 4",
+    ),
+    rules.Rule(
+        "home runs",
+        f"HR >= {MULTI_HOME_RUN_MIN}",
+        "{Team}: {Name} hit {HR} home runs against the {Opponent}!",
+        screen=f"HR >= {MULTI_HOME_RUN_MIN}",
+    ),
+]
+PITCHER_RULES = [
+    rules.Rule(
+        "strikeouts",
+        f"K >= {STRIKEOUT_MIN}",
+        "{Team}: {Name} struck out {K} batters against the {Opponent}",
+        screen=f"K >= {STRIKEOUT_MIN}",
+    )
+]
+TEAM_RULES = [
+    rules.Rule(
+        "perfect game",
+        f"H == 0 and {PERFECT}",
+        "{Team}: {Pitchers} threw a perfect game against the {Opponent}!",
+        screen="H == 0",
+    ),
+    rules.Rule(
+        "no-hitter",
+        f"H == 0 and not ({PERFECT})",
+        "{Team}: {Pitchers} threw a no-hitter against the {Opponent}!",
+        screen="H == 0",
+    ),
+    rules.Rule(
+        "few-hitter",
+        f"0 < H <= {NO_HITTER_MAX_HITS}",
+        "{Team}: {Pitchers} threw a {H}-hitter against the {Opponent}!",
+        screen=f"H <= {NO_HITTER_MAX_HITS}",
+    ),
+]
+
+
+def _field_names(record_type: type) -> list[str]:
+    return [f.name for f in fields(record_type)]
+
+
+class Detectors:
+    """Rules for batters, pitchers and teams, each set compiled to one function.
+
+    find_events makes one pass over each of a game's record sets whatever the
+    number of rules. Screens for the batting and pitching rules name raw
+    columns of those tables; team rule screens can only use H, the hits
+    allowed, which is summed from the batting table.
+    """
+
+    def __init__(
+        self,
+        batter_rules: list[rules.Rule],
+        pitcher_rules: list[rules.Rule],
+        team_rules: list[rules.Rule],
+    ) -> None:
+        self._detect_batter = rules.compile_detector(
+            batter_rules, _field_names(BatterRecord)
+        )
+        self._detect_pitcher = rules.compile_detector(
+            pitcher_rules, _field_names(PitcherRecord)
+        )
+        self._detect_team = rules.compile_detector(team_rules, _field_names(TeamRecord))
+        self._screen_batter = rules.compile_screen(
+            batter_rules, schema.direct_columns(BatterRecord)
+        )
+        self._screen_pitcher = rules.compile_screen(
+            pitcher_rules, schema.direct_columns(PitcherRecord)
+        )
+        self._screen_team = rules.compile_screen(team_rules, ["H"])
+
+    def could_have_events(self, raw_tables: list[extract.RawTable]) -> bool:
+        """Cheaply decide whether any rule could match, without building records.
+
+        This is the first phase of analyze(). It evaluates the rules' screens
+        against exactly the rows process_raw_tables turns into records, and
+        a screen must hold whenever its rule does, so a False result means
+        find_events would report nothing.
+        """
+        box_score_raw_table, batting_raw_table, pitching_raw_table = box_score_tables(
+            raw_tables
+        )
+        # Sum hits like team_batting_totals does; nothing guarantees the line
+        # score's H column agrees.
+        team_hits = {row[0]: 0 for row in box_score_raw_table[1:3]}
+        batting_columns = column_indexes(batting_raw_table[0])
+        h_index = batting_columns["H"]
+        for team, row in player_rows(batting_raw_table):
+            if self._screen_batter(row, batting_columns):
+                return True
+            if team in team_hits:
+                team_hits[team] += int(row[h_index])
+        if any(self._screen_team((h,), {"H": 0}) for h in team_hits.values()):
+            return True
+        pitching_columns = column_indexes(pitching_raw_table[0])
+        return any(
+            self._screen_pitcher(row, pitching_columns)
+            for _, row in player_rows(pitching_raw_table)
+        )
+
+    def find_events(self, processed_data: ProcessedData) -> list[str]:
+        messages: list[str] = []
+        for batter in processed_data.batters:
+            self._detect_batter(batter, messages)
+        for pitcher in processed_data.pitchers:
+            self._detect_pitcher(pitcher, messages)
+        for team in team_records(processed_data):
+            self._detect_team(team, messages)
+        return messages
+
+    def find_events_many(self, games: Iterable[ProcessedData]) -> list[list[str]]:
+        return [self.find_events(processed_data) for processed_data in games]
+
+
+DETECTORS = Detectors(BATTER_RULES, PITCHER_RULES, TEAM_RULES)
+
+
+def could_have_events(raw_tables: list[extract.RawTable]) -> bool:
+    return DETECTORS.could_have_events(raw_tables)
+
+
+def find_events(processed_data: ProcessedData) -> list[str]:
+    return DETECTORS.find_events(processed_data)
+
+
+# Object metadata set by store-in-gcs when it analyzed the box score and
+# sent the chat entries itself, leaving process-box-score nothing to do.
+ANALYZED_METADATA_KEY = "analyzed"
+
+
+@dataclass
+class Analysis:
+    """What analyze() found; processed_data is None if the game was screened out."""
+
+    processed_data: ProcessedData | None
+    messages: list[str]
+
+
+def analyze_raw_tables(raw_tables: list[extract.RawTable]) -> Analysis:
+    if not could_have_events(raw_tables):
+        timing.note(screened_out=True)
+        return Analysis(None, [])
+    with timing.span("decode"):
+        processed_data = process_raw_tables(raw_tables)
+    with timing.span("detect"):
+        messages = find_events(processed_data)
+    return Analysis(processed_data, messages)
+
+
+def analyze_fully(data: str, backend: str = extract.DEFAULT_BACKEND) -> Analysis:
+    return analyze_raw_tables(extract.get_backend(backend)(data))
+
+
+def analyze(data: str, backend: str = extract.DEFAULT_BACKEND) -> list[str]:
+    return analyze_fully(data, backend).messages
@@ -0,0 +1,228 @@
+"""Re-analyze stored box scores in bulk, resuming where a previous run stopped.
+
+Games whose object metadata holds an encoded ProcessedData (see
+lib/codec.py) are analyzed from that, without downloading the HTML.
+The listing is streamed, so memory doesn't grow with the bucket.
+
+The output file doubles as the checkpoint: each finished game is appended
+as one JSON line and flushed, and a rerun with the same output skips every
+game already in it, without downloading it again.
+"""
+
+import collections
+import concurrent.futures
+import gzip
+import json
+import sys
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Protocol, cast
+
+from lib import analyze, batch, codec, extract
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    from google.cloud.storage import Client as StorageClient
+
+
+METADATA_SUFFIX = ".metadata.json"
+
+
+@dataclass(frozen=True)
+class GameRef:
+    name: str
+    year: str | None
+    day: str | None
+    pdata: str | None = None  # still encoded; see codec.from_metadata
+
+
+@dataclass
+class BackfillResult:
+    name: str
+    year: str | None
+    day: str | None
+    messages: list[str] | None
+    error: str | None
+
+
+class BoxScoreSource(Protocol):
+    def list_games(self) -> Iterable[GameRef]: ...
+
+    def read(self, ref: GameRef) -> str: ...
+
+
+def game_ref(name: str, metadata: dict[str, str]) -> GameRef:
+    return GameRef(
+        name,
+        metadata.get("year"),
+        metadata.get("day"),
+        metadata.get(codec.METADATA_KEY),
+    )
+
+
+class GcsSource:
+    """Box scores in a bucket, with year and day from the object metadata."""
+
+    def __init__(self, bucket_name: str, client: StorageClient | None = None) -> None:
+        if client is None:
+            from google.cloud.storage import Client  # noqa: PLC0415
+
+            client = Client()
+        self.client = client
+        self.bucket = client.bucket(bucket_name)
+
+    def list_games(self) -> Iterator[GameRef]:
+        for blob in self.client.list_blobs(self.bucket):
+            yield game_ref(cast(str, blob.name), blob.metadata or {})
+
+    def read(self, ref: GameRef) -> str:
+        return self.bucket.blob(ref.name).download_as_text()
+
+
+class LocalSource:
+    """A directory of box scores, plain or gzipped, standing in for the bucket.
+
+    Metadata for ``<name>`` is read from ``<name>.metadata.json`` if present.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    def list_games(self) -> Iterator[GameRef]:
+        for path in sorted(self.root.iterdir()):
+            if not path.is_file() or path.name.endswith(METADATA_SUFFIX):
+                continue
+            metadata_path = path.with_name(path.name + METADATA_SUFFIX)
+            metadata: dict[str, str] = {}
+            if metadata_path.exists():
+                metadata = cast(dict[str, str], json.loads(metadata_path.read_text()))
+            yield game_ref(path.name, metadata)
+
+    def read(self, ref: GameRef) -> str:
+        raw = (self.root / ref.name).read_bytes()
+        if raw[:2] == b"\x1f\x8b":
+            raw = gzip.decompress(raw)
+        return raw.decode()
+
+
+def source_for(location: str) -> BoxScoreSource:
+    """gs://bucket for a bucket, anything else for a local directory."""
+    if location.startswith("gs://"):
+        return GcsSource(location.removeprefix("gs://").rstrip("/"))
+    return LocalSource(Path(location))
+
+
+def completed(output: Path) -> set[str]:
+    """Names of the games already recorded in output.
+
+    A last line left unfinished by an interrupted run is cut off, so the
+    next record appended starts on a line of its own.
+    """
+    if not output.exists():
+        return set()
+    names: set[str] = set()
+    with output.open() as f:
+        for line in f:
+            try:
+                record = cast(dict[str, object], json.loads(line))
+            except json.JSONDecodeError:
+                continue  # a line cut short by an interrupted run
+            names.add(cast(str, record["name"]))
+    data = output.read_bytes()
+    if data and not data.endswith(b"\n"):
+        with output.open("r+b") as f:
+            _ = f.truncate(data.rfind(b"\n") + 1)
+    return names
+
+
+def select(
+    refs: Iterable[GameRef],
+    done: set[str],
+    years: set[str] | None = None,
+    days: set[str] | None = None,
+) -> Iterator[GameRef]:
+    for ref in refs:
+        if ref.name in done:
+            continue
+        if years is not None and ref.year not in years:
+            continue
+        if days is not None and ref.day not in days:
+            continue
+        yield ref
+
+
+def download(
+    source: BoxScoreSource, refs: Iterable[GameRef], concurrency: int
+) -> Iterator[tuple[GameRef, str]]:
+    """Yield (ref, html) with at most concurrency downloads in flight.
+
+    Failed downloads are reported and skipped, so a rerun retries them.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending: collections.deque[tuple[GameRef, concurrent.futures.Future[str]]]
+        pending = collections.deque()
+
+        def drain_one() -> Iterator[tuple[GameRef, str]]:
+            ref, future = pending.popleft()
+            try:
+                yield ref, future.result()
+            except Exception as e:  # noqa: BLE001
+                print(f"{ref.name}: download failed: {e}", file=sys.stderr)
+
+        for ref in refs:
+            pending.append((ref, executor.submit(source.read, ref)))
+            if len(pending) >= concurrency:
+                yield from drain_one()
+        while pending:
+            yield from drain_one()
+
+
+def backfill(  # noqa: PLR0913
+    source: BoxScoreSource,
+    output: Path,
+    *,
+    years: set[str] | None = None,
+    days: set[str] | None = None,
+    downloads: int = 8,
+    workers: int | None = None,
+    backend: str = extract.DEFAULT_BACKEND,
+) -> int:
+    """Analyze every selected game not yet in output; return how many were added."""
+    done = completed(output)
+    # Only the games downloaded and being analyzed are held, by name.
+    in_flight: dict[str, GameRef] = {}
+    count = 0
+    with output.open("a") as f:
+
+        def write(ref: GameRef, messages: list[str] | None, error: str | None) -> None:
+            nonlocal count
+            record = BackfillResult(ref.name, ref.year, ref.day, messages, error)
+            _ = f.write(json.dumps(asdict(record)) + "\n")
+            f.flush()
+            count += 1
+
+        def unparsed() -> Iterator[GameRef]:
+            """Analyze each game with a usable pdata; yield the others."""
+            for ref in select(source.list_games(), done, years, days):
+                processed_data = None
+                if ref.pdata is not None:
+                    processed_data = codec.from_metadata(
+                        {codec.METADATA_KEY: ref.pdata}
+                    )
+                if processed_data is not None:
+                    write(ref, analyze.find_events(processed_data), None)
+                else:
+                    yield ref
+
+        def games() -> Iterator[batch.Game]:
+            for ref, data in download(source, unparsed(), downloads):
+                in_flight[ref.name] = ref
+                yield ref.name, data
+
+        for result in batch.analyze_many(
+            games(), workers=workers, ordered=False, backend=backend
+        ):
+            write(in_flight.pop(result.game_id), result.value, result.error)
+    return count
@@ -0,0 +1,139 @@
+"""Analyze many box scores, fanned out over a process pool."""
+
+import collections
+import concurrent.futures
+import itertools
+import os
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from lib import analyze, extract
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+
+
+type Game = tuple[str, str]  # (game_id, html)
+
+
+@dataclass
+class GameResult[T]:
+    """The outcome for one game: a value, or the error that stopped it."""
+
+    game_id: str
+    value: T | None = None
+    error: str | None = None
+
+
+def _run[T](
+    func: Callable[[str, str], T], chunk: list[Game], backend: str
+) -> list[GameResult[T]]:
+    results: list[GameResult[T]] = []
+    for game_id, data in chunk:
+        try:
+            results.append(GameResult(game_id, value=func(data, backend)))
+        # A malformed box score can fail anywhere in parsing; keep it from
+        # taking the rest of the batch down with it.
+        except Exception as e:  # noqa: BLE001
+            results.append(GameResult(game_id, error=f"{type(e).__name__}: {e}"))
+    return results
+
+
+def _analyze_chunk(chunk: list[Game], backend: str) -> list[GameResult[list[str]]]:
+    return _run(analyze.analyze, chunk, backend)
+
+
+def _process_chunk(
+    chunk: list[Game], backend: str
+) -> list[GameResult[analyze.ProcessedData]]:
+    return _run(analyze.process_data, chunk, backend)
+
+
+def _fan_out[T](  # noqa: PLR0913
+    worker: Callable[[list[Game], str], list[GameResult[T]]],
+    games: Iterable[Game],
+    *,
+    workers: int | None,
+    chunksize: int,
+    ordered: bool,
+    backend: str,
+) -> Iterator[GameResult[T]]:
+    _ = extract.get_backend(backend)
+    chunks = itertools.batched(games, chunksize, strict=False)
+    if workers is None:
+        workers = os.process_cpu_count() or 1
+    if workers <= 1:
+        for chunk in chunks:
+            yield from worker(list(chunk), backend)
+        return
+    # Keep a couple of chunks queued per worker rather than submitting the
+    # whole input, so a season of box scores isn't held in memory at once.
+    max_pending = workers * 2
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: collections.deque[concurrent.futures.Future[list[GameResult[T]]]]
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append(executor.submit(worker, list(chunk), backend))
+            while len(pending) >= max_pending:
+                yield from _next_done(pending, ordered)
+        while pending:
+            yield from _next_done(pending, ordered)
+
+
+def _next_done[T](
+    pending: collections.deque[concurrent.futures.Future[list[GameResult[T]]]],
+    ordered: bool,  # noqa: FBT001
+) -> list[GameResult[T]]:
+    if ordered:
+        return pending.popleft().result()
+    done, _ = concurrent.futures.wait(
+        pending, return_when=concurrent.futures.FIRST_COMPLETED
+    )
+    future = next(iter(done))
+    pending.remove(future)
+    return future.result()
+
+
+def analyze_many(
+    games: Iterable[Game],
+    *,
+    workers: int | None = None,
+    chunksize: int = 8,
+    ordered: bool = True,
+    backend: str = extract.DEFAULT_BACKEND,
+) -> Iterator[GameResult[list[str]]]:
+    """Stream analyze() results for (game_id, html) pairs.
+
+    Games are sent to a pool of worker processes (default: one per CPU,
+    1 runs everything in this process) chunksize at a time. Results come
+    back in input order if ordered, otherwise as soon as each chunk is
+    done. A game that fails yields a result with error set.
+    """
+    return _fan_out(
+        _analyze_chunk,
+        games,
+        workers=workers,
+        chunksize=chunksize,
+        ordered=ordered,
+        backend=backend,
+    )
+
+
+def process_many(
+    games: Iterable[Game],
+    *,
+    workers: int | None = None,
+    chunksize: int = 8,
+    ordered: bool = True,
+    backend: str = extract.DEFAULT_BACKEND,
+) -> Iterator[GameResult[analyze.ProcessedData]]:
+    """Stream process_data() results, as analyze_many does for analyze()."""
+    return _fan_out(
+        _process_chunk,
+        games,
+        workers=workers,
+        chunksize=chunksize,
+        ordered=ordered,
+        backend=backend,
+    )
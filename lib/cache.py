@@ -0,0 +1,175 @@
+"""Remember analysis results so identical box scores aren't parsed twice.
+
+Entries are keyed by content (content_key, a hash of the box score, or
+gzip_content_key, a hash of it still compressed) or by object
+(object_key, bucket/name/generation, which lets a redelivered event skip
+the download too). An in-process LRU holds recent entries; an optional
+sqlite file keeps them across restarts on the same disk.
+
+An entry is only good for the rules that produced it. The sqlite file
+records the VERSION it was written with, and is emptied when opened with
+another, so a change to the rules runs on pages cached before it.
+"""
+
+import collections
+import hashlib
+import pickle
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, cast
+
+from lib import analyze, codec
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from pathlib import Path
+
+
+def analysis_version() -> str:
+    """Fingerprint what an Analysis depends on besides the page itself.
+
+    That is the rules, thresholds included, and the records they read.
+    """
+    rule_sets = (analyze.BATTER_RULES, analyze.PITCHER_RULES, analyze.TEAM_RULES)
+    inputs = repr((rule_sets, codec.VERSION, codec.SCHEMA))
+    return hashlib.sha256(inputs.encode()).hexdigest()[:16]
+
+
+VERSION = analysis_version()
+GZIP_HEADER_SIZE = 10
+GZIP_FHCRC, GZIP_FEXTRA, GZIP_FNAME, GZIP_FCOMMENT = 2, 4, 8, 16
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+
+
+def content_key(data: str | bytes | Iterable[bytes]) -> str:
+    """Hash a box score, given whole or as chunks of its UTF-8 encoding."""
+    if isinstance(data, str):
+        data = data.encode()
+    if isinstance(data, bytes):
+        return "sha256:" + hashlib.sha256(data).hexdigest()
+    digest = hashlib.sha256()
+    for chunk in data:
+        digest.update(chunk)
+    return "sha256:" + digest.hexdigest()
+
+
+def gzip_content_key(data: bytes) -> str:
+    """Hash a gzip-compressed box score without inflating it.
+
+    The header, which holds a timestamp, is left out, so copies compressed
+    at different times by the same compressor share a key. The same page
+    compressed differently gets another key; that only costs a miss.
+    """
+    flags = data[3] if len(data) > GZIP_HEADER_SIZE else 0
+    start = GZIP_HEADER_SIZE
+    if flags & GZIP_FEXTRA:
+        start += 2 + int.from_bytes(data[start : start + 2], "little")
+    for flag in (GZIP_FNAME, GZIP_FCOMMENT):
+        if flags & flag:
+            start = data.index(b"\0", start) + 1
+    if flags & GZIP_FHCRC:
+        start += 2
+    return "gzip-sha256:" + hashlib.sha256(data[start:]).hexdigest()
+
+
+def object_key(bucket_name: str, blob_name: str, generation: int) -> str:
+    return f"gs://{bucket_name}/{blob_name}#{generation}"
+
+
+class AnalysisCache:
+    """A bounded LRU of analyze.Analysis entries, optionally backed by sqlite.
+
+    Safe to share between threads.
+    """
+
+    def __init__(
+        self, max_entries: int = 256, path: Path | None = None, version: str = VERSION
+    ) -> None:
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._entries: collections.OrderedDict[str, analyze.Analysis] = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._open(version)
+
+    def _open(self, version: str) -> None:
+        db = cast(sqlite3.Connection, self._db)
+        with db:
+            _ = db.execute(
+                "CREATE TABLE IF NOT EXISTS analyses (key TEXT PRIMARY KEY, value BLOB)"
+            )
+            _ = db.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            row = cast(
+                tuple[str] | None,
+                db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone(),
+            )
+            if row is None or row[0] != version:
+                # Written for other rules; their verdicts may be wrong now.
+                _ = db.execute("DELETE FROM analyses")
+                _ = db.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('version', ?)", (version,)
+                )
+
+    def get(self, key: str) -> analyze.Analysis | None:
+        with self._lock:
+            analysis = self._entries.get(key)
+            if analysis is not None:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return analysis
+            analysis = self._load(key)
+            if analysis is None:
+                self.stats.misses += 1
+                return None
+            self.stats.disk_hits += 1
+            self._remember(key, analysis)
+            return analysis
+
+    def put(self, analysis: analyze.Analysis, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._remember(key, analysis)
+                self._store(key, analysis)
+
+    def _remember(self, key: str, analysis: analyze.Analysis) -> None:
+        self._entries[key] = analysis
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            _ = self._entries.popitem(last=False)
+
+    def _load(self, key: str) -> analyze.Analysis | None:
+        if self._db is None:
+            return None
+        row = cast(
+            tuple[bytes] | None,
+            self._db.execute(
+                "SELECT value FROM analyses WHERE key = ?", (key,)
+            ).fetchone(),
+        )
+        if row is None:
+            return None
+        # Only this class writes the file, from objects it built itself.
+        return cast(analyze.Analysis, pickle.loads(row[0]))  # noqa: S301
+
+    def _store(self, key: str, analysis: analyze.Analysis) -> None:
+        if self._db is None:
+            return
+        with self._db:
+            _ = self._db.execute(
+                "INSERT OR REPLACE INTO analyses VALUES (?, ?)",
+                (key, pickle.dumps(analysis)),
+            )
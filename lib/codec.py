@@ -0,0 +1,234 @@
+"""A compact binary encoding of ProcessedData.
+
+Layout, all little-endian:
+
+- header: magic ``PCBX``, version (u8), schema fingerprint (u32)
+- string table: count (u16), then per string its UTF-8 length (u16) and bytes
+- game: away and home nicknames as string indexes (u16), their LOB (i16)
+- batters, then pitchers: count (u16), then per record one struct of its
+  fields in declaration order, str fields as string indexes (u16) and int
+  fields as i16
+- team batting totals, then team pitching totals: the same, each record
+  preceded by its team's string index (u16)
+
+opponents isn't stored; it follows from the nicknames. Any change to the
+layout must bump VERSION, and decode rejects other versions. The schema
+fingerprint covers the records: it changes with their field names, order
+and types, so decode also rejects encodings of records that have since
+changed, which would otherwise decode into the wrong fields.
+
+A box score's encoding is kept base64'd in its object metadata under
+METADATA_KEY, about 1.6 KB, well inside the 8 KiB custom metadata limit.
+"""
+
+import base64
+import operator
+import struct
+import zlib
+from dataclasses import fields
+from typing import TYPE_CHECKING, cast
+
+from lib import analyze
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from _typeshed import DataclassInstance
+
+
+MAGIC = b"PCBX"
+VERSION = 2
+METADATA_KEY = "pdata"
+
+_HEADER = struct.Struct("<4sBI")
+_U16 = struct.Struct("<H")
+_GAME = struct.Struct("<HHhh")
+
+
+class CodecError(ValueError):
+    pass
+
+
+class _RecordCodec[T: DataclassInstance]:
+    def __init__(self, record_type: type[T]) -> None:
+        self.record_type = record_type
+        record_fields = fields(record_type)
+        is_str = [f.type in {str, "str"} for f in record_fields]
+        self.str_positions = [i for i, s in enumerate(is_str) if s]
+        self.struct = struct.Struct("<" + "".join("H" if s else "h" for s in is_str))
+        self.get_values = cast(
+            "Callable[[T], tuple[str | int, ...]]",
+            operator.attrgetter(*(f.name for f in record_fields)),
+        )
+
+    def pack(self, record: T, intern: Callable[[str], int]) -> bytes:
+        values = list(self.get_values(record))
+        for i in self.str_positions:
+            values[i] = intern(cast(str, values[i]))
+        return self.struct.pack(*values)
+
+    def unpack(self, data: bytes, offset: int, strings: list[str]) -> T:
+        values = cast(list[str | int], list(self.struct.unpack_from(data, offset)))
+        for i in self.str_positions:
+            values[i] = strings[cast(int, values[i])]
+        return self.record_type(*values)
+
+
+def fingerprint(*record_types: type[DataclassInstance]) -> int:
+    """CRC-32 of the record types' field names and kinds, in order."""
+    layout = ";".join(
+        record_type.__name__
+        + ":"
+        + ",".join(
+            f"{f.name}={'str' if f.type in {str, 'str'} else 'int'}"
+            for f in fields(record_type)
+        )
+        for record_type in record_types
+    )
+    return zlib.crc32(layout.encode())
+
+
+_BATTER = _RecordCodec(analyze.BatterRecord)
+_PITCHER = _RecordCodec(analyze.PitcherRecord)
+SCHEMA = fingerprint(analyze.BatterRecord, analyze.PitcherRecord)
+
+
+class _Writer:
+    def __init__(self) -> None:
+        self.strings: dict[str, int] = {}
+        self.body = bytearray()
+
+    def intern(self, s: str) -> int:
+        return self.strings.setdefault(s, len(self.strings))
+
+    def records[T: DataclassInstance](
+        self, codec: _RecordCodec[T], records: list[T]
+    ) -> None:
+        self.body += _U16.pack(len(records))
+        for record in records:
+            self.body += codec.pack(record, self.intern)
+
+    def totals[T: DataclassInstance](
+        self, codec: _RecordCodec[T], totals: dict[str, T]
+    ) -> None:
+        self.body += _U16.pack(len(totals))
+        for team, record in totals.items():
+            self.body += _U16.pack(self.intern(team))
+            self.body += codec.pack(record, self.intern)
+
+    def finish(self) -> bytes:
+        data = bytearray(_HEADER.pack(MAGIC, VERSION, SCHEMA))
+        data += _U16.pack(len(self.strings))
+        for s in self.strings:
+            encoded = s.encode()
+            data += _U16.pack(len(encoded))
+            data += encoded
+        return bytes(data + self.body)
+
+
+class _Reader:
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        magic, version, schema = cast(
+            tuple[bytes, int, int], _HEADER.unpack_from(data, 0)
+        )
+        if magic != MAGIC:
+            msg = "not an encoded ProcessedData"
+            raise CodecError(msg)
+        if version != VERSION:
+            msg = f"unsupported version {version}, expected {VERSION}"
+            raise CodecError(msg)
+        if schema != SCHEMA:
+            msg = f"records have changed since encoding (schema {schema:#x})"
+            raise CodecError(msg)
+        self.offset = _HEADER.size
+        self.strings: list[str] = []
+        for _ in range(self.u16()):
+            length = self.u16()
+            self.strings.append(data[self.offset : self.offset + length].decode())
+            self.offset += length
+
+    def u16(self) -> int:
+        (value,) = cast(tuple[int], _U16.unpack_from(self.data, self.offset))
+        self.offset += _U16.size
+        return value
+
+    def unpack(self, s: struct.Struct) -> tuple[int, ...]:
+        values = cast(tuple[int, ...], s.unpack_from(self.data, self.offset))
+        self.offset += s.size
+        return values
+
+    def record[T: DataclassInstance](self, codec: _RecordCodec[T]) -> T:
+        record = codec.unpack(self.data, self.offset, self.strings)
+        self.offset += codec.struct.size
+        return record
+
+    def records[T: DataclassInstance](self, codec: _RecordCodec[T]) -> list[T]:
+        return [self.record(codec) for _ in range(self.u16())]
+
+    def totals[T: DataclassInstance](self, codec: _RecordCodec[T]) -> dict[str, T]:
+        totals: dict[str, T] = {}
+        for _ in range(self.u16()):
+            team = self.strings[self.u16()]
+            totals[team] = self.record(codec)
+        return totals
+
+
+def encode(processed_data: analyze.ProcessedData) -> bytes:
+    if len(processed_data.nicknames) != 2 or len(processed_data.lob) != 2:  # noqa: PLR2004
+        msg = "expected exactly two teams"
+        raise CodecError(msg)
+    writer = _Writer()
+    away, home = processed_data.nicknames
+    try:
+        writer.body += _GAME.pack(
+            writer.intern(away), writer.intern(home), *processed_data.lob
+        )
+        writer.records(_BATTER, processed_data.batters)
+        writer.records(_PITCHER, processed_data.pitchers)
+        writer.totals(_BATTER, processed_data.team_batting_totals)
+        writer.totals(_PITCHER, processed_data.team_pitching_totals)
+        return writer.finish()
+    except struct.error as e:
+        msg = f"value out of range: {e}"
+        raise CodecError(msg) from None
+
+
+def decode(data: bytes) -> analyze.ProcessedData:
+    try:
+        reader = _Reader(data)
+        away, home, away_lob, home_lob = reader.unpack(_GAME)
+        nicknames = [reader.strings[away], reader.strings[home]]
+        processed_data = analyze.ProcessedData(
+            nicknames=nicknames,
+            opponents={nicknames[0]: nicknames[1], nicknames[1]: nicknames[0]},
+            lob=[away_lob, home_lob],
+            batters=reader.records(_BATTER),
+            pitchers=reader.records(_PITCHER),
+            team_batting_totals=reader.totals(_BATTER),
+            team_pitching_totals=reader.totals(_PITCHER),
+        )
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        msg = f"corrupt encoding: {e}"
+        raise CodecError(msg) from None
+    if reader.offset != len(data):
+        msg = f"{len(data) - reader.offset} trailing bytes"
+        raise CodecError(msg)
+    return processed_data
+
+
+def to_metadata(processed_data: analyze.ProcessedData) -> str:
+    return base64.b64encode(encode(processed_data)).decode()
+
+
+def from_metadata(metadata: dict[str, str] | None) -> analyze.ProcessedData | None:
+    """Return the ProcessedData stored in object metadata, if there is a usable one."""
+    if not metadata or METADATA_KEY not in metadata:
+        return None
+    try:
+        return decode(base64.b64decode(metadata[METADATA_KEY], validate=True))
+    except (CodecError, ValueError) as e:
+        # Written by another version, say; the HTML is still there.
+        print(f"ignoring stored {METADATA_KEY}: {e}")
+        return None
@@ -0,0 +1,367 @@
+import codecs
+import contextlib
+import html
+import re
+import zlib
+from html.parser import HTMLParser
+from typing import TYPE_CHECKING, override
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+
+
+type RawTable = list[list[str]]
+
+# Markup before the first table: comments, script and style elements with
+# their contents, declarations and end tags, and start tags, whose quoted
+# attribute values may hold a ">". Matching these whole keeps a "<table"
+# inside any of them from being taken for the first table. The possessive
+# quantifiers keep a tag that hasn't ended yet from backtracking.
+PREFIX_MARKUP_RE = re.compile(
+    r"""<!--.*?-->
+    |<(script|style)(?=[\s/>])(?:[^>"']++|"[^"]*+"|'[^']*+')*+>.*?</\1(?=[\s/>])
+    |<[!?/][^>]*+>
+    |<([a-z][^\s/>]*+)(?:[^>"']++|"[^"]*+"|'[^']*+')*+>""",
+    re.IGNORECASE | re.DOTALL | re.VERBOSE,
+)
+# A "<" that starts markup; html.parser takes any other "<" as text.
+MARKUP_START_RE = re.compile(r"<[a-z!?/]", re.IGNORECASE)
+
+# Elements html.parser (and hence BeautifulSoup) treats as already closed.
+VOID_ELEMENTS = frozenset(
+    {
+        "area",
+        "base",
+        "br",
+        "col",
+        "embed",
+        "hr",
+        "img",
+        "input",
+        "link",
+        "meta",
+        "param",
+        "source",
+        "track",
+        "wbr",
+    }
+)
+# Elements whose text BeautifulSoup's get_text() leaves out.
+NON_TEXT_ELEMENTS = frozenset({"script", "style", "template"})
+
+
+def find_table_start(data: str, *, final: bool = True) -> tuple[int | None, int]:
+    """Find the first table start tag in data, skipping markup before it.
+
+    Returns the tag's offset, or None and the offset of any markup still
+    unfinished at the end of data, which more input may complete. Unless
+    final, the caller keeps data from there to search again with more.
+    """
+    pos = 0
+    while (lt := data.find("<", pos)) >= 0:
+        m = PREFIX_MARKUP_RE.match(data, lt)
+        if m is None:
+            if not final and (lt == len(data) - 1 or MARKUP_START_RE.match(data, lt)):
+                return None, lt
+            pos = lt + 1
+        elif m[2] is None:
+            pos = m.end()
+        elif m[2].lower() == "table":
+            return lt, lt
+        elif m[2].lower() in {"script", "style"}:
+            # Only its start tag has arrived; the rest is raw text to its end.
+            return None, len(data) if final else lt
+        else:
+            pos = m.end()
+    return None, len(data)
+
+
+type _Collected = list[list[list[str]]] | list[list[str]] | list[str]
+
+
+class _TablesCompleteError(Exception):
+    """Raised from a handler to abandon the rest of the current chunk."""
+
+
+class TableExtractor(HTMLParser):
+    """Incrementally collect td text from the first few tables of a page.
+
+    Equivalent to
+    ``[[[td.get_text() for td in tr.select("td")] for tr in table.select("tr")]
+    for table in BeautifulSoup(data, "html.parser").select("table")[:count]]``
+    but without building a tree: input before the first table is only
+    scanned (find_table_start) for comments, script and style elements and
+    tags, only the text of cells inside the wanted tables is kept, and
+    input after the last wanted table closes is ignored.
+
+    Like BeautifulSoup, an end tag closes every element opened after the most
+    recent element with the same name, and end tags with no matching open
+    element are ignored.
+    """
+
+    def __init__(self, table_count: int = 3) -> None:
+        super().__init__(convert_charrefs=True)
+        self.table_count = table_count
+        self.done = False
+        self._tables: list[list[list[list[str]]]] = []
+        self._started = False
+        self._unscanned: str = ""
+        # Each open element, with the rows (table), cells (tr) or text
+        # fragments (td) it is collecting, or None if it collects nothing.
+        self._stack: list[tuple[str, _Collected | None]] = []
+        self._open_tables: list[list[list[list[str]]]] = []
+        self._open_rows: list[list[list[str]]] = []
+        self._open_cells: list[list[str]] = []
+        self._non_text_depth = 0
+
+    @override
+    def feed(self, data: str) -> None:
+        if self.done:
+            return
+        if not self._started:
+            data = self._unscanned + data
+            start, unfinished = find_table_start(data, final=False)
+            if start is None:
+                self._unscanned = data[unfinished:]
+                return
+            self._started = True
+            self._unscanned = ""
+            data = data[start:]
+        try:
+            super().feed(data)
+        except _TablesCompleteError:
+            self.done = True
+
+    @override
+    def close(self) -> None:
+        if self._started and not self.done:
+            with contextlib.suppress(_TablesCompleteError):
+                super().close()
+        self.done = True
+
+    @property
+    def raw_tables(self) -> list[RawTable]:
+        return [
+            [["".join(cell) for cell in row] for row in table] for table in self._tables
+        ]
+
+    @override
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        if tag in VOID_ELEMENTS:
+            return
+        if tag == "table" and len(self._tables) < self.table_count:
+            rows: list[list[list[str]]] = []
+            self._tables.append(rows)
+            self._open_tables.append(rows)
+            self._stack.append((tag, rows))
+        elif tag == "tr" and self._open_tables:
+            cells: list[list[str]] = []
+            for table in self._open_tables:
+                table.append(cells)
+            self._open_rows.append(cells)
+            self._stack.append((tag, cells))
+        elif tag == "td" and self._open_rows:
+            fragments: list[str] = []
+            for row in self._open_rows:
+                row.append(fragments)
+            self._open_cells.append(fragments)
+            self._stack.append((tag, fragments))
+        else:
+            if tag in NON_TEXT_ELEMENTS:
+                self._non_text_depth += 1
+            self._stack.append((tag, None))
+
+    @override
+    def handle_endtag(self, tag: str) -> None:
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                break
+        else:
+            return
+        while len(self._stack) > i:
+            self._pop()
+        if len(self._tables) == self.table_count and not self._open_tables:
+            raise _TablesCompleteError
+
+    @override
+    def handle_data(self, data: str) -> None:
+        if self._non_text_depth:
+            return
+        for fragments in self._open_cells:
+            fragments.append(data)
+
+    def _pop(self) -> None:
+        tag, collected = self._stack.pop()
+        if collected is None:
+            if tag in NON_TEXT_ELEMENTS:
+                self._non_text_depth -= 1
+        elif tag == "table":
+            _ = self._open_tables.pop()
+        elif tag == "tr":
+            _ = self._open_rows.pop()
+        else:
+            _ = self._open_cells.pop()
+
+
+def extract_raw_tables(data: str, table_count: int = 3) -> list[RawTable]:
+    extractor = TableExtractor(table_count)
+    extractor.feed(data)
+    extractor.close()
+    return extractor.raw_tables
+
+
+def extract_raw_tables_from_chunks(
+    chunks: Iterable[bytes], table_count: int = 3, encoding: str = "utf-8"
+) -> list[RawTable]:
+    """Like extract_raw_tables, for a page arriving as encoded chunks.
+
+    Stops pulling chunks once the tables are complete, so with a lazy
+    iterable (inflate(), say) the rest of the page is never produced.
+    """
+    extractor = TableExtractor(table_count)
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    for chunk in chunks:
+        extractor.feed(decoder.decode(chunk))
+        if extractor.done:
+            break
+    else:
+        extractor.feed(decoder.decode(b"", final=True))
+    extractor.close()
+    return extractor.raw_tables
+
+
+GZIP_WBITS = zlib.MAX_WBITS | 16
+INFLATE_CHUNK = 16 * 1024
+
+
+def inflate(data: bytes, chunk_size: int = INFLATE_CHUNK) -> Iterator[bytes]:
+    """Decompress gzip data lazily, at most chunk_size bytes at a time."""
+    decompressor = zlib.decompressobj(wbits=GZIP_WBITS)
+    pending = data
+    while not decompressor.eof:
+        chunk = decompressor.decompress(pending, chunk_size)
+        pending = decompressor.unconsumed_tail
+        if chunk:
+            yield chunk
+        elif not pending:
+            msg = "truncated gzip data"
+            raise zlib.error(msg)
+
+
+def extract_chunks(backend: str, chunks: Iterable[bytes]) -> list[RawTable]:
+    """Run the named backend over an encoded page.
+
+    Only "stream" parses as the chunks arrive; the others need the page
+    joined and decoded first.
+    """
+    if backend == "stream":
+        return extract_raw_tables_from_chunks(chunks)
+    return get_backend(backend)(b"".join(chunks).decode(errors="replace"))
+
+
+def _soup_tables(data: str, features: str, table_count: int) -> list[RawTable]:
+    # Only the BeautifulSoup backends need bs4, so don't pay to import it
+    # unless one of them is selected.
+    import bs4  # noqa: PLC0415
+
+    soup = bs4.BeautifulSoup(data, features)
+    return [
+        [[cell.get_text() for cell in row.select("td")] for row in table.select("tr")]
+        for table in soup.select("table")[:table_count]
+    ]
+
+
+def extract_with_html_parser(data: str, table_count: int = 3) -> list[RawTable]:
+    """Build a full BeautifulSoup tree with html.parser; the original path."""
+    return _soup_tables(data, "html.parser", table_count)
+
+
+def extract_with_lxml(data: str, table_count: int = 3) -> list[RawTable]:
+    """Build a full BeautifulSoup tree with lxml, which must be installed."""
+    return _soup_tables(data, "lxml", table_count)
+
+
+# Comments are matched whole so that the tags in them are skipped.
+FAST_TOKEN_RE = re.compile(
+    r"<!--.*?-->|<(/?)(table|tr|td)(?=[\s/>])[^>]*>", re.IGNORECASE | re.DOTALL
+)
+FAST_UNSUPPORTED_RE = re.compile(r"<(?:script|style|template)[\s>]", re.IGNORECASE)
+FAST_MARKUP_RE = re.compile(r"<!--.*?-->|<[^>]*>", re.DOTALL)
+
+
+def _cell_text(data: str) -> str:
+    return html.unescape(FAST_MARKUP_RE.sub("", data))
+
+
+def extract_fast(data: str, table_count: int = 3) -> list[RawTable]:  # noqa: C901,PLR0911,PLR0912
+    """Scan for table, tr and td tags without a general tokenizer.
+
+    Handles the markup Pennant Chase box scores actually use: flat tables
+    whose cells are closed explicitly or by the end of their row. Anything
+    else (nested tables, rows or cells, scripts inside a table, a table left
+    open) falls back to TableExtractor so all backends agree.
+    """
+    tables: list[RawTable] = []
+    rows: RawTable | None = None
+    cells: list[str] | None = None
+    cell_start: int | None = None
+    start, _ = find_table_start(data)
+    if start is None:
+        return []
+    for m in FAST_TOKEN_RE.finditer(data, start):
+        if m[2] is None:  # a comment
+            continue
+        closing, tag = m[1], m[2].lower()
+        if rows is None:
+            if tag != "table" or closing:
+                continue
+            table_end = data.find("</table", m.end())
+            if table_end < 0 or FAST_UNSUPPORTED_RE.search(data, m.end(), table_end):
+                return extract_raw_tables(data, table_count)
+            rows = []
+            continue
+        if tag == "table" and not closing:
+            return extract_raw_tables(data, table_count)
+        if not closing and cell_start is not None:
+            # A td or tr inside an open cell nests rather than closing it.
+            return extract_raw_tables(data, table_count)
+        if cell_start is not None and cells is not None:
+            cells.append(_cell_text(data[cell_start : m.start()]))
+            cell_start = None
+        if tag == "table":
+            tables.append(rows)
+            if len(tables) == table_count:
+                break
+            rows = cells = None
+        elif tag == "tr":
+            if closing:
+                cells = None
+            elif cells is not None:
+                return extract_raw_tables(data, table_count)
+            else:
+                cells = []
+                rows.append(cells)
+        elif not closing and cells is not None:
+            cell_start = m.end()
+    if rows is not None and len(tables) < table_count:
+        return extract_raw_tables(data, table_count)
+    return tables
+
+
+BACKENDS: dict[str, Callable[[str], list[RawTable]]] = {
+    "html.parser": extract_with_html_parser,
+    "lxml": extract_with_lxml,
+    "stream": extract_raw_tables,
+    "fast": extract_fast,
+}
+DEFAULT_BACKEND = "stream"
+BACKEND_ENV_VAR = "PC_PARSER_BACKEND"
+
+
+def get_backend(name: str) -> Callable[[str], list[RawTable]]:
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        msg = f"Unknown parser backend {name!r}, expected one of {sorted(BACKENDS)}"
+        raise ValueError(msg) from None
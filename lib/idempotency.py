@@ -0,0 +1,119 @@
+"""Recognize redelivered events before doing any work for them.
+
+Eventarc delivers at least once. Both services record a key for each
+event they finish (its CloudEvent id, plus the Firestore document path
+or the GCS object generation it is about) and skip events whose keys
+they have seen. An in-process TTL cache answers most repeats; a Backend,
+such as SqliteBackend, remembers keys across restarts.
+"""
+
+import collections
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, Protocol, cast
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+
+TTL = 24 * 60 * 60.0  # Eventarc retries for at most a day
+
+
+def event_key(source: str, event_id: str) -> str:
+    return f"event:{source}#{event_id}"
+
+
+def document_key(path: str) -> str:
+    return f"document:{path}"
+
+
+def object_key(bucket_name: str, blob_name: str, generation: int | str) -> str:
+    return f"object:gs://{bucket_name}/{blob_name}#{generation}"
+
+
+class Backend(Protocol):
+    def seen(self, keys: tuple[str, ...], now: float) -> bool:
+        """Whether any of keys was recorded and hasn't expired."""
+        ...
+
+    def record(self, keys: tuple[str, ...], now: float, expires: float) -> None: ...
+
+
+class SqliteBackend:
+    def __init__(self, path: Path | str = ":memory:") -> None:
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._db:
+            _ = self._db.execute(
+                "CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY, expires REAL)"
+            )
+
+    def seen(self, keys: tuple[str, ...], now: float) -> bool:
+        marks = ", ".join("?" * len(keys))
+        with self._lock:
+            row = cast(
+                tuple[int],
+                self._db.execute(
+                    f"SELECT count(*) FROM seen WHERE key IN ({marks}) AND expires > ?",  # noqa: S608
+                    (*keys, now),
+                ).fetchone(),
+            )
+        return row[0] > 0
+
+    def record(self, keys: tuple[str, ...], now: float, expires: float) -> None:
+        with self._lock, self._db:
+            _ = self._db.executemany(
+                "INSERT OR REPLACE INTO seen VALUES (?, ?)",
+                [(key, expires) for key in keys],
+            )
+            _ = self._db.execute("DELETE FROM seen WHERE expires <= ?", (now,))
+
+
+class Idempotency:
+    """Keys of finished events, kept for ttl seconds.
+
+    At most max_entries keys are held in memory, the oldest dropped first;
+    a backend, if any, holds them all. Safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        ttl: float = TTL,
+        max_entries: int = 4096,
+        backend: Backend | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.backend = backend
+        self.clock = clock
+        self._expires: collections.OrderedDict[str, float] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def seen(self, *keys: str) -> bool:
+        now = self.clock()
+        with self._lock:
+            for key in keys:
+                expires = self._expires.get(key)
+                if expires is None:
+                    continue
+                if expires > now:
+                    return True
+                del self._expires[key]
+        return self.backend is not None and self.backend.seen(keys, now)
+
+    def record(self, *keys: str) -> None:
+        """Remember that the event with these keys is done."""
+        now = self.clock()
+        expires = now + self.ttl
+        with self._lock:
+            for key in keys:
+                self._expires[key] = expires
+                self._expires.move_to_end(key)
+            while len(self._expires) > self.max_entries:
+                _ = self._expires.popitem(last=False)
+        if self.backend is not None:
+            self.backend.record(keys, now, expires)
@@ -0,0 +1,64 @@
+"""Measure module import times, as reported by python -X importtime.
+
+Each measurement imports the module in a fresh interpreter, so modules the
+caller has already imported don't hide any of the cost. Cold starts pay
+import time on nearly every game event, so tests/import_budget.json records
+a budget for the modules the services import first.
+"""
+
+import json
+import re
+import subprocess
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import cast
+
+
+ROOT = Path(__file__).resolve().parent.parent
+BUDGET_PATH = ROOT / "tests" / "import_budget.json"
+LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+@dataclass(frozen=True)
+class ImportTime:
+    module: str
+    depth: int  # how deeply nested the import is, 0 for the module itself
+    self_us: int
+    cumulative_us: int
+
+
+def parse(report: str) -> dict[str, ImportTime]:
+    """Read the -X importtime lines from report, keyed by module."""
+    times: dict[str, ImportTime] = {}
+    for m in LINE_RE.finditer(report):
+        self_us, cumulative_us, indent, module = m.groups()
+        depth = len(indent) // 2
+        times[module] = ImportTime(module, depth, int(self_us), int(cumulative_us))
+    return times
+
+
+def measure(module: str, runs: int = 3) -> dict[str, ImportTime]:
+    """Import module runs times, each fresh, and keep the fastest of each import.
+
+    An extra first run writes any missing .pyc files, which a deployed
+    image already has.
+    """
+    best: dict[str, ImportTime] = {}
+    for _ in range(runs + 1):
+        result = subprocess.run(  # noqa: S603
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        for name, t in parse(result.stderr).items():
+            if name not in best or t.cumulative_us < best[name].cumulative_us:
+                best[name] = t
+    return best
+
+
+def load_budgets(path: Path = BUDGET_PATH) -> dict[str, int]:
+    """Return the import time budget for each module, in microseconds."""
+    return cast(dict[str, int], json.loads(path.read_text()))
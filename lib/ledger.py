@@ -0,0 +1,102 @@
+"""A record of posted chat messages, so each is posted once.
+
+Before posting, a poster takes a lease on the message's key; once the
+post succeeds it marks the key posted. A redelivered event then finds the
+key posted without fetching the chat page, and a second instance racing
+the first can't take the lease while it is held. A poster that crashes
+mid-post holds the lease only until it expires, and the chat page check
+that follows catches a post that did get through.
+
+SqliteLedger covers everything sharing a disk. Instances on separate
+machines need a shared store (Firestore, say) behind the Ledger protocol.
+"""
+
+import hashlib
+import sqlite3
+import threading
+from typing import TYPE_CHECKING, Protocol, cast
+
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+LEASE = 5 * 60.0  # seconds; far longer than a chat post takes
+
+
+def key(league_id: str, game_id: str | None, message: str) -> str:
+    digest = hashlib.sha256(message.encode()).hexdigest()
+    return f"{league_id}/{game_id or ''}/{digest}"
+
+
+class Ledger(Protocol):
+    def posted(self, key: str) -> bool: ...
+
+    def acquire(self, key: str, owner: str, now: float, lease: float = LEASE) -> bool:
+        """Take or renew the lease on an unposted key; False if posted or held."""
+        ...
+
+    def mark_posted(self, key: str, now: float) -> None: ...
+
+    def release(self, key: str, owner: str) -> None:
+        """Give up a lease without posting, so the next attempt needn't wait."""
+        ...
+
+
+class SqliteLedger:
+    """A Ledger in a sqlite file, or in memory by default."""
+
+    def __init__(self, path: Path | str = ":memory:") -> None:
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._db:
+            _ = self._db.execute("""
+                CREATE TABLE IF NOT EXISTS ledger (
+                    key TEXT PRIMARY KEY,
+                    owner TEXT,
+                    lease_until REAL,
+                    posted REAL
+                )
+            """)
+
+    def posted(self, key: str) -> bool:
+        with self._lock:
+            row = cast(
+                tuple[float | None] | None,
+                self._db.execute(
+                    "SELECT posted FROM ledger WHERE key = ?", (key,)
+                ).fetchone(),
+            )
+        return row is not None and row[0] is not None
+
+    def acquire(self, key: str, owner: str, now: float, lease: float = LEASE) -> bool:
+        with self._lock, self._db:
+            # One statement, so it is atomic across processes too.
+            cursor = self._db.execute(
+                """
+                INSERT INTO ledger (key, owner, lease_until) VALUES (?, ?, ?)
+                ON CONFLICT (key) DO UPDATE
+                SET owner = excluded.owner, lease_until = excluded.lease_until
+                WHERE posted IS NULL AND (lease_until <= ? OR owner = excluded.owner)
+                """,
+                (key, owner, now + lease, now),
+            )
+            return cursor.rowcount == 1
+
+    def mark_posted(self, key: str, now: float) -> None:
+        with self._lock, self._db:
+            _ = self._db.execute(
+                """
+                INSERT INTO ledger (key, posted) VALUES (?, ?)
+                ON CONFLICT (key) DO UPDATE
+                SET posted = excluded.posted, owner = NULL, lease_until = NULL
+                """,
+                (key, now),
+            )
+
+    def release(self, key: str, owner: str) -> None:
+        with self._lock, self._db:
+            _ = self._db.execute(
+                "DELETE FROM ledger WHERE key = ? AND owner = ? AND posted IS NULL",
+                (key, owner),
+            )
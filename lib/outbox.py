@@ -0,0 +1,264 @@
+"""Queue chat posts so box score processing doesn't wait on Pennant Chase.
+
+process_box_score adds each game's ChatEntry list to an Outbox; drain(),
+run separately (drain-outbox.py), posts whatever is due. One drain covers
+many games with a single login and chat fetch per league, spaces out the
+posts, and retries failures with backoff.
+
+SqliteOutbox keeps the queue in a local file. Anything implementing the
+Outbox protocol, a Firestore collection say, can stand in for it.
+"""
+
+import functools
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Protocol, Self, cast
+
+from lib import ledger as ledger_lib
+from lib import pcweb
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+    from lib.ledger import Ledger
+
+
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 60.0  # seconds, doubled after each failed attempt
+
+
+@dataclass(frozen=True)
+class OutboxItem:
+    item_id: int
+    league_id: str
+    game: str
+    entry: pcweb.ChatEntry
+    attempts: int = 0
+
+
+class Outbox(Protocol):
+    def add(self, league_id: str, game: str, entries: Iterable[pcweb.ChatEntry]) -> int:
+        """Queue entries, ignoring any already queued for the game; return how many."""
+        ...
+
+    def due(self, now: float, limit: int) -> list[OutboxItem]:
+        """Return up to limit unsent items ready to try, oldest first."""
+        ...
+
+    def sent(self, item_id: int, now: float) -> None: ...
+
+    def failed(self, item_id: int, error: str, retry_at: float | None) -> None:
+        """Record a failed attempt; retry_at None means stop trying."""
+        ...
+
+
+class SqliteOutbox:
+    """An Outbox in a sqlite file, shareable between threads and processes."""
+
+    def __init__(self, path: Path) -> None:
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._db:
+            _ = self._db.execute("PRAGMA journal_mode=WAL")
+            # next_attempt is NULL once the item is sent or given up on.
+            _ = self._db.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    item_id INTEGER PRIMARY KEY,
+                    league_id TEXT NOT NULL,
+                    game TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    trailing_whitespace INTEGER NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt REAL,
+                    sent REAL,
+                    error TEXT,
+                    UNIQUE (league_id, game, message, trailing_whitespace)
+                )
+            """)
+
+    def add(self, league_id: str, game: str, entries: Iterable[pcweb.ChatEntry]) -> int:
+        rows = [
+            (league_id, game, e.message, e.trailing_whitespace, time.time())
+            for e in entries
+        ]
+        with self._lock, self._db:
+            # A redelivered event queues the same entries again.
+            cursor = self._db.executemany(
+                """
+                INSERT OR IGNORE INTO outbox
+                    (league_id, game, message, trailing_whitespace, next_attempt)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+            return cursor.rowcount
+
+    def due(self, now: float, limit: int) -> list[OutboxItem]:
+        with self._lock:
+            rows = cast(
+                list[tuple[int, str, str, str, int, int]],
+                self._db.execute(
+                    """
+                    SELECT item_id, league_id, game, message, trailing_whitespace,
+                        attempts
+                    FROM outbox WHERE next_attempt <= ? ORDER BY item_id LIMIT ?
+                    """,
+                    (now, limit),
+                ).fetchall(),
+            )
+        return [
+            OutboxItem(
+                item_id,
+                league_id,
+                game,
+                pcweb.ChatEntry(message, trailing, game),
+                attempts,
+            )
+            for item_id, league_id, game, message, trailing, attempts in rows
+        ]
+
+    def sent(self, item_id: int, now: float) -> None:
+        with self._lock, self._db:
+            _ = self._db.execute(
+                "UPDATE outbox SET sent = ?, next_attempt = NULL WHERE item_id = ?",
+                (now, item_id),
+            )
+
+    def failed(self, item_id: int, error: str, retry_at: float | None) -> None:
+        with self._lock, self._db:
+            _ = self._db.execute(
+                """
+                UPDATE outbox SET attempts = attempts + 1, error = ?, next_attempt = ?
+                WHERE item_id = ?
+                """,
+                (error, retry_at, item_id),
+            )
+
+
+class RateLimiter:
+    """Keep calls to wait() at least min_interval seconds apart."""
+
+    def __init__(
+        self,
+        min_interval: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.min_interval = min_interval
+        self.clock = clock
+        self.sleep = sleep
+        self._last: float | None = None
+
+    def wait(self) -> None:
+        if self._last is not None:
+            delay = self._last + self.min_interval - self.clock()
+            if delay > 0:
+                self.sleep(delay)
+        self._last = self.clock()
+
+
+@dataclass
+class DrainResult:
+    posted: list[OutboxItem] = field(default_factory=list[OutboxItem])
+    already_sent: list[OutboxItem] = field(default_factory=list[OutboxItem])
+    failed: list[OutboxItem] = field(default_factory=list[OutboxItem])
+
+
+def retry_at(item: OutboxItem, now: float, max_attempts: int) -> float | None:
+    if item.attempts + 1 >= max_attempts:
+        return None
+    return now + RETRY_DELAY * 2.0**item.attempts
+
+
+def drain(  # noqa: PLR0913
+    outbox: Outbox,
+    sessions: pcweb.SessionManager,
+    *,
+    limit: int = 100,
+    window: timedelta | None = pcweb.CHAT_WINDOW,
+    limiter: RateLimiter | None = None,
+    max_attempts: int = MAX_ATTEMPTS,
+    clock: Callable[[], float] = time.time,
+    ledger: Ledger | None = None,
+) -> DrainResult:
+    """Post the due items, one session and at most one chat fetch per league.
+
+    An item leased in the ledger by another poster counts as failed, to be
+    tried again after the lease runs out.
+    """
+    result = DrainResult()
+    by_league: dict[str, list[OutboxItem]] = {}
+    for item in outbox.due(clock(), limit):
+        by_league.setdefault(item.league_id, []).append(item)
+
+    def fail(item: OutboxItem, error: Exception) -> None:
+        print(f"chat post for {item.game} failed: {error!r}")
+        outbox.failed(item.item_id, repr(error), retry_at(item, clock(), max_attempts))
+        result.failed.append(item)
+
+    owner = uuid.uuid4().hex
+    pace = limiter.wait if limiter is not None else None
+    for league_id, items in by_league.items():
+        try:
+            pc = sessions.get(league_id)
+        except Exception as e:  # noqa: BLE001
+            for item in items:
+                fail(item, e)
+            continue
+        index = functools.cache(functools.partial(pc.chat_index, window))
+        for item in items:
+            try:
+                posted = pc.post_once(item.entry, index, ledger, owner, pace)
+            except Exception as e:  # noqa: BLE001
+                fail(item, e)
+                continue
+            outbox.sent(item.item_id, clock())
+            (result.posted if posted else result.already_sent).append(item)
+    return result
+
+
+@dataclass
+class ChatSender:
+    """Where a service's chat entries go: an outbox, or straight to the chat."""
+
+    league_id: str
+    sessions: pcweb.SessionManager
+    outbox: Outbox | None = None
+    window: timedelta | None = pcweb.CHAT_WINDOW
+    ledger: Ledger | None = None
+
+    @classmethod
+    def from_environ(cls, league_id: str) -> Self:
+        """Configure from PC_OUTBOX_PATH, PC_LEDGER_PATH and PC_CHAT_WINDOW_DAYS.
+
+        Sessions are shared with other instances through GCS.
+        """
+        outbox_path = os.environ.get("PC_OUTBOX_PATH")
+        ledger_path = os.environ.get("PC_LEDGER_PATH")
+        window_days = os.environ.get("PC_CHAT_WINDOW_DAYS")
+        return cls(
+            league_id=league_id,
+            sessions=pcweb.SessionManager(store=pcweb.GcsSessionStore()),
+            outbox=SqliteOutbox(Path(outbox_path)) if outbox_path else None,
+            window=timedelta(days=float(window_days))
+            if window_days
+            else pcweb.CHAT_WINDOW,
+            ledger=ledger_lib.SqliteLedger(Path(ledger_path)) if ledger_path else None,
+        )
+
+    def send(self, game_id: str, entries: list[pcweb.ChatEntry]) -> None:
+        if not entries:
+            return
+        if self.outbox is not None:
+            queued = self.outbox.add(self.league_id, game_id, entries)
+            print(f"queued {queued} of {len(entries)} chat entries")
+            return
+        pc = self.sessions.get(self.league_id)
+        _ = pc.league_chat_many(entries, self.window, self.ledger)
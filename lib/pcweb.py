@@ -1,9 +1,28 @@
+import functools
+import html
 import json
-from dataclasses import dataclass
-from typing import cast
+import os
+import re
+import threading
+import time
+import urllib.parse
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime, timedelta
+from typing import TYPE_CHECKING, Protocol, cast
 
-import requests
-from google.cloud import storage
+from lib import ledger as ledger_lib
+from lib import timing
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+    from pathlib import Path
+
+    import requests
+    from google.cloud import storage
+
+    from lib.ledger import Ledger
 
 
 SPECS = {
@@ -13,6 +32,11 @@ SPECS = {
 LOGIN_BUCKET = "pc256-creds"
 LOGIN_OBJECT = "pennantchase-login.json"
 LOGIN_URL = "https://www.pennantchase.com/home/login"
+LEAGUE_HOME_URL_FMT = "https://www.pennantchase.com/lgHome.aspx?lgid=%s"
+SESSION_OBJECT_FMT = "pennantchase-session-%s.json"
+# How long to reuse a login. Expired cookies are caught by league_chat
+# anyway, so this only bounds how long a bad session can linger.
+SESSION_MAX_AGE = 12 * 60 * 60
 MESSAGE_URL_FMT = (
     "https://www.pennantchase.com/home/createmessage?email=y&passedlgid=%s"
 )
@@ -21,47 +45,281 @@ PASSWORD_FIELD = "txtPassword"  # noqa: S105
 CHAT_URL_FMT = "https://www.pennantchase.com/socialRest/LeagueChat.aspx?lgid=%s&r=1234"
 SUBMIT_CHAT_URL = "https://www.pennantchase.com/socialRest/LeagueSubmitChat.aspx"
 CHAT_MESSAGE_KEY = "chatcontent"
+NBSP = "\xa0"
+CHAT_TIME_FORMAT = "%m/%d/%Y %I:%M:%S %p"
+# Only messages this recent count when checking whether one was already sent.
+CHAT_WINDOW = timedelta(days=14)
+# Connections kept open to Pennant Chase; one per request thread is plenty.
+HTTP_POOL_SIZE = 16
 
 
 @dataclass
 class ChatEntry:
     message: str
     trailing_whitespace: int
+    game_id: str | None = None  # keys the entry in a ledger.Ledger
 
 
-class PcWeb:
-    def __init__(self, league_id: str) -> None:
-        self.league_id = league_id
-        self.league_name = SPECS[league_id]["league_name"]
-        self.recipient = SPECS[league_id]["recipient"]
-        storage_client = storage.Client()
-        login_bucket = storage.Bucket(storage_client, LOGIN_BUCKET)
-        login_json = login_bucket.blob(LOGIN_OBJECT).download_as_text()
-        login_map = cast(dict[str, str], json.loads(login_json))
+@dataclass
+class Session:
+    """Cookies from logging in to a league, and when that happened."""
+
+    league_id: str
+    cookies: dict[str, str]
+    created: float
+
+
+class AuthError(RuntimeError):
+    pass
+
+
+class LeaseHeldError(RuntimeError):
+    """Another poster holds the ledger lease on an entry."""
+
+
+@functools.cache
+def http_session() -> requests.Session:
+    """Return the requests.Session every PcWeb shares, creating it on first use.
+
+    It pools connections but keeps no cookies: every request passes its
+    league's cookies explicitly, so one session can serve all leagues and
+    threads without a login leaking between them.
+    """
+    # requests and google.cloud.storage take tens of milliseconds to import,
+    # paid on cold starts that may never post to the chat.
+    from http.cookiejar import DefaultCookiePolicy  # noqa: PLC0415
+
+    import requests  # noqa: PLC0415
+    from requests.adapters import HTTPAdapter  # noqa: PLC0415
+
+    session = requests.Session()
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+@functools.cache
+def load_credentials() -> dict[str, str]:
+    from google.cloud import storage  # noqa: PLC0415
+
+    storage_client = storage.Client()
+    login_bucket = storage.Bucket(storage_client, LOGIN_BUCKET)
+    login_json = login_bucket.blob(LOGIN_OBJECT).download_as_text()
+    return cast(dict[str, str], json.loads(login_json))
+
+
+def login(league_id: str) -> Session:
+    with timing.span("login"):
+        login_map = load_credentials()
         username = login_map["username"]
         password = login_map["password"]
-        login_response = requests.post(
+        login_response = http_session().post(
             LOGIN_URL,
             data={USERNAME_FIELD: username, PASSWORD_FIELD: password},
             allow_redirects=False,
             timeout=300,
         )
         login_response.raise_for_status()
-        self.cookies = login_response.cookies
-        # print('cookies before', self.cookies)
-        _ = requests.get(
-            f"https://www.pennantchase.com/lgHome.aspx?lgid={self.league_id}",
-            cookies=self.cookies,
-            timeout=300,
+        cookies = {
+            name: value
+            for name, value in login_response.cookies.items()
+            if value is not None
+        }
+        # print('cookies before', cookies)
+        _ = http_session().get(
+            LEAGUE_HOME_URL_FMT % league_id, cookies=cookies, timeout=300
+        )
+    # print('cookies', cookies)
+    cookies["uref"] = "https://www.pennantchase.com/home/login"
+    cookies["lgid"] = league_id
+    cookies["lgname"] = SPECS[league_id]["league_name"]
+    cookies["fsbotchecked"] = "true"
+    return Session(league_id, cookies, time.time())
+
+
+def chat_entries(
+    messages: Iterable[str], metadata: dict[str, str], game_id: str
+) -> list[ChatEntry]:
+    """Build the chat entries for a game from its box score object's metadata."""
+    return [
+        ChatEntry(
+            message=f"{message} [Day {metadata['day']}]",
+            trailing_whitespace=int(metadata["year"]) % 5,
+            game_id=game_id,
+        )
+        for message in messages
+    ]
+
+
+def chat_key(entry: ChatEntry) -> str:
+    """Return the message as it appears in the chat, trailing NBSPs included."""
+    return entry.message + NBSP * entry.trailing_whitespace
+
+
+CHAT_TEXT_RE = re.compile(r">([^<]+)<")
+# A whole chat line in one element; the time is in CHAT_TIME_FORMAT.
+CHAT_LINE_RE = re.compile(
+    r"(?P<author>.*?)\s*(?P<time>[\d/]{10} [\d:]{8} [AP]M):\s*(?P<message>.*)",
+    re.DOTALL,
+)
+
+
+def chat_texts(page: str) -> Iterator[str]:
+    """Yield the text of each element of a chat page, unescaped.
+
+    A message ends right before a tag, but its element's text may start
+    with the line's author and time; see chat_keys.
+    """
+    for m in CHAT_TEXT_RE.finditer(page):
+        text = html.unescape(m[1]).lstrip()
+        if text.strip():
+            yield text
+
+
+@dataclass(frozen=True)
+class ChatLine:
+    author: str
+    time: datetime
+    text: str
+
+
+def parse_chat_time(text: str) -> datetime | None:
+    try:
+        # The page doesn't say which zone its times are in. Chat windows are
+        # days long, so treating them as UTC is close enough.
+        return datetime.strptime(text.strip(), CHAT_TIME_FORMAT).replace(tzinfo=UTC)
+    except ValueError:
+        return None
+
+
+def parse_chat_line(text: str) -> ChatLine | None:
+    """Parse a line given as one text: "author MM/DD/YYYY hh:mm:ss AM: message"."""
+    m = CHAT_LINE_RE.fullmatch(text)
+    if m is None:
+        return None
+    time = parse_chat_time(m["time"])
+    if time is None:
+        return None
+    return ChatLine(m["author"], time, m["message"])
+
+
+def chat_keys(page: str) -> set[str]:
+    """Return the texts of a chat page, as messages where they are whole lines."""
+    keys: set[str] = set()
+    for text in chat_texts(page):
+        line = parse_chat_line(text)
+        keys.add(text if line is None else line.text)
+    return keys
+
+
+def parse_chat(page: str) -> Iterator[ChatLine]:
+    """Yield the lines of a chat page in page order, lazily.
+
+    A line is either one text, as parse_chat_line reads it, or three: its
+    author, its time in CHAT_TIME_FORMAT and its message, in that order.
+    Other texts are skipped.
+    """
+    texts = chat_texts(page)
+    previous = ""
+    for text in texts:
+        line = parse_chat_line(text)
+        if line is not None:
+            yield line
+            previous = ""
+            continue
+        time = parse_chat_time(text)
+        if time is None:
+            previous = text
+            continue
+        message = next(texts, None)
+        if message is None:
+            return
+        yield ChatLine(previous.strip(), time, message)
+        previous = ""
+
+
+def recent_chat_keys(page: str, since: datetime) -> set[str] | None:
+    """Return the messages posted since then, or None if the page has no times.
+
+    The chat lists the newest line first, so the scan stops at the first
+    line older than since, once the lines seen so far show that order.
+    """
+    keys: set[str] = set()
+    newest_first = True
+    last: datetime | None = None
+    for line in parse_chat(page):
+        if last is not None and line.time > last:
+            newest_first = False
+        if line.time >= since:
+            keys.add(line.text)
+        elif newest_first and last is not None:
+            break
+        last = line.time
+    return keys if last is not None else None
+
+
+def is_auth_failure(response: requests.Response) -> bool:
+    # Pennant Chase sends requests without a valid login to the login page.
+    return response.is_redirect or response.status_code in {401, 403}
+
+
+class PcWeb:
+    def __init__(
+        self,
+        league_id: str,
+        session: Session | None = None,
+        on_login: Callable[[Session], None] | None = None,
+    ) -> None:
+        """Log in to league_id, or reuse session.
+
+        on_login is called with the new session whenever this logs in.
+        """
+        self.league_id = league_id
+        self.league_name = SPECS[league_id]["league_name"]
+        self.recipient = SPECS[league_id]["recipient"]
+        self.on_login = on_login
+        self._login_lock = threading.Lock()
+        self.session = session or login(league_id)
+        self.cookies = dict(self.session.cookies)
+        if session is None and on_login is not None:
+            on_login(self.session)
+
+    def login(self) -> None:
+        self.session = login(self.league_id)
+        self.cookies = dict(self.session.cookies)
+        if self.on_login is not None:
+            self.on_login(self.session)
+
+    def _get(
+        self, url: str, cookies: dict[str, str], headers: dict[str, str]
+    ) -> requests.Response:
+        return http_session().get(
+            url, allow_redirects=False, cookies=cookies, headers=headers, timeout=300
         )
-        # print('cookies', self.cookies)
-        self.cookies["uref"] = "https://www.pennantchase.com/home/login"
-        self.cookies["lgid"] = self.league_id
-        self.cookies["lgname"] = self.league_name
-        self.cookies["fsbotchecked"] = "true"
+
+    def get_logged_in(self, url: str, headers: dict[str, str]) -> requests.Response:
+        """GET url with the session cookies, logging in again once if rejected.
+
+        Threads sharing this PcWeb that are rejected together log in once.
+        """
+        cookies = self.cookies
+        response = self._get(url, cookies, headers)
+        if not is_auth_failure(response):
+            return response
+        with self._login_lock:
+            if self.cookies is cookies:  # no other thread has logged in since
+                print("session rejected, logging in again")
+                self.login()
+        response = self._get(url, self.cookies, headers)
+        if is_auth_failure(response):
+            msg = f"rejected right after logging in: {response.status_code}"
+            raise AuthError(msg)
+        return response
 
     def send_to_thromer(self, subject: str, body: str) -> None:
-        post_response = requests.post(
+        post_response = http_session().post(
             MESSAGE_URL_FMT % self.league_id,
             cookies=self.cookies,
             data={
@@ -87,26 +345,95 @@ class PcWeb:
             print("subject:", subject, "body:", body)
             raise RuntimeError(post_response.text)
 
+    def chat_index(self, window: timedelta | None = CHAT_WINDOW) -> set[str]:
+        """Fetch the league chat and return its recent messages.
+
+        Only messages from the last window of real time count, or all of
+        them if window is None or the page's times can't be found.
+        """
+        with timing.span("chat_fetch"):
+            get_response = http_session().get(
+                CHAT_URL_FMT % self.league_id, timeout=300
+            )
+            get_response.raise_for_status()
+        timing.note(chat_bytes=len(get_response.content))
+        if window is not None:
+            since = datetime.now(tz=UTC) - window
+            keys = recent_chat_keys(get_response.text, since)
+            if keys is not None:
+                return keys
+            print("no times found in the chat, checking all of it")
+        return chat_keys(get_response.text)
+
     def league_chat(self, entry: ChatEntry) -> None:
-        # TODO: instead of identify the the year with trailing NBSP
-        # characters, instead only scan the last N days of the chat
-        # when checking for the post.
+        _ = self.league_chat_many([entry])
+
+    def league_chat_many(
+        self,
+        entries: Iterable[ChatEntry],
+        window: timedelta | None = CHAT_WINDOW,
+        ledger: Ledger | None = None,
+    ) -> list[ChatEntry]:
+        """Post each entry that wasn't posted already; return those posted.
+
+        The chat is fetched at most once, and each post is added to that
+        index, so N entries cost at most N + 1 requests. Entries a ledger
+        has as posted, or leased to another poster, don't need it at all.
+        """
         # LIMITATION: If the same event occurs in both games of a doubleheader
         # (or tripleheader, etc.), only one message will be written.
-        # See if the message is already in the chat.
-        # TODO: Imperfect since
-        # two instances could race; consider getting a lock using the
-        # game id.
-        get_response = requests.get(CHAT_URL_FMT % self.league_id, timeout=300)
-        get_response.raise_for_status()
-        if (
-            get_response.text.find(
-                entry.message + "\xa0" * entry.trailing_whitespace + "<"
-            )
-            >= 0
-        ):
-            print("Already sent to chat:", entry.message)
-            return
+        index = functools.cache(functools.partial(self.chat_index, window))
+        owner = uuid.uuid4().hex
+        posted: list[ChatEntry] = []
+        for entry in entries:
+            try:
+                if self.post_once(entry, index, ledger, owner):
+                    posted.append(entry)
+            except LeaseHeldError:
+                print("Being sent to chat elsewhere:", entry.message)
+        return posted
+
+    def post_once(
+        self,
+        entry: ChatEntry,
+        index: Callable[[], set[str]],
+        ledger: Ledger | None = None,
+        owner: str = "",
+        pace: Callable[[], None] | None = None,
+    ) -> bool:
+        """Post entry unless the ledger or the chat shows it was; return whether posted.
+
+        index returns the recent chat messages, and is only called when the
+        ledger can't tell. pace is called just before posting. Raises
+        LeaseHeldError if another owner is posting the entry.
+        """
+        key = chat_key(entry)
+        ledger_key = ledger_lib.key(self.league_id, entry.game_id, key)
+        if ledger is not None:
+            if ledger.posted(ledger_key):
+                print("Already sent to chat:", entry.message)
+                return False
+            if not ledger.acquire(ledger_key, owner, time.time()):
+                raise LeaseHeldError(entry.message)
+        try:
+            keys = index()
+            posted = key not in keys
+            if posted:
+                if pace is not None:
+                    pace()
+                self.submit_chat(entry)
+                keys.add(key)
+            else:
+                print("Already sent to chat:", entry.message)
+        except BaseException:
+            if ledger is not None:
+                ledger.release(ledger_key, owner)
+            raise
+        if ledger is not None:
+            ledger.mark_posted(ledger_key, time.time())
+        return posted
+
+    def submit_chat(self, entry: ChatEntry) -> None:
         # pretty sure these aren't needed, just cookies
         headers = {
             "sec-fetch-dest": "document",
@@ -120,15 +447,119 @@ class PcWeb:
                 "Chrome/87.0.4280.152 Safari/537.36"
             ),
         }
-        padded_message = entry.message + "%C2%A0" * entry.trailing_whitespace
-        submit_response = requests.get(
-            f"{SUBMIT_CHAT_URL}?clgid={self.league_id}&{CHAT_MESSAGE_KEY}={padded_message}",
-            allow_redirects=False,
-            cookies=self.cookies,
-            headers=headers,
-            timeout=300,
-        )
+        padded_message = urllib.parse.quote(chat_key(entry))
+        query = f"clgid={self.league_id}&{CHAT_MESSAGE_KEY}={padded_message}"
+        with timing.span("chat_post"):
+            submit_response = self.get_logged_in(f"{SUBMIT_CHAT_URL}?{query}", headers)
         submit_response.raise_for_status()
         if submit_response.text.find("Chat submitted") < 0:
             print("message:", entry.message)
             raise RuntimeError(submit_response.text)
+
+
+def session_from_json(text: str) -> Session:
+    fields = cast(dict[str, object], json.loads(text))
+    return Session(
+        league_id=cast(str, fields["league_id"]),
+        cookies=cast(dict[str, str], fields["cookies"]),
+        created=cast(float, fields["created"]),
+    )
+
+
+class SessionStore(Protocol):
+    def load(self, league_id: str) -> Session | None: ...
+
+    def save(self, session: Session) -> None: ...
+
+
+class GcsSessionStore:
+    """Sessions kept as JSON objects next to the login credentials."""
+
+    def __init__(self, bucket_name: str = LOGIN_BUCKET) -> None:
+        self.bucket_name = bucket_name
+
+    @functools.cached_property
+    def bucket(self) -> storage.Bucket:
+        from google.cloud import storage  # noqa: PLC0415
+
+        return storage.Bucket(storage.Client(), self.bucket_name)
+
+    def load(self, league_id: str) -> Session | None:
+        blob = self.bucket.get_blob(SESSION_OBJECT_FMT % league_id)
+        if blob is None:
+            return None
+        return session_from_json(blob.download_as_text())
+
+    def save(self, session: Session) -> None:
+        blob = self.bucket.blob(SESSION_OBJECT_FMT % session.league_id)
+        blob.upload_from_string(json.dumps(asdict(session)), "application/json")
+
+
+class FileSessionStore:
+    """Sessions kept as JSON files readable only by their owner."""
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+
+    def load(self, league_id: str) -> Session | None:
+        path = self.directory / (SESSION_OBJECT_FMT % league_id)
+        if not path.exists():
+            return None
+        return session_from_json(path.read_text())
+
+    def save(self, session: Session) -> None:
+        path = self.directory / (SESSION_OBJECT_FMT % session.league_id)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            _ = f.write(json.dumps(asdict(session)))
+
+
+class SessionManager:
+    """Hand out logged-in PcWeb objects, reusing sessions until they expire.
+
+    Sessions are kept in memory and, if a store is given, there too, so a
+    new instance can pick up a session without logging in. Safe to share
+    between threads, which get the same PcWeb for a league while its
+    session lasts.
+    """
+
+    def __init__(
+        self,
+        store: SessionStore | None = None,
+        max_age: float = SESSION_MAX_AGE,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.store = store
+        self.max_age = max_age
+        self.clock = clock
+        self._sessions: dict[str, Session] = {}
+        self._clients: dict[str, PcWeb] = {}
+        self._lock = threading.Lock()
+
+    def _fresh(self, session: Session | None) -> bool:
+        return session is not None and self.clock() - session.created < self.max_age
+
+    def _save(self, session: Session) -> None:
+        self._sessions[session.league_id] = session
+        if self.store is not None:
+            self.store.save(session)
+
+    def _on_login(self, session: Session) -> None:
+        with self._lock:
+            self._save(session)
+
+    def get(self, league_id: str) -> PcWeb:
+        with self._lock:
+            session = self._sessions.get(league_id)
+            if not self._fresh(session) and self.store is not None:
+                session = self.store.load(league_id)
+                if session is not None:
+                    self._sessions[league_id] = session
+            if not self._fresh(session):
+                session = login(league_id)
+                self._save(session)
+            pc = self._clients.get(league_id)
+            if pc is None or pc.session is not session:
+                pc = PcWeb(league_id, session, on_login=self._on_login)
+                self._clients[league_id] = pc
+            return pc
@@ -0,0 +1,142 @@
+"""Profile sampled requests with cProfile and tracemalloc.
+
+Profiling is on when PC_PROFILE is set: PC_PROFILE=N profiles 1 in N
+requests, and any request with an X-PC-Profile: 1 header (PC_PROFILE=0
+profiles only those). Each profiled request leaves two files in
+PC_PROFILE_DEST, a local directory or a gs://bucket/prefix: its cProfile
+stats (.pstats, for python -m pstats or snakeviz) and the lines holding
+the most memory it allocated (.allocations.txt).
+
+cProfile and tracemalloc see the whole process, so a profile includes
+whatever other threads do meanwhile, and only one request is profiled at
+a time; a request sampled while another is being profiled isn't.
+
+A gs:// destination needs google-cloud-storage, which new-games-to-db
+doesn't have.
+"""
+
+import contextlib
+import cProfile
+import itertools
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+
+
+ENV_VAR = "PC_PROFILE"
+DEST_ENV_VAR = "PC_PROFILE_DEST"
+HEADER = "X-PC-Profile"
+DEFAULT_DEST = str(Path(tempfile.gettempdir()) / "profiles")
+TOP = 25  # allocation lines to keep
+TRACEBACK_FRAMES = 1
+
+# None when profiling is off, else profile 1 in every requests (0: none).
+every: int | None = int(os.environ[ENV_VAR]) if os.environ.get(ENV_VAR) else None
+dest = os.environ.get(DEST_ENV_VAR) or DEFAULT_DEST
+
+_requests = itertools.count()
+_profiles = itertools.count()
+_running = threading.Lock()
+_NO_PROFILE = contextlib.nullcontext()
+# Allocations by the import system, tracemalloc and profiling are noise.
+_FILTERS = (
+    tracemalloc.Filter(inclusive=False, filename_pattern="<frozen importlib.*>"),
+    tracemalloc.Filter(inclusive=False, filename_pattern=tracemalloc.__file__),
+    tracemalloc.Filter(inclusive=False, filename_pattern=__file__),
+    tracemalloc.Filter(inclusive=False, filename_pattern="<unknown>"),
+)
+
+
+def wanted(header: str | None = None) -> bool:
+    """Whether to profile a request whose X-PC-Profile header is header."""
+    if every is None:
+        return False
+    if header == "1":
+        return True
+    return every > 0 and next(_requests) % every == 0
+
+
+def request(
+    name: str, header: str | None = None
+) -> contextlib.AbstractContextManager[object]:
+    """Profile the with block as a request named name, if wanted()."""
+    if not wanted(header):
+        return _NO_PROFILE
+    return profile(name)
+
+
+def allocations(snapshot: tracemalloc.Snapshot, peak: int, top: int = TOP) -> str:
+    """Render the lines holding the most memory in snapshot."""
+    stats = snapshot.filter_traces(_FILTERS).statistics("lineno")
+    total = sum(stat.size for stat in stats)
+    held = f"{total / 1024:.1f} KiB allocated and still held"
+    lines = [f"{held}, peak {peak / 1024:.1f} KiB traced"]
+    lines.extend(str(stat) for stat in stats[:top])
+    return "\n".join(lines) + "\n"
+
+
+def write(directory: str, name: str, data: bytes) -> str:
+    """Write data to name in directory, a local path or gs://bucket/prefix."""
+    if directory.startswith("gs://"):
+        from google.cloud import storage  # noqa: PLC0415  # only for gs://
+
+        bucket_name, _, prefix = directory.removeprefix("gs://").partition("/")
+        blob_name = f"{prefix.rstrip('/')}/{name}" if prefix else name
+        blob = storage.Client().bucket(bucket_name).blob(blob_name)
+        blob.upload_from_string(data, content_type="application/octet-stream")
+        return f"gs://{bucket_name}/{blob_name}"
+    path = Path(directory) / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _ = path.write_bytes(data)
+    return str(path)
+
+
+@contextlib.contextmanager
+def profile(name: str, directory: str | None = None) -> Generator[None]:
+    """Profile the with block, and write the results to directory.
+
+    directory defaults to PC_PROFILE_DEST. Does nothing if another profile
+    is running.
+    """
+    if not _running.acquire(blocking=False):
+        yield
+        return
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    try:
+        tracemalloc.start(TRACEBACK_FRAMES)
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            elapsed = time.perf_counter() - start
+            stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+            stem = f"{stamp}-{name}-{os.getpid()}-{next(_profiles)}"
+            try:
+                with tempfile.TemporaryDirectory() as tmp:
+                    stats_path = Path(tmp) / "stats"
+                    profiler.dump_stats(stats_path)
+                    stats = stats_path.read_bytes()
+                where = write(directory or dest, f"{stem}.pstats", stats)
+                _ = write(
+                    directory or dest,
+                    f"{stem}.allocations.txt",
+                    allocations(snapshot, peak).encode(),
+                )
+                print(f"profiled {name} ({elapsed:.3f}s) to {where}")
+            except Exception as e:  # noqa: BLE001  # never fail the request
+                print(f"failed to save profile of {name}: {e!r}")
+    finally:
+        _running.release()
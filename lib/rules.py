@@ -0,0 +1,181 @@
+"""Compile declarative detector rules into one Python function per record type.
+
+A rule's condition is a Python expression over the fields of a record, and
+its message is a str.format-style template over the same fields. All the
+rules for one record type are compiled into a single function, so checking
+a record against every rule is one call with no per-rule dispatch, and
+adding a rule adds one comparison rather than another pass over the records.
+"""
+
+import ast
+import string
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, cast, override
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Mapping, Sequence
+
+
+RECORD = "r"
+
+
+@dataclass(frozen=True)
+class Rule:
+    """A detector, e.g. ``Rule("cycle", "Single > 0 and ...", "{Name} hit ...")``.
+
+    screen, if given, is a condition over raw table columns that must hold
+    whenever condition does; it lets a game be skipped without building
+    records. A rule without a screen never lets a game be skipped.
+    """
+
+    name: str
+    condition: str
+    message: str
+    screen: str | None = None
+
+
+type Detector = Callable[[object, list[str]], None]
+type Screen = Callable[[Sequence[str | int], Mapping[str, int]], bool]
+
+
+class RuleError(ValueError):
+    pass
+
+
+class _FieldRewriter(ast.NodeTransformer):
+    def __init__(self, rule: Rule, names: Iterable[str], prefix: str) -> None:
+        self.rule = rule
+        self.names = set(names)
+        self.prefix = prefix
+
+    def rewrite(self, node: ast.expr) -> ast.expr:
+        return cast(ast.expr, self.visit(node))
+
+    @override
+    def visit_Name(self, node: ast.Name) -> ast.expr:
+        if node.id not in self.names:
+            msg = f"{self.rule.name}: unknown field {node.id!r}"
+            raise RuleError(msg)
+        if not self.prefix:
+            return node
+        return ast.copy_location(
+            ast.Attribute(ast.Name(self.prefix, ast.Load()), node.id, ast.Load()), node
+        )
+
+
+def _parse_condition(rule: Rule, condition: str, names: Iterable[str]) -> ast.expr:
+    try:
+        tree = ast.parse(condition, mode="eval")
+    except SyntaxError as e:
+        msg = f"{rule.name}: bad condition {condition!r}: {e}"
+        raise RuleError(msg) from None
+    return _FieldRewriter(rule, names, "").rewrite(tree.body)
+
+
+def _guard(condition: ast.expr) -> tuple[str, int] | None:
+    """Return (field, n) if condition starts with ``field >= n`` or equivalent."""
+    first = condition
+    if isinstance(condition, ast.BoolOp) and isinstance(condition.op, ast.And):
+        first = condition.values[0]
+    if not (
+        isinstance(first, ast.Compare)
+        and len(first.ops) == 1
+        and isinstance(first.left, ast.Name)
+        and isinstance(first.comparators[0], ast.Constant)
+        and type(first.comparators[0].value) is int
+    ):
+        return None
+    n = first.comparators[0].value
+    if isinstance(first.ops[0], ast.GtE):
+        return first.left.id, n
+    if isinstance(first.ops[0], ast.Gt):
+        return first.left.id, n + 1
+    return None
+
+
+def _used_names(conditions: Iterable[ast.expr]) -> list[str]:
+    return sorted(
+        {
+            node.id
+            for condition in conditions
+            for node in ast.walk(condition)
+            if isinstance(node, ast.Name)
+        }
+    )
+
+
+def _message_source(rule: Rule, field_names: Iterable[str]) -> str:
+    rewriter = _FieldRewriter(rule, field_names, RECORD)
+    values: list[ast.expr] = []
+    for literal, field, spec, conversion in string.Formatter().parse(rule.message):
+        if literal:
+            values.append(ast.Constant(literal))
+        if field is None:
+            continue
+        if spec or conversion:
+            msg = f"{rule.name}: format specs aren't supported in {rule.message!r}"
+            raise RuleError(msg)
+        values.append(
+            ast.FormattedValue(rewriter.rewrite(ast.Name(field, ast.Load())), -1, None)
+        )
+    return ast.unparse(ast.JoinedStr(values))
+
+
+def _define(name: str, lines: list[str]) -> object:
+    namespace: dict[str, object] = {}
+    # The source is generated from rules declared in this repository, not from
+    # input, and every field reference has been checked against the record.
+    exec(compile("\n".join(lines), f"<rules:{name}>", "exec"), namespace)  # noqa: S102
+    return namespace[name]
+
+
+def compile_detector(rules: Sequence[Rule], field_names: Iterable[str]) -> Detector:
+    """Build ``detect(record, messages)``, appending a message per matching rule.
+
+    Fields the conditions use are read from the record once. Consecutive
+    rules whose conditions start with ``field >= n`` on the same field are
+    nested under one test of the smallest n, so a run of threshold rules on
+    one stat costs a single comparison for records that meet none of them.
+    """
+    field_names = list(field_names)
+    conditions = [_parse_condition(r, r.condition, field_names) for r in rules]
+    lines = [f"def detect({RECORD}, messages):"]
+    lines.extend(f"    {name} = {RECORD}.{name}" for name in _used_names(conditions))
+    i = 0
+    while i < len(rules):
+        guard = _guard(conditions[i])
+        j = i + 1
+        if guard:
+            while j < len(rules) and (g := _guard(conditions[j])) and g[0] == guard[0]:
+                j += 1
+        indent = "    "
+        if j - i > 1 and guard:
+            least = min(cast(tuple[str, int], _guard(c))[1] for c in conditions[i:j])
+            lines.append(f"    if {guard[0]} >= {least}:")
+            indent = "        "
+        for rule, condition in zip(rules[i:j], conditions[i:j], strict=True):
+            lines.append(f"{indent}if {ast.unparse(condition)}:")
+            message = _message_source(rule, field_names)
+            lines.append(f"{indent}    messages.append({message})")
+        i = j
+    lines.append("    return None")
+    return cast(Detector, _define("detect", lines))
+
+
+def compile_screen(rules: Sequence[Rule], columns: Iterable[str]) -> Screen:
+    """Build ``screen(row, column_indexes)``, False if no rule can match the row.
+
+    Screens name raw columns, and only the columns they use are converted.
+    """
+    columns = list(columns)
+    if any(rule.screen is None for rule in rules):
+        return lambda _row, _indexes: True
+    screens = [_parse_condition(r, cast(str, r.screen), columns) for r in rules]
+    lines = ["def screen(row, indexes):"]
+    lines.extend(
+        f"    {name} = int(row[indexes[{name!r}]])" for name in _used_names(screens)
+    )
+    condition = " or ".join(f"({ast.unparse(s)})" for s in screens) or "False"
+    lines.append(f"    return {condition}")
+    return cast(Screen, _define("screen", lines))
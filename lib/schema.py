@@ -0,0 +1,117 @@
+"""Generate row decoders and totalers from record dataclasses.
+
+Each int field of a record is read from the table column of the same name
+unless its field metadata says otherwise:
+
+- ``COLUMN``: the column to read, e.g. ``"2B"`` for ``Double``.
+- ``DECODE``: a function from the cell text to the value, instead of int.
+- ``DERIVED``: an expression over other int fields, instead of a column.
+
+str fields aren't read from the row; the decoder takes them as arguments.
+Adding a stat is one annotated field on the record.
+"""
+
+import functools
+from dataclasses import fields
+from typing import TYPE_CHECKING, cast
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Sequence
+    from dataclasses import Field
+
+    from _typeshed import DataclassInstance
+
+
+COLUMN = "column"
+DECODE = "decode"
+DERIVED = "derived"
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def _is_int(f: Field[object]) -> bool:
+    # The annotation is still a string if the record's module is compiled
+    # with `from __future__ import annotations`.
+    return f.type in {int, "int"}
+
+
+def _int_fields(record_type: type[DataclassInstance]) -> list[Field[object]]:
+    return [f for f in fields(record_type) if _is_int(f)]
+
+
+def _str_fields(record_type: type[DataclassInstance]) -> list[str]:
+    return [f.name for f in fields(record_type) if not _is_int(f)]
+
+
+def direct_columns(record_type: type[DataclassInstance]) -> list[str]:
+    """Names of the int fields read as-is from a column of the same name."""
+    return [
+        f.name
+        for f in _int_fields(record_type)
+        if not {COLUMN, DECODE, DERIVED} & f.metadata.keys()
+    ]
+
+
+def _define(name: str, lines: list[str], namespace: dict[str, object]) -> object:
+    # The source is generated from dataclasses declared in this repository.
+    exec(compile("\n".join(lines), f"<schema:{name}>", "exec"), namespace)  # noqa: S102
+    return namespace[name]
+
+
+def compile_decoder[T: DataclassInstance](
+    record_type: type[T], headers: Sequence[str]
+) -> Callable[..., T]:
+    """Build ``decode(row, **str_fields)`` for a table with these headers.
+
+    Column positions are looked up once per distinct header row; as with
+    column_indexes, the first column is the player and a repeated name means
+    its last column.
+    """
+    return cast("Callable[..., T]", _compile_decoder(record_type, tuple(headers)))
+
+
+@functools.cache
+def _compile_decoder(
+    record_type: type[DataclassInstance], headers: tuple[str, ...]
+) -> object:
+    indexes = {name: i for i, name in enumerate(headers) if i > 0}
+    namespace: dict[str, object] = {"record_type": record_type}
+    str_names = _str_fields(record_type)
+    lines = [f"def decode(row, {', '.join(str_names)}):"]
+    derived: list[str] = []
+    for f in _int_fields(record_type):
+        if DERIVED in f.metadata:
+            derived.append(f"    {f.name} = {f.metadata[DERIVED]}")
+            continue
+        column = cast(str, f.metadata.get(COLUMN, f.name))
+        if column not in indexes:
+            msg = f"{record_type.__name__}: no {column!r} column in {list(headers)}"
+            raise SchemaError(msg)
+        convert = "int"
+        if DECODE in f.metadata:
+            convert = f"decode_{f.name}"
+            namespace[convert] = f.metadata[DECODE]
+        lines.append(f"    {f.name} = {convert}(row[{indexes[column]}])")
+    lines.extend(derived)
+    arguments = ", ".join(f"{f.name}={f.name}" for f in fields(record_type))
+    lines.append(f"    return record_type({arguments})")
+    return _define("decode", lines, namespace)
+
+
+def compile_totaler[T: DataclassInstance](
+    record_type: type[T],
+) -> Callable[[Iterable[T]], T]:
+    """Build ``total(records)``: int fields summed, str fields empty."""
+    int_names = [f.name for f in _int_fields(record_type)]
+    lines = ["def total(records):"]
+    lines.extend(f"    {name} = 0" for name in int_names)
+    lines.append("    for r in records:")
+    lines.extend(f"        {name} += r.{name}" for name in int_names)
+    arguments = [f"{name}=''" for name in _str_fields(record_type)]
+    arguments.extend(f"{name}={name}" for name in int_names)
+    lines.append(f"    return record_type({', '.join(arguments)})")
+    namespace: dict[str, object] = {"record_type": record_type}
+    return cast("Callable[[Iterable[T]], T]", _define("total", lines, namespace))
@@ -0,0 +1,177 @@
+"""Time the stages of a request, cheaply enough to leave in.
+
+A request wrapped in request() collects the time spent in each span() it
+runs, and whatever note() attaches (byte counts, cache hits), then prints
+them as one JSON log line, which Cloud Logging keeps as a structured
+entry. The durations also go into histograms, which exposition() renders
+for a /metrics endpoint.
+
+Timing is on when PC_TIMING=1. Otherwise request() starts nothing, and
+span() and note() only check that there is no current request.
+
+The current request follows the thread (or task) that started it; work
+handed to another thread isn't timed.
+"""
+
+import bisect
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Self
+
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+    from types import TracebackType
+
+
+ENV_VAR = "PC_TIMING"
+# Histogram bucket upper bounds, in seconds.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+enabled = os.environ.get(ENV_VAR) == "1"
+
+
+@dataclass
+class Trace:
+    """What one request spent its time on."""
+
+    name: str
+    stages: dict[str, float] = field(default_factory=dict[str, float])  # seconds
+    fields: dict[str, object] = field(default_factory=dict[str, object])
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last is for +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+
+class Metrics:
+    """Histograms of stage durations, by request name and stage.
+
+    Safe to share between threads.
+    """
+
+    def __init__(self) -> None:
+        self._histograms: dict[tuple[str, str], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, trace: Trace, total: float) -> None:
+        with self._lock:
+            for stage, seconds in (*trace.stages.items(), ("total", total)):
+                key = (trace.name, stage)
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram()
+                histogram.observe(seconds)
+
+    def exposition(self) -> str:
+        """Render the histograms in the Prometheus text format."""
+        metric = "pc_stage_seconds"
+        lines = [
+            f"# HELP {metric} Time spent in each stage of a request.",
+            f"# TYPE {metric} histogram",
+        ]
+        with self._lock:
+            for (name, stage), h in sorted(self._histograms.items()):
+                labels = f'request="{name}",stage="{stage}"'
+                cumulative = 0
+                for le, count in zip((*h.buckets, "+Inf"), h.counts, strict=True):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"{metric}_sum{{{labels}}} {h.sum}")
+                lines.append(f"{metric}_count{{{labels}}} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+_current: contextvars.ContextVar[Trace | None] = contextvars.ContextVar(
+    "timing_trace", default=None
+)
+
+
+class _Span:
+    __slots__ = ("stage", "start", "trace")
+
+    def __init__(self, trace: Trace, stage: str) -> None:
+        self.trace = trace
+        self.stage = stage
+        self.start = 0.0
+
+    def __enter__(self) -> Self:
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        elapsed = time.perf_counter() - self.start
+        stages = self.trace.stages
+        stages[self.stage] = stages.get(self.stage, 0.0) + elapsed
+
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+def span(stage: str) -> contextlib.AbstractContextManager[object]:
+    """Add the time spent in the with block to the current request's stage."""
+    trace = _current.get()
+    if trace is None:
+        return _NO_SPAN
+    return _Span(trace, stage)
+
+
+def note(**fields: object) -> None:
+    """Attach fields to the current request's log line, if timing it."""
+    trace = _current.get()
+    if trace is not None:
+        trace.fields.update(fields)
+
+
+def log_line(trace: Trace, total: float) -> str:
+    stages_ms = {stage: round(s * 1000, 3) for stage, s in trace.stages.items()}
+    return json.dumps(
+        {
+            "message": f"{trace.name} took {total * 1000:.1f}ms",
+            "request": trace.name,
+            "total_ms": round(total * 1000, 3),
+            "stages_ms": stages_ms,
+            **trace.fields,
+        }
+    )
+
+
+@contextlib.contextmanager
+def request(name: str) -> Generator[Trace | None]:
+    """Time the with block as a request named name, if timing is enabled."""
+    if not enabled:
+        yield None
+        return
+    trace = Trace(name)
+    token = _current.set(trace)
+    start = time.perf_counter()
+    try:
+        yield trace
+    except BaseException as e:
+        trace.fields["error"] = type(e).__name__
+        raise
+    finally:
+        total = time.perf_counter() - start
+        _current.reset(token)
+        metrics.observe(trace, total)
+        print(log_line(trace, total))
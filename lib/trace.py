@@ -0,0 +1,155 @@
+"""Follow a game through the pipeline, from new-games-to-db to the chat.
+
+new-games-to-db gives each game document a trace id and the time it wrote
+the document. store-in-gcs copies both into the box score object's
+metadata, with the times it picked the game up and uploaded its box
+score. process-box-score, or store-in-gcs when it analyzes on upload,
+adds its own times and logs the whole trace as one JSON line, which
+trace-report.py turns into latency percentiles for each hop.
+
+Times are seconds since the epoch from each service's clock.
+"""
+
+import itertools
+import json
+import math
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Self, cast
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+
+# Firestore game document fields, written by new-games-to-db.
+ID_FIELD = "trace_id"
+WRITTEN_FIELD = "trace_written"
+# Box score object metadata keys.
+ID_METADATA_KEY = "trace_id"
+HOPS_METADATA_KEY = "trace_hops"
+
+# The points a game passes, in order.
+HOPS = (
+    "written",  # new-games-to-db wrote the game document
+    "fetching",  # store-in-gcs got the document event, and fetches the box score
+    "uploading",  # store-in-gcs uploads the box score
+    "received",  # process-box-score got the object event
+    "analyzed",  # the box score is analyzed
+    "sent",  # its chat entries are posted or queued
+)
+
+
+def new_id() -> str:
+    return uuid.uuid4().hex
+
+
+@dataclass
+class Trace:
+    trace_id: str
+    hops: dict[str, float] = field(default_factory=dict[str, float])
+
+    def mark(self, hop: str, now: float | None = None) -> None:
+        """Record reaching hop, now by default."""
+        self.hops[hop] = time.time() if now is None else now
+
+    def to_metadata(self) -> dict[str, str]:
+        hops = ",".join(f"{hop}={t:.3f}" for hop, t in self.hops.items())
+        return {ID_METADATA_KEY: self.trace_id, HOPS_METADATA_KEY: hops}
+
+    @classmethod
+    def from_metadata(cls, metadata: dict[str, str]) -> Self | None:
+        """Read a trace from object metadata, or None if it has none."""
+        trace_id = metadata.get(ID_METADATA_KEY)
+        if not trace_id:
+            return None
+        hops: dict[str, float] = {}
+        for item in metadata.get(HOPS_METADATA_KEY, "").split(","):
+            hop, _, t = item.partition("=")
+            try:
+                hops[hop] = float(t)
+            except ValueError:
+                continue  # not worth failing the event over
+        return cls(trace_id, hops)
+
+    def latencies(self) -> dict[str, float]:
+        """Seconds between each recorded hop and the one before it, and in all.
+
+        Keys are "from>to"; a hop that wasn't recorded is skipped over.
+        """
+        seen = [(hop, self.hops[hop]) for hop in HOPS if hop in self.hops]
+        latencies = {
+            f"{a}>{b}": tb - ta for (a, ta), (b, tb) in itertools.pairwise(seen)
+        }
+        if len(seen) > 1:
+            latencies["total"] = seen[-1][1] - seen[0][1]
+        return latencies
+
+    def log_line(self) -> str:
+        latencies_ms = {k: round(s * 1000, 1) for k, s in self.latencies().items()}
+        return json.dumps(
+            {
+                "message": f"trace {self.trace_id}: {latencies_ms.get('total')}ms",
+                ID_METADATA_KEY: self.trace_id,
+                "hops": self.hops,
+                "latency_ms": latencies_ms,
+            }
+        )
+
+
+def read_log(text: str) -> list[Trace]:
+    """Find the traces logged in text, the first of each trace id.
+
+    text is either JSON lines, such as a service's output, or the JSON
+    array that gcloud logging read --format=json prints.
+    """
+    records: list[object]
+    try:
+        parsed = cast(object, json.loads(text))
+        records = cast(list[object], parsed) if isinstance(parsed, list) else [parsed]
+    except json.JSONDecodeError:
+        records = []
+        for line in text.splitlines():
+            try:
+                records.append(cast(object, json.loads(line)))
+            except json.JSONDecodeError:
+                continue  # a plain print
+    traces: dict[str, Trace] = {}
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+        record = cast(dict[str, object], record)
+        payload = record.get("jsonPayload", record)
+        if not isinstance(payload, dict):
+            continue
+        payload = cast(dict[str, object], payload)
+        trace_id = payload.get(ID_METADATA_KEY)
+        hops = payload.get("hops")
+        if isinstance(trace_id, str) and isinstance(hops, dict):
+            _ = traces.setdefault(
+                trace_id, Trace(trace_id, cast(dict[str, float], hops))
+            )
+    return list(traces.values())
+
+
+def latencies_by_hop(traces: Iterable[Trace]) -> dict[str, list[float]]:
+    """Collect each hop's latencies, sorted, with the hops in pipeline order."""
+    by_hop: dict[str, list[float]] = {}
+    for t in traces:
+        for hop, seconds in t.latencies().items():
+            by_hop.setdefault(hop, []).append(seconds)
+
+    def order(hop: str) -> tuple[int, int]:
+        if hop == "total":
+            return (len(HOPS), 0)
+        a, _, b = hop.partition(">")
+        return (HOPS.index(a), HOPS.index(b))
+
+    return {hop: sorted(by_hop[hop]) for hop in sorted(by_hop, key=order)}
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Return the nearest-rank q-th percentile of values, which must be sorted."""
+    rank = max(1, math.ceil(q / 100 * len(values)))
+    return values[rank - 1]
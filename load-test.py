@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+"""Measure process_object throughput as concurrent requests increase.
+
+Runs main.process_object from a pool of threads, the way gunicorn's
+threads run it, against an in-memory bucket that serves the
+testdata/*_analyze_input.html box scores gzipped and adds a fixed latency to
+each GCS request. Nothing is cached between events, so every event downloads
+and parses. Reports events per second at each concurrency; with I/O latency
+in the mix, throughput should grow with concurrency until the parse
+semaphore (PC_PARSE_CONCURRENCY, default the CPU count) is the bottleneck.
+"""
+
+import argparse
+import contextlib
+import gzip
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import cast
+from unittest import mock
+
+import main as service
+from lib import analyze, cache
+
+
+class LocalBlob:
+    def __init__(self, data: bytes, generation: int, latency: float) -> None:
+        self.data = data
+        self.generation = generation
+        self.latency = latency
+        self.metadata: dict[str, str] | None = None
+
+    def download_as_bytes(self, *, raw_download: bool = False) -> bytes:
+        _ = raw_download
+        time.sleep(self.latency)
+        return self.data
+
+    def patch(self, if_metageneration_match: int | None = None) -> None:
+        _ = if_metageneration_match
+        time.sleep(self.latency)
+
+
+class LocalBucket:
+    def __init__(self, name: str, box_scores: list[bytes], latency: float) -> None:
+        self.name = name
+        self.box_scores = box_scores
+        self.latency = latency
+
+    def blob(self, blob_name: str, generation: int | None = None) -> LocalBlob:
+        data = self.box_scores[int(blob_name) % len(self.box_scores)]
+        return LocalBlob(data, generation or 1, self.latency)
+
+
+class LocalClient:
+    def __init__(self, bucket: LocalBucket) -> None:
+        self._bucket = bucket
+
+    def bucket(self, bucket_name: str) -> LocalBucket:
+        _ = bucket_name
+        return self._bucket
+
+
+def event_data(bucket_name: str, blob_name: str) -> dict[str, object]:
+    return {
+        "bucket": bucket_name,
+        "name": blob_name,
+        "generation": "1",
+        "metageneration": "1",
+        "contentEncoding": "gzip",
+        "metadata": {"day": "1", "year": "2031"},
+    }
+
+
+def run(bucket: LocalBucket, events: int, concurrency: int) -> float:
+    """Process events objects concurrency at a time; return events per second."""
+    service.analysis_cache = cache.AnalysisCache(max_entries=0)
+
+    def process(i: int) -> None:
+        with contextlib.suppress(analyze.BoxscoreError):
+            _ = service.process_object(
+                bucket.name, str(i), event_data(bucket.name, str(i))
+            )
+
+    start = time.perf_counter()
+    # process_object prints a couple of lines per event.
+    with (
+        contextlib.redirect_stdout(io.StringIO()),
+        ThreadPoolExecutor(concurrency) as pool,
+    ):
+        _ = list(pool.map(process, range(events)))
+    return events / (time.perf_counter() - start)
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__)
+    _ = p.add_argument("-n", "--events", type=int, default=64, help="events per run")
+    _ = p.add_argument(
+        "-c",
+        "--concurrency",
+        default="1,2,4,8",
+        help="comma-separated concurrency levels to try",
+    )
+    _ = p.add_argument(
+        "-l",
+        "--latency",
+        type=float,
+        default=0.05,
+        help="seconds added to each GCS request",
+    )
+    args = p.parse_args()
+    box_scores = [
+        gzip.compress(path.read_bytes())
+        for path in sorted(Path("testdata").glob("*_analyze_input.html"))
+    ]
+    bucket = LocalBucket("box-scores", box_scores, cast(float, args.latency))
+    events = cast(int, args.events)
+    baseline = None
+    client = LocalClient(bucket)
+    with mock.patch.object(service, "storage_client", return_value=client):
+        for concurrency in (int(c) for c in cast(str, args.concurrency).split(",")):
+            rate = run(bucket, events, concurrency)
+            baseline = baseline or rate
+            speedup = rate / baseline
+            print(
+                f"concurrency {concurrency:>3}: {rate:7.1f} events/s ({speedup:.1f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -6,32 +6,156 @@
 # TODO: also report the day
 # TODO: would be nice to move to a subdirectory
 
+import contextlib
+import functools
+import os
 import sys
+import threading
+import time
+from dataclasses import asdict, dataclass
 from http import HTTPStatus
+from pathlib import Path
 from typing import TYPE_CHECKING, cast
 
 import flask
-import google.cloud.exceptions
-from cloudevents.core.bindings.http import HTTPMessage, from_http_event
-from google.cloud.storage import Bucket
-from google.cloud.storage import Client as StorageClient
 
-from lib import analyze, pcweb
+from lib import (
+    analyze,
+    cache,
+    codec,
+    extract,
+    idempotency,
+    outbox,
+    pcweb,
+    profiling,
+    timing,
+    trace,
+)
 
 
 if TYPE_CHECKING:
+    from collections.abc import Callable, Generator, Iterable, Mapping
+
     from cloudevents.core.base import BaseCloudEvent
+    from google.cloud.storage import Blob, Bucket
+    from google.cloud.storage import Client as StorageClient
 
 
 app = flask.Flask(__name__)
 
+parser_backend = os.environ.get(extract.BACKEND_ENV_VAR, extract.DEFAULT_BACKEND)
+_ = extract.get_backend(parser_backend)  # fail at startup, not on the first event
 
-def process_object(bucket_name: str, blob_name: str) -> list[pcweb.ChatEntry]:
-    blob_label = f"gs://{bucket_name}/{blob_name}"
-    print(blob_label)
-    storage_client = StorageClient()
-    bucket = Bucket(storage_client, bucket_name)
-    blob = bucket.get_blob(blob_name)
+# Redelivered events and -replay objects would otherwise parse the same box
+# score again. PC_CACHE_PATH adds a sqlite tier that survives restarts.
+cache_path = os.environ.get("PC_CACHE_PATH")
+analysis_cache = cache.AnalysisCache(
+    max_entries=int(os.environ.get("PC_CACHE_ENTRIES", "256")),
+    path=Path(cache_path) if cache_path else None,
+)
+
+# Redelivered events are answered from here before any network I/O.
+# PC_IDEMPOTENCY_PATH keeps the keys in a sqlite file across restarts.
+idempotency_path = os.environ.get("PC_IDEMPOTENCY_PATH")
+finished_events = idempotency.Idempotency(
+    backend=idempotency.SqliteBackend(Path(idempotency_path))
+    if idempotency_path
+    else None
+)
+
+# With PC_STORE_PDATA=1, each box score parsed here gets its ProcessedData
+# patched into its metadata, one more request per event. Off by default:
+# store-in-gcs writes it at upload with PC_ANALYZE_ON_UPLOAD=1.
+store_pdata = os.environ.get("PC_STORE_PDATA") == "1"
+
+# Parsing is CPU bound, so running more parses at once than there are CPUs
+# only adds memory. Requests past the limit wait here, after their download.
+parse_slots = threading.BoundedSemaphore(
+    int(os.environ.get("PC_PARSE_CONCURRENCY", "0")) or os.process_cpu_count() or 1
+)
+
+
+@contextlib.contextmanager
+def parse_slot() -> Generator[None]:
+    """Hold one of parse_slots, timing the wait for it."""
+    with timing.span("parse_wait"):
+        _ = parse_slots.acquire()
+    try:
+        yield
+    finally:
+        parse_slots.release()
+
+
+LEAGUE_ID = "256"  # '1000' for testing
+# Posts chat entries, or queues them for drain-outbox.py; see ChatSender.
+chat_sender = outbox.ChatSender.from_environ(LEAGUE_ID)
+
+
+@functools.cache
+def storage_client() -> StorageClient:
+    """One client, and so one connection pool, shared by every request thread."""
+    # google.cloud.storage is the slowest import we have; cold starts pay for
+    # it on the first event rather than before the container can listen.
+    from google.cloud.storage import Client  # noqa: PLC0415
+
+    return Client()
+
+
+@dataclass
+class BoxScoreObject:
+    blob: Blob
+    metadata: dict[str, str]
+    generation: int
+    metageneration: int | None
+    content_encoding: str | None
+
+    def chunks(self, raw: bytes) -> Iterable[bytes]:
+        """Decode the raw_download of the object into a lazy stream of bytes."""
+        return extract.inflate(raw) if self.content_encoding == "gzip" else (raw,)
+
+    def content_key(self, raw: bytes) -> str:
+        """Key the raw_download of the object by content, without decoding it."""
+        if self.content_encoding == "gzip":
+            return cache.gzip_content_key(raw)
+        return cache.content_key(raw)
+
+
+def object_from_event(
+    bucket: Bucket, blob_name: str, data: dict[str, object]
+) -> BoxScoreObject | None:
+    """Describe the object from the event payload, if it has what we need.
+
+    The payload carries the object's metadata and generation, so this
+    saves a metadata GET before the download.
+    """
+    metadata = data.get("metadata")
+    generation = data.get("generation")
+    if not isinstance(metadata, dict) or not isinstance(generation, str | int):
+        return None
+    metadata = cast(dict[str, str], metadata)
+    if "day" not in metadata or "year" not in metadata:
+        return None
+    metageneration = data.get("metageneration")
+    content_encoding = data.get("contentEncoding")
+    return BoxScoreObject(
+        # Pinned to the generation the event is about, so the download
+        # can't see a different version.
+        blob=bucket.blob(blob_name, generation=int(generation)),
+        metadata=metadata,
+        generation=int(generation),
+        metageneration=int(metageneration)
+        if isinstance(metageneration, str | int)
+        else None,
+        content_encoding=content_encoding
+        if isinstance(content_encoding, str)
+        else None,
+    )
+
+
+def fetch_object(bucket: Bucket, blob_name: str) -> BoxScoreObject:
+    blob_label = f"gs://{bucket.name}/{blob_name}"
+    with timing.span("get_blob"):
+        blob = bucket.get_blob(blob_name)
     if blob is None:
         msg = f"{blob_label} not found"
         # This can happen, for example when we upload a random object to the bucket
@@ -43,27 +167,120 @@ def process_object(bucket_name: str, blob_name: str) -> list[pcweb.ChatEntry]:
     if "day" not in blob.metadata or "year" not in blob.metadata:
         msg = f"day and/or year missing from {blob_label}"
         raise RuntimeError(msg)
+    # get_blob() fetches the object's metadata, generation included.
+    return BoxScoreObject(
+        blob,
+        blob.metadata,
+        cast(int, blob.generation),
+        blob.metageneration,
+        blob.content_encoding,
+    )
+
+
+def store_processed_data(
+    box_score: BoxScoreObject,
+    analysis: analyze.Analysis,
+    read: Callable[[], Iterable[bytes]],
+) -> None:
+    """Save the encoded ProcessedData in the blob's metadata for later readers."""
+    metadata = box_score.metadata
+    if codec.METADATA_KEY in metadata:
+        return
+    processed_data = analysis.processed_data
+    if processed_data is None:  # screened out, so never built
+        with parse_slot(), timing.span("decode"):
+            processed_data = analyze.process_raw_tables(
+                extract.extract_chunks(parser_backend, read())
+            )
+    import google.cloud.exceptions  # noqa: PLC0415
+
+    blob = box_score.blob
+    blob.metadata = {**metadata, codec.METADATA_KEY: codec.to_metadata(processed_data)}
+    try:
+        with timing.span("patch"):
+            blob.patch(if_metageneration_match=box_score.metageneration)
+    except google.cloud.exceptions.GoogleCloudError as e:
+        # Only an optimization for later readers; the analysis stands.
+        print(f"not storing {codec.METADATA_KEY}: {e}")
+
+
+def process_object(
+    bucket_name: str, blob_name: str, event_data: dict[str, object] | None = None
+) -> list[pcweb.ChatEntry]:
+    """Analyze a box score object and return the chat entries for it.
+
+    event_data is the Cloud Storage event payload for the object, if any.
+    """
+    blob_label = f"gs://{bucket_name}/{blob_name}"
+    print(blob_label)
+    bucket = storage_client().bucket(bucket_name)
+    box_score = None
+    if event_data is not None:
+        box_score = object_from_event(bucket, blob_name, event_data)
+    if box_score is None:
+        box_score = fetch_object(bucket, blob_name)
     # # TODO: remove this after store-in-gcs has baked for a while
     # if blob_name.find("-replay") > 0:
     #     print("replay, skipping")
     #     return
-    try:
-        data = blob.download_as_text()
-    except google.cloud.exceptions.NotFound as e:
-        print(e)
-        msg = f"Bucket or object not found gs://{bucket_name}/{blob_name}"
-        raise RuntimeError(msg) from None
-    messages = analyze.analyze(data)
-    return [
-        pcweb.ChatEntry(
-            message=f"{message} [Day {blob.metadata['day']}]",
-            trailing_whitespace=int(blob.metadata["year"]) % 5,
-        )
-        for message in messages
-    ]
+    object_key = cache.object_key(bucket_name, blob_name, box_score.generation)
+    analysis = analysis_cache.get(object_key)
+    timing.note(analysis="cache")
+    if analysis is None:
+        processed_data = codec.from_metadata(box_score.metadata)
+        if processed_data is not None:
+            timing.note(analysis=codec.METADATA_KEY)
+            with timing.span("detect"):
+                messages = analyze.find_events(processed_data)
+            analysis = analyze.Analysis(processed_data, messages)
+            analysis_cache.put(analysis, object_key)
+    if analysis is None:
+        import google.cloud.exceptions  # noqa: PLC0415
+
+        try:
+            # Still gzipped, a fraction of the page's size; it is inflated
+            # a chunk at a time below, and parsing stops after the tables.
+            with timing.span("download"):
+                raw = box_score.blob.download_as_bytes(raw_download=True)
+        except google.cloud.exceptions.NotFound as e:
+            print(e)
+            msg = f"Bucket or object not found {blob_label}"
+            raise RuntimeError(msg) from None
+
+        def read() -> Iterable[bytes]:
+            return box_score.chunks(raw)
+
+        timing.note(analysis="content cache", download_bytes=len(raw))
+        with timing.span("content_key"):
+            content_key = box_score.content_key(raw)
+        analysis = analysis_cache.get(content_key)
+        if analysis is None:
+            timing.note(analysis="parse")
+            with parse_slot():
+                with timing.span("extract"):
+                    raw_tables = extract.extract_chunks(parser_backend, read())
+                analysis = analyze.analyze_raw_tables(raw_tables)
+        analysis_cache.put(analysis, object_key, content_key)
+        if store_pdata:
+            store_processed_data(box_score, analysis, read)
+    print(f"analysis cache {analysis_cache.stats}")
+    return pcweb.chat_entries(analysis.messages, box_score.metadata, blob_name)
+
+
+def object_trace(data: dict[str, object], received: float) -> trace.Trace | None:
+    """Continue the trace store-in-gcs left in the event's object metadata, if any."""
+    metadata = data.get("metadata")
+    if not isinstance(metadata, dict):
+        return None
+    game = trace.Trace.from_metadata(cast(dict[str, str], metadata))
+    if game is not None:
+        game.mark("received", received)
+        timing.note(trace_id=game.trace_id)
+    return game
 
 
 def process_box_score(event: BaseCloudEvent) -> flask.Response:
+    received = time.time()
     data = event.get_data()
     if not isinstance(data, dict):
         msg = f"Cloud Storage message type is {type(data)}, should be dict"
@@ -71,27 +288,139 @@ def process_box_score(event: BaseCloudEvent) -> flask.Response:
     data = cast(dict[str, str], data)
     bucket_name = data["bucket"]
     blob_name = data["name"]
-    entries = process_object(bucket_name, blob_name)
-    if entries:
-        pc = pcweb.PcWeb("256")  # '1000' for testing
-        # pc.send_to_thromer('stuff happened', '\n'.join(messages))
-        for entry in entries:
-            pc.league_chat(entry)
+    timing.note(object=f"gs://{bucket_name}/{blob_name}")
+    keys = [idempotency.event_key(event.get_source(), event.get_id())]
+    if "generation" in data:
+        keys.append(idempotency.object_key(bucket_name, blob_name, data["generation"]))
+    if finished_events.seen(*keys):
+        print(f"already processed gs://{bucket_name}/{blob_name}")
+        return flask.Response(status=HTTPStatus.OK, response="Already processed")
+    metadata = cast(dict[str, object], data).get("metadata")
+    if isinstance(metadata, dict) and analyze.ANALYZED_METADATA_KEY in metadata:
+        print(f"gs://{bucket_name}/{blob_name} was analyzed by store-in-gcs")
+        return flask.Response(status=HTTPStatus.OK, response="Analyzed on upload")
+    game = object_trace(cast(dict[str, object], data), received)
+    entries = process_object(bucket_name, blob_name, cast(dict[str, object], data))
+    timing.note(chat_entries=len(entries))
+    if game is not None:
+        game.mark("analyzed")
+    # pc.send_to_thromer('stuff happened', '\n'.join(messages))
+    with timing.span("chat"):
+        chat_sender.send(blob_name, entries)
+    if game is not None:
+        game.mark("sent")
+        print(game.log_line())
+    finished_events.record(*keys)
     return flask.Response(status=HTTPStatus.OK, response="Processed box score")
 
 
+def warm_up_steps() -> dict[str, Callable[[], object]]:
+    """Return the work a first request would otherwise do, in the order to do it."""
+
+    def storage() -> object:
+        import google.cloud.exceptions  # noqa: PLC0415
+
+        return storage_client(), google.cloud.exceptions.NotFound
+
+    def events() -> object:
+        from cloudevents.core.bindings.http import from_http_event  # noqa: PLC0415
+
+        return from_http_event
+
+    def parse() -> object:
+        sample = min(Path(__file__).parent.glob("testdata/*_analyze_input.html"))
+        return analyze.analyze_raw_tables(
+            extract.extract_chunks(parser_backend, [sample.read_bytes()])
+        )
+
+    def login() -> object:
+        if chat_sender.outbox is not None:
+            return None  # drain-outbox.py does the posting
+        # Loads or makes the login; a new login also opens a pooled
+        # connection. Most games post nothing, so the chat isn't fetched.
+        _ = pcweb.http_session()
+        return chat_sender.sessions.get(chat_sender.league_id)
+
+    return {"storage": storage, "events": events, "parse": parse, "login": login}
+
+
+def warm_up(
+    steps: Mapping[str, Callable[[], object]] | None = None,
+) -> dict[str, float]:
+    """Run the warm-up steps, printing and returning how long each took.
+
+    A step that fails is reported and skipped; the first request will
+    try again.
+    """
+    timings: dict[str, float] = {}
+    for name, step in (steps or warm_up_steps()).items():
+        start = time.perf_counter()
+        try:
+            _ = step()
+        except Exception as e:  # noqa: BLE001
+            print(f"warm-up {name} failed: {e!r}")
+        timings[name] = time.perf_counter() - start
+        print(f"warm-up {name}: {timings[name]:.3f}s")
+    return timings
+
+
+def warm_up_within(
+    deadline: float, steps: Mapping[str, Callable[[], object]] | None = None
+) -> bool:
+    """Warm up for at most deadline seconds; return whether it finished.
+
+    Whatever is left carries on in a background thread while requests are
+    served.
+    """
+    thread = threading.Thread(
+        target=warm_up, args=(steps,), name="warm-up", daemon=True
+    )
+    start = time.perf_counter()
+    thread.start()
+    thread.join(deadline)
+    if thread.is_alive():
+        print(f"warm-up still running after {deadline}s, serving anyway")
+        return False
+    print(f"warm-up done in {time.perf_counter() - start:.3f}s")
+    return True
+
+
+@app.route("/cache", methods=["GET"])
+def cache_stats() -> flask.Response:
+    return flask.jsonify(asdict(analysis_cache.stats))
+
+
+@app.route("/metrics", methods=["GET"])
+def stage_metrics() -> flask.Response:
+    """Stage duration histograms, when PC_TIMING=1, in the Prometheus format."""
+    return flask.Response(
+        timing.metrics.exposition(), mimetype="text/plain; version=0.0.4"
+    )
+
+
 @app.route("/", methods=["POST"])
 def process_box_score_eventarc() -> flask.Response:
+    from cloudevents.core.bindings.http import HTTPMessage, from_http_event  # noqa: PLC0415
+
     message = HTTPMessage(
         headers=dict(flask.request.headers), body=flask.request.get_data()
     )
     event = from_http_event(message)
     nominal_response: flask.Response
-    try:
-        nominal_response = process_box_score(event)
-    except analyze.BoxscoreError as e:
-        nominal_response = flask.Response(
-            status=HTTPStatus.BAD_REQUEST, response=str(e)
+    header = flask.request.headers.get(profiling.HEADER)
+    with (
+        profiling.request("process_box_score", header),
+        timing.request("process_box_score"),
+    ):
+        try:
+            nominal_response = process_box_score(event)
+        except analyze.BoxscoreError as e:
+            nominal_response = flask.Response(
+                status=HTTPStatus.BAD_REQUEST, response=str(e)
+            )
+        timing.note(
+            status=nominal_response.status_code,
+            outcome=nominal_response.get_data(as_text=True),
         )
     if 400 <= nominal_response.status_code < 500:  # noqa: PLR2004
         return flask.Response(
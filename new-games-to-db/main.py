@@ -18,6 +18,8 @@ from google.cloud import firestore_v1 as firestore
 from google.cloud.firestore import DocumentSnapshot, Transaction
 from google.cloud.firestore_v1 import Client as FirestoreClient
 
+from lib import profiling, trace
+
 
 if TYPE_CHECKING:
     from collections.abc import Iterable
@@ -31,6 +33,9 @@ PAST_STANDINGS_URL = (
     f"https://www.pennantchase.com/lgPastStandings.aspx?lgId={LEAGUE_ID}"
 )
 
+# Follow each game to the chat; store-in-gcs reads these (see lib/trace.py).
+TRACE_FIELDS = (trace.ID_FIELD, trace.WRITTEN_FIELD)
+
 app = flask.Flask(__name__)
 
 
@@ -51,7 +56,15 @@ class GameDoc(TypedDict):
 def write_new_document(
     transaction: Transaction, ref: BaseDocumentReference, doc: GameDoc
 ) -> None:
-    transaction.create(ref, dict(doc))
+    fields = {trace.ID_FIELD: trace.new_id(), trace.WRITTEN_FIELD: time.time()}
+    transaction.create(ref, {**doc, **fields})
+
+
+def game_fields(doc: dict[str, object] | None) -> dict[str, object] | None:
+    """Drop the trace fields, which differ every time a game is written."""
+    if doc is None:
+        return None
+    return {k: v for k, v in doc.items() if k not in TRACE_FIELDS}
 
 
 def equal_except_year(a: GameDoc, b: GameDoc) -> bool:
@@ -292,7 +305,12 @@ def new_games_to_db(args: Iterable[str] = ()) -> flask.Response:  # noqa: C901,P
                 # turns out not to be unique or if there is a bug.
                 db_dict = cast(
                     GameDoc | None,
-                    cast(DocumentSnapshot, ref.get()).to_dict(),  # pyright: ignore[reportUnknownMemberType]
+                    game_fields(
+                        cast(
+                            dict[str, object] | None,
+                            cast(DocumentSnapshot, ref.get()).to_dict(),  # pyright: ignore[reportUnknownMemberType]
+                        )
+                    ),
                 )
                 if document != db_dict:
                     # TODO: would be nice to do this stuff transactionally
@@ -333,12 +351,14 @@ def new_games_to_db(args: Iterable[str] = ()) -> flask.Response:  # noqa: C901,P
 @app.route("/", methods=["POST"])
 def new_games_to_db_service() -> flask.Response:
     nominal_response: flask.Response
-    try:
-        nominal_response = new_games_to_db()
-    except NewgamesError as e:
-        nominal_response = flask.Response(
-            status=HTTPStatus.BAD_REQUEST, response=str(e)
-        )
+    header = flask.request.headers.get(profiling.HEADER)
+    with profiling.request("new_games_to_db", header):
+        try:
+            nominal_response = new_games_to_db()
+        except NewgamesError as e:
+            nominal_response = flask.Response(
+                status=HTTPStatus.BAD_REQUEST, response=str(e)
+            )
     if 400 <= nominal_response.status_code < 500:  # noqa: PLR2004
         return flask.Response(
             status=HTTPStatus.OK, response=nominal_response.get_data()
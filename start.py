@@ -6,25 +6,44 @@ from typing import TYPE_CHECKING, override
 
 from gunicorn.app.base import BaseApplication
 
-from main import app
+from main import app, warm_up_within
 
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
+
     from flask import Flask
+    from gunicorn.workers.base import Worker
 
 port = os.environ.get("PORT", "8080")
+# PC_WARMUP=1 makes the first request's clients, login and parse before
+# taking requests, during Cloud Run's startup CPU boost, but waits at most
+# PC_WARMUP_DEADLINE seconds for them.
+warmup = os.environ.get("PC_WARMUP") == "1"
+warmup_deadline = float(os.environ.get("PC_WARMUP_DEADLINE", "8"))
+
+
+def post_worker_init(_worker: Worker) -> None:
+    # In the worker, not before gunicorn forks it, so the clients and
+    # connections belong to the process that uses them.
+    _ = warm_up_within(warmup_deadline)
+
 
-options = {
+options: dict[str, str | int | Callable[[Worker], None]] = {
     "bind": f":{port}",
     "workers": 1,
     "threads": 8,
     "timeout": 0,
     # "loglevel": "debug",
 }
+if warmup:
+    options["post_worker_init"] = post_worker_init
 
 
 class StandaloneApplication(BaseApplication):
-    def __init__(self, wsgi_app: Flask, opts: dict[str, str | int]) -> None:
+    def __init__(
+        self, wsgi_app: Flask, opts: dict[str, str | int | Callable[[Worker], None]]
+    ) -> None:
         self.application = wsgi_app
         self.options = opts
         super().__init__()
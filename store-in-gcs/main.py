@@ -2,13 +2,11 @@
 
 # TODO: once stable, deploy with retry on failure (in general)
 # TODO: verify that the info in the box score matches (teams, runs)
-# TODO: combine with analyze (saves gcs download cost)
 
 # listen for writes to mydb indicating that a new box score is available,
 # and dump the raw box score into cloud storage
 
 # TODO: optional: retries
-# TODO: combine with no-hitter etc analyzer
 #
 
 # Pennant Chase box score scraper
@@ -18,8 +16,10 @@
 # it
 
 import gzip
+import os
 import re
 import sys
+import time
 from http import HTTPStatus
 from typing import TYPE_CHECKING, cast
 
@@ -31,19 +31,105 @@ from google.cloud.storage import Bucket
 from google.cloud.storage import Client as StorageClient
 from google.events.cloud import firestore
 
+from lib import analyze, codec, extract, idempotency, outbox, pcweb, profiling, trace
+
 
 if TYPE_CHECKING:
+    from collections.abc import Mapping
+
     from cloudevents.core.base import BaseCloudEvent
+    from google.cloud.storage import Blob
 
 
 BUCKET = "pc256-box-scores"
+LEAGUE_ID = "256"
 CONTENT_TYPE = "text/html; charset=utf-8"
 
 app = flask.Flask(__name__)
 
+# Redelivered events are answered from here before any network I/O.
+# PC_IDEMPOTENCY_PATH keeps the keys in a sqlite file across restarts.
+idempotency_path = os.environ.get("PC_IDEMPOTENCY_PATH")
+finished_events = idempotency.Idempotency(
+    backend=idempotency.SqliteBackend(idempotency_path) if idempotency_path else None
+)
+
+# With PC_ANALYZE_ON_UPLOAD=1, box scores are analyzed here, straight from
+# the scrape, and their chat entries sent (or queued) from here too. The
+# upload is marked so process-box-score skips it.
+analyze_on_upload = os.environ.get("PC_ANALYZE_ON_UPLOAD") == "1"
+parser_backend = os.environ.get(extract.BACKEND_ENV_VAR, extract.DEFAULT_BACKEND)
+_ = extract.get_backend(parser_backend)  # fail at startup, not on the first event
+chat_sender = outbox.ChatSender.from_environ(LEAGUE_ID) if analyze_on_upload else None
+
+
+def analyze_upload(
+    content: bytes, data_map: dict[str, str], game_id: str
+) -> list[pcweb.ChatEntry] | None:
+    """Analyze a scraped box score and mark data_map for its upload.
+
+    Returns None, leaving the game to process-box-score, if the page
+    can't be analyzed, for whatever reason: the box score is archived
+    either way. The encoded ProcessedData is only stored if analysis
+    built it; a game the screen rejects isn't decoded, so a malformed
+    one isn't noticed either.
+    """
+    try:
+        raw_tables = extract.extract_chunks(parser_backend, [content])
+        analysis = analyze.analyze_raw_tables(raw_tables)
+        encoded = None
+        if analysis.processed_data is not None:
+            encoded = codec.to_metadata(analysis.processed_data)
+    except (analyze.BoxscoreError, codec.CodecError) as e:
+        print(f"not analyzing {game_id}: {e}")
+        return None
+    except Exception as e:  # noqa: BLE001
+        # A malformed page can fail anywhere in the parse (KeyError for a
+        # missing column, ValueError from a list lookup, ...).
+        print(f"not analyzing {game_id}, analysis failed: {e!r}")
+        return None
+    if encoded is not None:
+        data_map[codec.METADATA_KEY] = encoded
+    data_map[analyze.ANALYZED_METADATA_KEY] = "1"
+    return pcweb.chat_entries(analysis.messages, data_map, game_id)
+
+
+def upload(blob: Blob, content: bytes, data_map: dict[str, str]) -> None:
+    """Store the box score gzipped, unless an earlier delivery already did."""
+    box_score = gzip.compress(content)
+    blob.metadata = data_map
+    blob.content_encoding = "gzip"
+    try:
+        # Unnecessary: when compressed: content_type = 'application/octet-stream'
+        blob.upload_from_string(
+            box_score, content_type=CONTENT_TYPE, if_generation_match=0
+        )
+        print(f"uploaded {blob.name}", file=sys.stdout)
+    except google.cloud.exceptions.PreconditionFailed:
+        print(f"already uploaded {blob.name}", file=sys.stdout)
+    except google.cloud.exceptions.NotFound:
+        msg = f"Please create bucket gs://{BUCKET}"
+        raise RuntimeError(msg) from None
+
+
+def game_trace(fields: Mapping[str, firestore.Value], received: float) -> trace.Trace:
+    """Continue the trace new-games-to-db left in the game document.
+
+    Documents written before new-games-to-db started traces get a new one.
+    """
+    if trace.ID_FIELD not in fields:
+        game = trace.Trace(trace.new_id())
+    else:
+        game = trace.Trace(fields[trace.ID_FIELD].string_value)
+        if trace.WRITTEN_FIELD in fields:
+            game.mark("written", fields[trace.WRITTEN_FIELD].double_value)
+    game.mark("fetching", received)
+    return game
+
 
 def pubsub_to_gcs(event: BaseCloudEvent) -> flask.Response:
     """Triggered by a change to a Firestore document."""
+    received = time.time()
     data = event.get_data()
     if not isinstance(data, bytes):
         msg = f"Firestore type is {type(data)}, should be bytes"
@@ -75,6 +161,13 @@ def pubsub_to_gcs(event: BaseCloudEvent) -> flask.Response:
         return flask.Response(status=HTTPStatus.BAD_REQUEST, response=msg)
     game_id = cast(str, m[1])
     print(f"{game_id=}")
+    keys = (
+        idempotency.event_key(event.get_source(), event.get_id()),
+        idempotency.document_key(firestore_path),
+    )
+    if finished_events.seen(*keys):
+        print(f"already uploaded {game_id}")
+        return flask.Response(status=HTTPStatus.OK, response="Already uploaded")
 
     # Get the cloud storage bucket.
     # If the bucket doesn't exists, fail, it is expensive
@@ -82,9 +175,7 @@ def pubsub_to_gcs(event: BaseCloudEvent) -> flask.Response:
     storage_client = StorageClient()
     bucket = Bucket(storage_client, BUCKET)
 
-    box_score_url = (
-        f"https://www.pennantchase.com/lgBoxScoreReader.aspx?sid={game_id}&lgid=256"
-    )
+    box_score_url = f"https://www.pennantchase.com/lgBoxScoreReader.aspx?sid={game_id}&lgid={LEAGUE_ID}"
     blob_name = game_id
     # Don't bother: when compressed: append .zstd
     # Don't bother: when compressed: upload zstd-dictionary-<id> if it is missing!
@@ -94,7 +185,8 @@ def pubsub_to_gcs(event: BaseCloudEvent) -> flask.Response:
 
     # Using request preconditions will result in duplicate downloads
     # from pennantchase.com in the case where we get duplicate
-    # invocations from the Firestore trigger. I think it will be rare.
+    # invocations from the Firestore trigger that finished_events hasn't
+    # seen, e.g. on another instance. I think it will be rare.
     # If it isn't then we should figure out why -- I neither want
     # to pay for successful blob.exists() calls, nor do I want to
     # double my load on pennantchase.com. Unsuccessful blob.exists()
@@ -105,21 +197,21 @@ def pubsub_to_gcs(event: BaseCloudEvent) -> flask.Response:
     # buckets with Website Configuration enabled and the NotFoundPage
     # property set to a public object in that bucket."
 
+    game = game_trace(v.fields, received)
+
     # grab box score (raw) and compress
-    box_score = gzip.compress(requests.get(box_score_url, timeout=60).content)
-    blob.metadata = data_map
-    blob.content_encoding = "gzip"
-    try:
-        # Unnecessary: when compressed: content_type = 'application/octet-stream'
-        blob.upload_from_string(
-            box_score, content_type=CONTENT_TYPE, if_generation_match=0
-        )
-        print(f"uploaded {blob_name}", file=sys.stdout)
-    except google.cloud.exceptions.PreconditionFailed:
-        print(f"already uploaded {blob_name}", file=sys.stdout)
-    except google.cloud.exceptions.NotFound:
-        msg = f"Please create bucket gs://{BUCKET}"
-        raise RuntimeError(msg) from None
+    content = requests.get(box_score_url, timeout=60).content
+    entries = analyze_upload(content, data_map, game_id) if chat_sender else None
+    game.mark("uploading")
+    data_map |= game.to_metadata()
+    upload(blob, content, data_map)
+    if chat_sender is not None and entries is not None:
+        # Also after PreconditionFailed: a retry after a failed send lands
+        # there, and the ledger or chat check catches repeats.
+        chat_sender.send(game_id, entries)
+        game.mark("sent")
+        print(game.log_line())
+    finished_events.record(*keys)
     return flask.Response(status=HTTPStatus.OK, response="Uploaded to GCS")
 
 
@@ -129,7 +221,9 @@ def pubsub_to_gcs_eventarc() -> flask.Response:
         headers=dict(flask.request.headers), body=flask.request.get_data()
     )
     event = from_http_event(message)
-    nominal_response = pubsub_to_gcs(event)
+    header = flask.request.headers.get(profiling.HEADER)
+    with profiling.request("pubsub_to_gcs", header):
+        nominal_response = pubsub_to_gcs(event)
     if 400 <= nominal_response.status_code < 500:  # noqa: PLR2004
         return flask.Response(
             status=HTTPStatus.OK, response=nominal_response.get_data()
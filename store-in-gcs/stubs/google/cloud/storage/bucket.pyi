@@ -2,4 +2,7 @@ from google.cloud.storage import Blob, Client
 
 class Bucket:
     def __init__(self, client: Client, name: str | None = None) -> None: ...
-    def blob(self, blob_name: str) -> Blob: ...
+    @property
+    def name(self) -> str | None: ...
+    def blob(self, blob_name: str, generation: int | None = None) -> Blob: ...
+    def get_blob(self, blob_name: str) -> Blob | None: ...
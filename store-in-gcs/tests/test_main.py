@@ -0,0 +1,201 @@
+from pathlib import Path
+
+import pytest
+import requests
+from cloudevents.core.v1.event import CloudEvent
+from google.events.cloud import firestore
+
+import main
+from lib import analyze, codec, idempotency, pcweb, trace
+
+
+TESTDATA = Path(__file__).parents[2] / "testdata"
+# Metadata of each uploaded object, by name.
+uploaded: dict[str, dict[str, str]] = {}
+GAME = {"away_r": 3, "home_r": 4, "day": 12, "year": 2030}
+TEAMS = {"away": "Cubs", "home": "Mets"}
+
+
+def make_event(
+    event_id: str, game_id: str = "game1", written: float | None = None
+) -> CloudEvent:
+    """Make a document event, with a trace written at written if given."""
+    fields = {k: firestore.Value(integer_value=v) for k, v in GAME.items()}
+    fields |= {k: firestore.Value(string_value=v) for k, v in TEAMS.items()}
+    if written is not None:
+        fields[trace.ID_FIELD] = firestore.Value(string_value="abc")
+        fields[trace.WRITTEN_FIELD] = firestore.Value(double_value=written)
+    document = firestore.Document(name=f"mydb/{game_id}", fields=fields)
+    event_data = firestore.DocumentEventData(value=document)
+    data = firestore.DocumentEventData.serialize(event_data)  # pyright: ignore[reportUnknownMemberType]
+    attributes = {
+        "id": event_id,
+        "source": "//firestore.googleapis.com/projects/test",
+        "type": "google.cloud.firestore.document.v1.written",
+        "specversion": "1.0",
+        "document": f"mydb/{game_id}",
+    }
+    return CloudEvent(attributes, data)
+
+
+class FakeResponse:
+    def __init__(self, content: bytes = b"<html>box score</html>") -> None:
+        self.content = content
+
+
+class FakeBlob:
+    def __init__(self, uploads: list[str], name: str) -> None:
+        self.uploads = uploads
+        self.name = name
+        self.metadata: dict[str, str] | None = None
+        self.content_encoding: str | None = None
+
+    def upload_from_string(self, data: bytes, **_: object) -> None:
+        assert data
+        self.uploads.append(self.name)
+        uploaded[self.name] = self.metadata or {}
+
+
+@pytest.fixture
+def outbound(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """Fake the box score download and upload, and log them."""
+    log: list[str] = []
+
+    def get(url: str, **_: object) -> FakeResponse:
+        log.append(url)
+        return FakeResponse()
+
+    class FakeBucket:
+        def __init__(self, *_: object) -> None:
+            pass
+
+        def blob(self, name: str) -> FakeBlob:
+            return FakeBlob(log, name)
+
+    monkeypatch.setattr(requests, "get", get)
+    monkeypatch.setattr(main, "StorageClient", lambda: None)
+    monkeypatch.setattr(main, "Bucket", FakeBucket)
+    monkeypatch.setattr(main, "finished_events", idempotency.Idempotency())
+    return log
+
+
+def test_upload(outbound: list[str]) -> None:
+    response = main.pubsub_to_gcs(make_event("1"))
+    assert response.status_code == 200
+    assert len(outbound) == 2
+    assert "sid=game1" in outbound[0]
+    assert outbound[1] == "game1"
+
+
+def test_trace_metadata(outbound: list[str]) -> None:
+    _ = main.pubsub_to_gcs(make_event("1", written=100.0))
+    game = trace.Trace.from_metadata(uploaded[outbound[-1]])
+    assert game is not None
+    assert game.trace_id == "abc"
+    assert list(game.hops) == ["written", "fetching", "uploading"]
+    assert game.hops["written"] == 100.0
+    # Older documents have no trace, so get a new one.
+    _ = main.pubsub_to_gcs(make_event("2", "game2"))
+    game = trace.Trace.from_metadata(uploaded[outbound[-1]])
+    assert game is not None
+    assert list(game.hops) == ["fetching", "uploading"]
+
+
+def test_redelivery(outbound: list[str]) -> None:
+    _ = main.pubsub_to_gcs(make_event("1"))
+    outbound.clear()
+    # The same event, and a new event for the same document.
+    assert main.pubsub_to_gcs(make_event("1")).get_data() == b"Already uploaded"
+    assert main.pubsub_to_gcs(make_event("2")).get_data() == b"Already uploaded"
+    assert outbound == []
+    _ = main.pubsub_to_gcs(make_event("3", "game2"))
+    assert outbound[-1] == "game2"
+
+
+class FakeSender:
+    def __init__(self) -> None:
+        self.sent: list[tuple[str, list[pcweb.ChatEntry]]] = []
+
+    def send(self, game_id: str, entries: list[pcweb.ChatEntry]) -> None:
+        self.sent.append((game_id, entries))
+
+
+@pytest.mark.usefixtures("outbound")
+def test_analyze_on_upload(monkeypatch: pytest.MonkeyPatch) -> None:
+    # A game with a message, per its expected output.
+    page = min(TESTDATA.glob("*_analyze_input.html"))
+    prefix = page.name.removesuffix("_analyze_input.html")
+    expected = (
+        (TESTDATA / f"{prefix}_analyze_e2e_expected.txt").read_text().splitlines()
+    )
+    assert expected
+
+    def get(*_: object, **_kwargs: object) -> FakeResponse:
+        return FakeResponse(page.read_bytes())
+
+    monkeypatch.setattr(requests, "get", get)
+    sender = FakeSender()
+    monkeypatch.setattr(main, "chat_sender", sender)
+
+    _ = main.pubsub_to_gcs(make_event("1"))
+
+    metadata = uploaded["game1"]
+    assert metadata[analyze.ANALYZED_METADATA_KEY] == "1"
+    assert codec.from_metadata(metadata) is not None
+    [(game_id, entries)] = sender.sent
+    assert game_id == "game1"
+    assert [e.message for e in entries] == [f"{m} [Day 12]" for m in expected]
+
+
+def test_analyze_on_upload_bad_page(
+    outbound: list[str], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    sender = FakeSender()
+    monkeypatch.setattr(main, "chat_sender", sender)
+    _ = main.pubsub_to_gcs(make_event("1", "game2"))
+    # Archived as usual, and left for process-box-score.
+    assert outbound[-1] == "game2"
+    assert analyze.ANALYZED_METADATA_KEY not in uploaded["game2"]
+    assert sender.sent == []
+
+
+@pytest.mark.parametrize("column", ["LOB", "H"])
+def test_analyze_on_upload_missing_column(
+    outbound: list[str], monkeypatch: pytest.MonkeyPatch, column: str
+) -> None:
+    # A page with its tables, but without one of the columns analysis reads.
+    page = min(TESTDATA.glob("*_analyze_input.html")).read_bytes()
+    page = page.replace(f">{column}<".encode(), b">XYZ<")
+
+    def get(*_: object, **_kwargs: object) -> FakeResponse:
+        return FakeResponse(page)
+
+    monkeypatch.setattr(requests, "get", get)
+    sender = FakeSender()
+    monkeypatch.setattr(main, "chat_sender", sender)
+    response = main.pubsub_to_gcs(make_event("1", "game3"))
+    assert response.status_code == 200
+    assert outbound[-1] == "game3"
+    assert analyze.ANALYZED_METADATA_KEY not in uploaded["game3"]
+    assert sender.sent == []
+
+
+def test_analyze_on_upload_screened_out(
+    outbound: list[str], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # A game with no events, missing a column only decoding reads.
+    page = max(TESTDATA.glob("*_analyze_input.html")).read_bytes()
+    page = page.replace(b">AB<", b">XYZ<")
+
+    def get(*_: object, **_kwargs: object) -> FakeResponse:
+        return FakeResponse(page)
+
+    monkeypatch.setattr(requests, "get", get)
+    sender = FakeSender()
+    monkeypatch.setattr(main, "chat_sender", sender)
+    _ = main.pubsub_to_gcs(make_event("1", "game4"))
+    # Screened out without decoding, so nothing to store and no error seen.
+    assert outbound[-1] == "game4"
+    assert uploaded["game4"][analyze.ANALYZED_METADATA_KEY] == "1"
+    assert codec.METADATA_KEY not in uploaded["game4"]
+    assert sender.sent == [("game4", [])]
@@ -1,4 +1,24 @@
 class Blob:
     def download_as_text(self) -> str: ...
+    def download_as_bytes(self, raw_download: bool = False) -> bytes: ...
+    def upload_from_string(
+        self,
+        data: bytes | str,
+        content_type: str = "text/plain",
+        if_generation_match: int | None = None,
+    ) -> None: ...
+    @property
+    def name(self) -> str | None: ...
+    @property
+    def generation(self) -> int | None: ...
+    @property
+    def metageneration(self) -> int | None: ...
+    @property
+    def content_encoding(self) -> str | None: ...
+    @content_encoding.setter
+    def content_encoding(self, value: str | None) -> None: ...
     @property
     def metadata(self) -> dict[str, str] | None: ...
+    @metadata.setter
+    def metadata(self, value: dict[str, str] | None) -> None: ...
+    def patch(self, if_metageneration_match: int | None = None) -> None: ...
@@ -1,2 +1,9 @@
+from collections.abc import Iterator
+
+from google.cloud.storage.blob import Blob
+from google.cloud.storage.bucket import Bucket
+
 class Client:
     def __init__(self) -> None: ...
+    def bucket(self, bucket_name: str) -> Bucket: ...
+    def list_blobs(self, bucket_or_name: Bucket | str) -> Iterator[Blob]: ...
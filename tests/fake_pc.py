@@ -0,0 +1,144 @@
+"""A local stand-in for the Pennant Chase pages lib/pcweb.py talks to."""
+
+import collections
+import html
+import http.server
+import secrets
+import threading
+import urllib.parse
+from datetime import UTC, datetime
+from typing import TYPE_CHECKING, cast, override
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    import pytest
+
+USERNAME = "user"
+PASSWORD = "secret"  # noqa: S105
+
+
+def chat_time(when: datetime | None = None) -> str:
+    """Format a time the way the chat page does."""
+    return (when or datetime.now(tz=UTC)).strftime("%m/%d/%Y %I:%M:%S %p")
+
+
+class FakePennantChase(http.server.ThreadingHTTPServer):
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.tokens: set[str] = set()
+        self.chat: list[tuple[str, str, str]] = []  # (author, time, text)
+        self.page: str | None = None  # served instead of the chat, if set
+        self.requests: collections.Counter[str] = collections.Counter()
+        self.home_cookies: list[dict[str, str]] = []  # sent with each home page
+        self.failing_submits = 0  # answer this many chat submits with a 500
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def chat_page(self) -> str:
+        row = '<div class="chatentry"><b>{}</b> <i>{}</i> <span>{}</span></div>'
+        rows = "".join(
+            row.format(*map(html.escape, entry)) for entry in reversed(self.chat)
+        )
+        return f"<html><body>{rows}</body></html>"
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    @property
+    def site(self) -> FakePennantChase:
+        return cast(FakePennantChase, self.server)
+
+    @override
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+    def reply(self, status: int, body: str, headers: dict[str, str]) -> None:
+        data = body.encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        _ = self.wfile.write(data)
+
+    def cookies(self) -> dict[str, str]:
+        return dict(
+            c.strip().split("=", 1)
+            for c in self.headers.get("Cookie", "").split(";")
+            if "=" in c
+        )
+
+    def logged_in(self) -> bool:
+        return self.cookies().get("session") in self.site.tokens
+
+    def do_POST(self) -> None:
+        path = urllib.parse.urlsplit(self.path).path
+        length = int(self.headers.get("Content-Length", "0"))
+        form = urllib.parse.parse_qs(self.rfile.read(length).decode())
+        with self.site.lock:
+            self.site.requests[path] += 1
+            if path != "/home/login":
+                self.reply(404, "", {})
+                return
+            credentials = (form.get("txtUsername"), form.get("txtPassword"))
+            if credentials != ([USERNAME], [PASSWORD]):
+                self.reply(200, "bad login", {})
+                return
+            token = secrets.token_hex(8)
+            self.site.tokens.add(token)
+        self.reply(302, "", {"Location": "/", "Set-Cookie": f"session={token}"})
+
+    def do_GET(self) -> None:
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        with self.site.lock:
+            self.site.requests[url.path] += 1
+            if url.path == "/lgHome.aspx":
+                self.site.home_cookies.append(self.cookies())
+                self.reply(200, "home", {})
+            elif url.path == "/socialRest/LeagueChat.aspx":
+                self.reply(200, self.site.page or self.site.chat_page(), {})
+            elif url.path == "/socialRest/LeagueSubmitChat.aspx":
+                if not self.logged_in():
+                    self.reply(302, "", {"Location": "/home/login"})
+                    return
+                if self.site.failing_submits:
+                    self.site.failing_submits -= 1
+                    self.reply(500, "", {})
+                    return
+                self.site.chat.append((USERNAME, chat_time(), query["chatcontent"][0]))
+                self.reply(200, "Chat submitted", {})
+            else:
+                self.reply(404, "", {})
+
+
+def serve(monkeypatch: pytest.MonkeyPatch) -> Iterator[FakePennantChase]:
+    """Run a fake server and point lib/pcweb.py at it, for a fixture."""
+    from lib import pcweb  # noqa: PLC0415
+
+    server = FakePennantChase()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(pcweb, "LOGIN_URL", f"{server.url}/home/login")
+    monkeypatch.setattr(
+        pcweb, "LEAGUE_HOME_URL_FMT", f"{server.url}/lgHome.aspx?lgid=%s"
+    )
+    monkeypatch.setattr(
+        pcweb, "CHAT_URL_FMT", f"{server.url}/socialRest/LeagueChat.aspx?lgid=%s&r=1"
+    )
+    monkeypatch.setattr(
+        pcweb, "SUBMIT_CHAT_URL", f"{server.url}/socialRest/LeagueSubmitChat.aspx"
+    )
+    monkeypatch.setattr(
+        pcweb, "load_credentials", lambda: {"username": USERNAME, "password": PASSWORD}
+    )
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -1,10 +1,13 @@
+import collections
+import copy
 import json
+import random
 from dataclasses import asdict
 from pathlib import Path
 
 import pytest
 
-from lib import analyze
+from lib import analyze, extract
 
 
 def get_prefixes() -> list[str]:
@@ -35,3 +38,72 @@ def test_process_data(prefix: str) -> None:
     # with Path(f"testdata/{prefix}_analyze_process_actual.json").open("w") as f:
     #    json.dump(actual, f)
     assert actual == expected
+
+
+def randomize(raw_tables: list[extract.RawTable], rng: random.Random) -> None:
+    """Rewrite the stats detectors look at, favoring values near thresholds."""
+    box_score, batting, pitching = raw_tables
+    nicknames = [row[0] for row in box_score[1:3]]
+    no_hit_team = rng.choice([*nicknames] + [None] * 18)
+    perfect = rng.choice([True, False])
+    lob = box_score[0].index("LOB")
+    batting_columns = analyze.column_indexes(batting[0])
+    for team, row in analyze.player_rows(batting):
+        counts = {c: rng.choice([0, 0, 1, 2]) for c in ("2B", "3B", "single", "E")}
+        counts["HR"] = rng.choice([0] * 200 + [1] * 20 + [2, 3, 4, 5])
+        if team == no_hit_team:
+            counts = dict.fromkeys(counts, 0)
+        if perfect and team != no_hit_team:
+            counts["E"] = 0
+        hits = counts.pop("single") + counts["2B"] + counts["3B"] + counts["HR"]
+        row[batting_columns["H"]] = str(hits)
+        for c, n in counts.items():
+            row[batting_columns[c]] = str(n)
+    for row in box_score[1:3]:
+        if perfect and row[0] == no_hit_team:
+            row[lob] = "0"
+    pitching_columns = analyze.column_indexes(pitching[0])
+    for team, row in analyze.player_rows(pitching):
+        row[pitching_columns["K"]] = str(rng.choice([0] * 50 + [5, 10, 17, 18, 19]))
+        if perfect and team != no_hit_team:
+            row[pitching_columns["BB"]] = row[pitching_columns["HB"]] = "0"
+
+
+@pytest.mark.parametrize("prefix", get_prefixes())
+def test_screen_never_drops_events(prefix: str) -> None:
+    data = Path(f"testdata/{prefix}_analyze_input.html").read_text()
+    template = extract.extract_raw_tables(data)
+    rng = random.Random(prefix)  # noqa: S311
+    seen: collections.Counter[str] = collections.Counter()
+    for _ in range(2000):
+        raw_tables = copy.deepcopy(template)
+        randomize(raw_tables, rng)
+        events = analyze.find_events(analyze.process_raw_tables(raw_tables))
+        screened = analyze.could_have_events(raw_tables)
+        if events:
+            assert screened, events
+        seen[
+            "screened out" if not screened else "passed" if events else "false hit"
+        ] += 1
+        for kind in ("cycle", "home runs", "struck out", "no-hitter", "perfect game"):
+            seen[kind] += sum(kind in event for event in events)
+    # Make sure every detector fired and the screen did some screening.
+    assert all(seen[kind] for kind in ("cycle", "home runs", "struck out")), seen
+    assert all(seen[kind] for kind in ("no-hitter", "perfect game")), seen
+    assert seen["screened out"], seen
+
+
+@pytest.mark.parametrize("prefix", get_prefixes())
+def test_screen_testdata(prefix: str) -> None:
+    data = Path(f"testdata/{prefix}_analyze_input.html").read_text()
+    raw_tables = extract.extract_raw_tables(data)
+    expected = Path(f"testdata/{prefix}_analyze_e2e_expected.txt").read_text()
+    assert analyze.could_have_events(raw_tables) or not expected.strip()
+
+
+def test_records_are_slotted() -> None:
+    prefix = get_prefixes()[0]
+    data = Path(f"testdata/{prefix}_analyze_input.html").read_text()
+    processed_data = analyze.process_data(data)
+    for record in (processed_data.batters[0], processed_data.pitchers[0]):
+        assert not hasattr(record, "__dict__")
@@ -0,0 +1,144 @@
+import gzip
+import json
+import shutil
+from dataclasses import asdict
+from pathlib import Path
+from typing import TYPE_CHECKING, cast, override
+
+from lib import analyze, backfill, codec
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+def make_bucket(root: Path) -> list[str]:
+    names: list[str] = []
+    inputs = sorted(Path("testdata").glob("*_analyze_input.html"))
+    for i, path in enumerate(inputs):
+        name = path.stem.removesuffix("_analyze_input")
+        names.append(name)
+        if i % 2:
+            _ = (root / name).write_bytes(gzip.compress(path.read_bytes()))
+        else:
+            _ = shutil.copy(path, root / name)
+        metadata = {"year": str(2030 + i), "day": "7"}
+        _ = (root / (name + backfill.METADATA_SUFFIX)).write_text(json.dumps(metadata))
+    _ = (root / "broken").write_text("<table></table>")
+    return names
+
+
+def read_output(output: Path) -> dict[str, dict[str, object]]:
+    records = [
+        cast(dict[str, object], json.loads(line))
+        for line in output.read_text().splitlines()
+    ]
+    return {cast(str, r["name"]): r for r in records}
+
+
+class CountingSource(backfill.LocalSource):
+    def __init__(self, root: Path) -> None:
+        super().__init__(root)
+        self.reads: list[str] = []
+
+    @override
+    def read(self, ref: backfill.GameRef) -> str:
+        self.reads.append(ref.name)
+        return super().read(ref)
+
+
+def test_backfill(tmp_path: Path) -> None:
+    bucket = tmp_path / "bucket"
+    bucket.mkdir()
+    names = make_bucket(bucket)
+    output = tmp_path / "out.jsonl"
+
+    assert backfill.backfill(backfill.LocalSource(bucket), output, workers=1) == 3
+    records = read_output(output)
+    assert sorted(records) == sorted([*names, "broken"])
+    for name in names:
+        expected = Path(f"testdata/{name}_analyze_e2e_expected.txt").read_text()
+        assert records[name]["messages"] == expected.splitlines()
+        assert records[name]["day"] == "7"
+    assert records["broken"]["messages"] is None
+    assert records["broken"]["error"]
+
+
+class ListingSource(CountingSource):
+    """Notes how much of the listing had been read at each download."""
+
+    def __init__(self, root: Path) -> None:
+        super().__init__(root)
+        self.listed = 0
+        self.listed_at_read: list[int] = []
+
+    @override
+    def list_games(self) -> Iterator[backfill.GameRef]:
+        for ref in super().list_games():
+            self.listed += 1
+            yield ref
+
+    @override
+    def read(self, ref: backfill.GameRef) -> str:
+        self.listed_at_read.append(self.listed)
+        return super().read(ref)
+
+
+def test_backfill_streams_listing(tmp_path: Path) -> None:
+    bucket = tmp_path / "bucket"
+    bucket.mkdir()
+    _ = make_bucket(bucket)
+    output = tmp_path / "out.jsonl"
+
+    source = ListingSource(bucket)
+    assert backfill.backfill(source, output, downloads=1, workers=1) == 3
+    # Downloads start before the whole bucket has been listed.
+    assert source.listed_at_read[0] < source.listed == 3
+
+
+def test_backfill_resume(tmp_path: Path) -> None:
+    bucket = tmp_path / "bucket"
+    bucket.mkdir()
+    names = make_bucket(bucket)
+    output = tmp_path / "out.jsonl"
+    first = backfill.BackfillResult(names[0], None, None, [], None)
+    # A completed game, then a line an interrupted run didn't finish.
+    _ = output.write_text(json.dumps(asdict(first)) + '\n{"name": "bro')
+
+    source = CountingSource(bucket)
+    assert backfill.backfill(source, output, workers=1) == 2
+    assert sorted(source.reads) == sorted([*names[1:], "broken"])
+    assert backfill.completed(output) == {*names, "broken"}
+
+    assert backfill.backfill(CountingSource(bucket), output, workers=1) == 0
+
+
+def test_backfill_filter(tmp_path: Path) -> None:
+    bucket = tmp_path / "bucket"
+    bucket.mkdir()
+    names = make_bucket(bucket)
+    output = tmp_path / "out.jsonl"
+
+    count = backfill.backfill(
+        backfill.LocalSource(bucket), output, years={"2031"}, workers=1
+    )
+    assert count == 1
+    assert list(read_output(output)) == [names[1]]
+
+
+def test_backfill_stored_processed_data(tmp_path: Path) -> None:
+    bucket = tmp_path / "bucket"
+    bucket.mkdir()
+    names = make_bucket(bucket)
+    data = backfill.LocalSource(bucket).read(backfill.GameRef(names[0], None, None))
+    metadata = {codec.METADATA_KEY: codec.to_metadata(analyze.process_data(data))}
+    _ = (bucket / (names[0] + backfill.METADATA_SUFFIX)).write_text(
+        json.dumps(metadata)
+    )
+    output = tmp_path / "out.jsonl"
+
+    source = CountingSource(bucket)
+    assert backfill.backfill(source, output, workers=1) == 3
+    assert names[0] not in source.reads
+    expected = Path(f"testdata/{names[0]}_analyze_e2e_expected.txt").read_text()
+    assert read_output(output)[names[0]]["messages"] == expected.splitlines()
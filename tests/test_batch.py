@@ -0,0 +1,69 @@
+import json
+from dataclasses import asdict
+from pathlib import Path
+
+import pytest
+
+from lib import batch
+
+
+def games() -> list[batch.Game]:
+    prefixes = sorted(
+        p.stem.removesuffix("_analyze_input")
+        for p in Path("testdata").glob("*analyze_input.html")
+    )
+    good = [
+        (prefix, Path(f"testdata/{prefix}_analyze_input.html").read_text())
+        for prefix in prefixes
+    ]
+    # Interleave broken games so every chunk has a failure in it.
+    return [
+        game
+        for i, g in enumerate(good * 3)
+        for game in (g, (f"broken-{i}", "<table><tr><td>no</td></tr></table>"))
+    ]
+
+
+def expected_messages(game_id: str) -> list[str]:
+    return Path(f"testdata/{game_id}_analyze_e2e_expected.txt").read_text().splitlines()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("ordered", [True, False])
+def test_analyze_many(workers: int, ordered: bool) -> None:  # noqa: FBT001
+    inputs = games()
+    results = list(
+        batch.analyze_many(inputs, workers=workers, chunksize=3, ordered=ordered)
+    )
+    ids = [r.game_id for r in results]
+    if ordered:
+        assert ids == [game_id for game_id, _ in inputs]
+    else:
+        assert sorted(ids) == sorted(game_id for game_id, _ in inputs)
+    for result in results:
+        if result.game_id.startswith("broken-"):
+            assert result.value is None
+            assert result.error
+            assert result.error.startswith("BoxscoreError")
+        else:
+            assert result.error is None
+            assert result.value == expected_messages(result.game_id)
+
+
+def test_process_many() -> None:
+    inputs = games()[:4]
+    results = list(batch.process_many(inputs, workers=2, chunksize=1))
+    for (game_id, _), result in zip(inputs, results, strict=True):
+        assert result.game_id == game_id
+        if game_id.startswith("broken-"):
+            assert result.error
+            continue
+        with Path(f"testdata/{game_id}_analyze_process_expected.json").open() as f:
+            expected = json.load(f)  # pyright: ignore[reportAny]
+        assert result.value is not None
+        assert asdict(result.value) == expected
+
+
+def test_unknown_backend() -> None:
+    with pytest.raises(ValueError, match="nope"):
+        _ = list(batch.analyze_many(games(), backend="nope"))
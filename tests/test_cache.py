@@ -0,0 +1,81 @@
+import gzip
+import io
+from dataclasses import replace
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from lib import analyze, cache
+
+
+if TYPE_CHECKING:
+    import pytest
+
+
+def load_analysis() -> tuple[str, analyze.Analysis]:
+    path = min(Path("testdata").glob("*_analyze_input.html"))
+    data = path.read_text()
+    return data, analyze.analyze_fully(data)
+
+
+def test_content_key() -> None:
+    assert cache.content_key("abc") == cache.content_key(b"abc")
+    assert cache.content_key("abc") != cache.content_key("abd")
+
+
+def test_gzip_content_key() -> None:
+    data = b"<html>box score</html>"
+    key = cache.gzip_content_key(gzip.compress(data, mtime=1))
+    assert key == cache.gzip_content_key(gzip.compress(data, mtime=2))
+    buffer = io.BytesIO()
+    with gzip.GzipFile("game.html", "wb", fileobj=buffer, mtime=3) as f:
+        _ = f.write(data)
+    assert key == cache.gzip_content_key(buffer.getvalue())
+    assert key != cache.gzip_content_key(gzip.compress(data + b"\n", mtime=1))
+
+
+def test_lru() -> None:
+    _, analysis = load_analysis()
+    c = cache.AnalysisCache(max_entries=2)
+    c.put(analysis, "a", "b")
+    assert c.get("a") is analysis
+    c.put(analysis, "c")  # evicts b, the least recently used
+    assert c.get("b") is None
+    assert c.get("a") is analysis
+    assert c.get("c") is analysis
+    assert c.stats == cache.CacheStats(hits=3, disk_hits=0, misses=1)
+
+
+def test_sqlite_tier(tmp_path: Path) -> None:
+    data, analysis = load_analysis()
+    key = cache.content_key(data)
+    cache.AnalysisCache(path=tmp_path / "cache.db").put(analysis, key)
+
+    c = cache.AnalysisCache(path=tmp_path / "cache.db")
+    assert c.get(key) == analysis
+    assert c.get(key) == analysis
+    assert c.stats == cache.CacheStats(hits=1, disk_hits=1, misses=0)
+
+
+def test_sqlite_tier_version(tmp_path: Path) -> None:
+    data, analysis = load_analysis()
+    key = cache.content_key(data)
+    path = tmp_path / "cache.db"
+    cache.AnalysisCache(path=path, version="old").put(analysis, key)
+    assert cache.AnalysisCache(path=path, version="old").get(key) == analysis
+    # New rules: nothing cached under the old ones is served.
+    assert cache.AnalysisCache(path=path, version="new").get(key) is None
+    cache.AnalysisCache(path=path, version="new").put(analysis, key)
+    assert cache.AnalysisCache(path=path, version="new").get(key) == analysis
+
+
+def test_analysis_version(monkeypatch: pytest.MonkeyPatch) -> None:
+    assert cache.analysis_version() == cache.VERSION
+    rule = replace(analyze.TEAM_RULES[0], condition="H == 1")
+    monkeypatch.setattr(analyze, "TEAM_RULES", [rule, *analyze.TEAM_RULES[1:]])
+    assert cache.analysis_version() != cache.VERSION
+
+
+def test_analyze_fully() -> None:
+    data, analysis = load_analysis()
+    assert analysis.messages == analyze.analyze(data)
+    assert analysis.processed_data == analyze.process_data(data)
@@ -0,0 +1,85 @@
+import json
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+
+import pytest
+
+from lib import analyze, codec
+
+
+def get_prefixes() -> list[str]:
+    return sorted(
+        p.stem.removesuffix("_analyze_input")
+        for p in Path("testdata").glob("*analyze_input.html")
+    )
+
+
+def load(prefix: str) -> analyze.ProcessedData:
+    return analyze.process_data(
+        Path(f"testdata/{prefix}_analyze_input.html").read_text()
+    )
+
+
+@pytest.mark.parametrize("prefix", get_prefixes())
+def test_round_trip(prefix: str) -> None:
+    processed_data = load(prefix)
+    decoded = codec.decode(codec.encode(processed_data))
+    assert decoded == processed_data
+    with Path(f"testdata/{prefix}_analyze_process_expected.json").open() as f:
+        expected = json.load(f)  # pyright: ignore[reportAny]
+    assert asdict(decoded) == expected
+    assert analyze.find_events(decoded) == analyze.find_events(processed_data)
+
+
+@pytest.mark.parametrize("prefix", get_prefixes())
+def test_metadata_round_trip(prefix: str) -> None:
+    processed_data = load(prefix)
+    metadata = {"day": "3", codec.METADATA_KEY: codec.to_metadata(processed_data)}
+    assert codec.from_metadata(metadata) == processed_data
+    assert codec.from_metadata({"day": "3"}) is None
+    assert codec.from_metadata(None) is None
+
+
+def test_corrupt() -> None:
+    data = codec.encode(load(get_prefixes()[0]))
+    for bad in (
+        data[:-1],
+        data + b"\0",
+        b"XXXX" + data[4:],
+        data[:4] + b"\x09" + data[5:],
+    ):
+        with pytest.raises(codec.CodecError):
+            _ = codec.decode(bad)
+    assert codec.from_metadata({codec.METADATA_KEY: "not base64!"}) is None
+
+
+def test_out_of_range() -> None:
+    processed_data = load(get_prefixes()[0])
+    processed_data.batters[0] = replace(processed_data.batters[0], AB=100_000)
+    with pytest.raises(codec.CodecError):
+        _ = codec.encode(processed_data)
+
+
+def test_schema_changed(monkeypatch: pytest.MonkeyPatch) -> None:
+    data = codec.encode(load(get_prefixes()[0]))
+    monkeypatch.setattr(codec, "SCHEMA", codec.SCHEMA + 1)
+    with pytest.raises(codec.CodecError, match="records have changed"):
+        _ = codec.decode(data)
+
+
+def test_fingerprint() -> None:
+    @dataclass
+    class Record:
+        name: str
+        H: int
+        AB: int
+
+    @dataclass
+    class Reordered:
+        name: str
+        AB: int
+        H: int
+
+    Reordered.__name__ = "Record"
+    assert codec.fingerprint(Record) != codec.fingerprint(Reordered)
+    assert codec.fingerprint(Record) == codec.fingerprint(Record)
@@ -0,0 +1,164 @@
+import gzip
+import json
+import zlib
+from dataclasses import asdict
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import bs4
+import pytest
+
+from lib import analyze, extract
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+
+
+def get_prefixes() -> list[str]:
+    return sorted(
+        p.stem.removesuffix("_analyze_input")
+        for p in Path("testdata").glob("*analyze_input.html")
+    )
+
+
+def soup_tables(data: str, table_count: int = 3) -> list[extract.RawTable]:
+    soup = bs4.BeautifulSoup(data, "html.parser")
+    return [
+        [[cell.get_text() for cell in row.select("td")] for row in table.select("tr")]
+        for table in soup.select("table")[:table_count]
+    ]
+
+
+@pytest.mark.parametrize("prefix", get_prefixes())
+def test_matches_soup(prefix: str) -> None:
+    data = Path(f"testdata/{prefix}_analyze_input.html").read_text()
+    assert extract.extract_raw_tables(data) == soup_tables(data)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 4096])
+def test_chunked(chunk_size: int) -> None:
+    data = Path(f"testdata/{get_prefixes()[0]}_analyze_input.html").read_text()
+    extractor = extract.TableExtractor()
+    for i in range(0, len(data), chunk_size):
+        extractor.feed(data[i : i + chunk_size])
+    extractor.close()
+    assert extractor.raw_tables == soup_tables(data)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_inflate(chunk_size: int) -> None:
+    data = Path(f"testdata/{get_prefixes()[0]}_analyze_input.html").read_bytes()
+    chunks = list(extract.inflate(gzip.compress(data), chunk_size))
+    assert b"".join(chunks) == data
+    assert max(map(len, chunks)) <= chunk_size
+    with pytest.raises(zlib.error):
+        _ = list(extract.inflate(gzip.compress(data)[:-100]))
+
+
+def test_stops_after_tables() -> None:
+    data = Path(f"testdata/{get_prefixes()[0]}_analyze_input.html").read_bytes()
+    pulled: list[bytes] = []
+
+    def chunks() -> Iterator[bytes]:
+        for chunk in extract.inflate(gzip.compress(data), 1024):
+            pulled.append(chunk)
+            yield chunk
+
+    raw_tables = extract.extract_raw_tables_from_chunks(chunks())
+    assert raw_tables == soup_tables(data.decode())
+    assert sum(map(len, pulled)) < len(data)
+
+
+@pytest.mark.parametrize("backend", sorted(extract.BACKENDS))
+def test_extract_chunks(backend: str) -> None:
+    data = Path(f"testdata/{get_prefixes()[0]}_analyze_input.html").read_bytes()
+    try:
+        raw_tables = extract.extract_chunks(
+            backend, extract.inflate(gzip.compress(data))
+        )
+    except bs4.FeatureNotFound:
+        pytest.skip(f"{backend} is not installed")
+    assert raw_tables == soup_tables(data.decode())
+
+
+@pytest.mark.parametrize("backend", sorted(extract.BACKENDS))
+@pytest.mark.parametrize("prefix", get_prefixes())
+def test_backends(prefix: str, backend: str) -> None:
+    data = Path(f"testdata/{prefix}_analyze_input.html").read_text()
+    with Path(f"testdata/{prefix}_analyze_process_expected.json").open("r") as f:
+        expected = json.load(f)  # pyright: ignore[reportAny]
+    try:
+        actual = asdict(analyze.process_data(data, backend))
+    except bs4.FeatureNotFound:
+        pytest.skip(f"{backend} is not installed")
+    assert actual == expected
+
+
+def test_unknown_backend() -> None:
+    with pytest.raises(ValueError, match="Unknown parser backend"):
+        _ = extract.get_backend("regex")
+
+
+@pytest.mark.parametrize(
+    "extractor", [extract.extract_raw_tables, extract.extract_fast]
+)
+@pytest.mark.parametrize(
+    "data",
+    [
+        # Unclosed cells are closed by the end of their row.
+        "<table><tr><td>a<b>b</b><tr><td>c &amp; d</tr></table>",
+        # Nested tables contribute rows and cells to every enclosing table.
+        "<table><tr><td>x<table><tr><td>y</td></tr></table></td></tr></table>",
+        # Comments, scripts and stray end tags are ignored.
+        "<p><table><tr><td><!--c-->e<script>s</script></div></td></tr></table>",
+        # Void elements don't nest.
+        "<table><tr><td><img>1<br/>2</td></table>",
+        # Only the first tables count.
+        "<table><td>1</table><table><tr><td>2</table><table><tr><td>3<table>4",
+        "no tables at all",
+    ],
+)
+def test_edge_cases(
+    data: str, extractor: Callable[[str], list[extract.RawTable]]
+) -> None:
+    assert extractor(data) == soup_tables(data)
+
+
+# "<table" in markup before the first table, which isn't a table.
+DECOY_PREFIXES = [
+    "<!-- <table><tr><td>no</td></tr></table> -->",
+    '<script>var s = "<table><tr><td>no";</script>',
+    "<STYLE>/* <table><tr><td>no */</STYLE>",
+    '<div title="<table><tr><td>no">',
+    "<div title='a > <table><tr><td>no'>x</div>",
+    "<!DOCTYPE html>a < b <p>",
+]
+
+
+@pytest.mark.parametrize(
+    "extractor", [extract.extract_raw_tables, extract.extract_fast]
+)
+@pytest.mark.parametrize("prefix", DECOY_PREFIXES)
+def test_decoy_prefix(
+    prefix: str, extractor: Callable[[str], list[extract.RawTable]]
+) -> None:
+    data = prefix + "<table><tr><td>yes<!-- </td><td>no --></td></tr></table>"
+    assert extractor(data) == soup_tables(data) == [[["yes"]]]
+
+
+@pytest.mark.parametrize("prefix", DECOY_PREFIXES)
+def test_decoy_prefix_chunked(prefix: str) -> None:
+    data = prefix + "<table><tr><td>yes</td></tr></table>"
+    chunks = [c.encode() for c in data]
+    assert extract.extract_raw_tables_from_chunks(chunks) == [[["yes"]]]
+
+
+def test_find_table_start() -> None:
+    assert extract.find_table_start("<p><table>") == (3, 3)
+    assert extract.find_table_start("<!-- <table>") == (None, 12)
+    # Unfinished markup at the end is kept for more input.
+    assert extract.find_table_start("<p>x<!-- <tab", final=False) == (None, 4)
+    assert extract.find_table_start("<p>x<", final=False) == (None, 4)
+    assert extract.find_table_start("<script><tab", final=False) == (None, 0)
+    assert extract.find_table_start("<p>x < y", final=False) == (None, 8)
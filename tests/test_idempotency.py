@@ -0,0 +1,52 @@
+from typing import TYPE_CHECKING
+
+from lib import idempotency
+
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ttl() -> None:
+    clock = Clock()
+    events = idempotency.Idempotency(ttl=60, clock=clock)
+    events.record("a", "b")
+    assert events.seen("b")
+    assert events.seen("x", "a")
+    assert not events.seen("x")
+    clock.now += 60
+    assert not events.seen("a")
+
+
+def test_bounded() -> None:
+    events = idempotency.Idempotency(max_entries=2)
+    events.record("a")
+    events.record("b")
+    events.record("c")
+    assert not events.seen("a")
+    assert events.seen("b")
+    assert events.seen("c")
+
+
+def test_backend(tmp_path: Path) -> None:
+    clock = Clock()
+    path = tmp_path / "seen.db"
+    key = idempotency.object_key("bucket", "name", 7)
+    idempotency.Idempotency(
+        ttl=60, backend=idempotency.SqliteBackend(path), clock=clock
+    ).record(key)
+    events = idempotency.Idempotency(
+        ttl=60, backend=idempotency.SqliteBackend(path), clock=clock
+    )
+    assert events.seen(key)
+    assert not events.seen(idempotency.object_key("bucket", "name", 8))
+    clock.now += 60
+    assert not events.seen(key)
@@ -0,0 +1,31 @@
+import pytest
+
+from lib import importtime
+
+
+# Deferred until first use; see "Import time" in DEVELOPING.md.
+LAZY = ("bs4", "cloudevents", "google.cloud.storage", "requests")
+
+
+def test_parse() -> None:
+    report = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     lib.schema
+import time:      1442 |       2140 |   lib.rules
+import time:     10002 |      18281 | lib.analyze
+"""
+    assert importtime.parse(report) == {
+        "lib.schema": importtime.ImportTime("lib.schema", 2, 120, 120),
+        "lib.rules": importtime.ImportTime("lib.rules", 1, 1442, 2140),
+        "lib.analyze": importtime.ImportTime("lib.analyze", 0, 10002, 18281),
+    }
+
+
+# Import times depend on the machine, so budgets are checked by
+# uv run import-time.py rather than here; which modules get imported doesn't.
+@pytest.mark.parametrize("module", sorted(importtime.load_budgets()))
+def test_lazy_imports(module: str) -> None:
+    times = importtime.measure(module, runs=0)
+    assert module in times
+    lazy = [m for m in times if any(m == n or m.startswith(f"{n}.") for n in LAZY)]
+    assert lazy == []
@@ -0,0 +1,32 @@
+from typing import TYPE_CHECKING
+
+from lib import ledger
+
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def test_lease() -> None:
+    book = ledger.SqliteLedger()
+    key = ledger.key("1000", "game", "cycle")
+    assert book.acquire(key, "a", now=0)
+    assert book.acquire(key, "a", now=1)  # renewed
+    assert not book.acquire(key, "b", now=2)
+    assert book.acquire(key, "b", now=1 + ledger.LEASE)  # expired
+    book.release(key, "a")  # not a's any more
+    assert not book.acquire(key, "a", now=2 + ledger.LEASE)
+    book.release(key, "b")
+    assert book.acquire(key, "a", now=3 + ledger.LEASE)
+
+
+def test_posted(tmp_path: Path) -> None:
+    key = ledger.key("1000", "game", "cycle")
+    book = ledger.SqliteLedger(tmp_path / "ledger.db")
+    assert not book.posted(key)
+    assert book.acquire(key, "a", now=0)
+    book.mark_posted(key, now=1)
+    other = ledger.SqliteLedger(tmp_path / "ledger.db")
+    assert other.posted(key)
+    assert not other.acquire(key, "b", now=2 * ledger.LEASE)
+    assert not other.posted(ledger.key("1000", "other game", "cycle"))
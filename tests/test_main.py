@@ -0,0 +1,347 @@
+import gzip
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, cast
+
+import pytest
+from cloudevents.core.v1.event import CloudEvent
+from google.cloud.storage import Bucket
+
+import main
+from lib import (
+    analyze,
+    cache,
+    codec,
+    extract,
+    idempotency,
+    outbox,
+    pcweb,
+    profiling,
+    timing,
+    trace,
+)
+from tests import fake_pc
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+INPUT = min(Path("testdata").glob("*_analyze_input.html"))
+METADATA = {"day": "12", "year": "2031"}
+
+
+class FakeBlob:
+    def __init__(self, requests: list[str], name: str, generation: int | None) -> None:
+        self.requests = requests
+        self.name = name
+        self.generation = generation
+        self.metageneration: int | None = 1 if generation else None
+        self.metadata: dict[str, str] | None = None
+        self.content_encoding: str | None = None
+
+    def download_as_bytes(self, *, raw_download: bool = False) -> bytes:
+        assert raw_download
+        self.requests.append("download")
+        return gzip.compress(INPUT.read_bytes())
+
+    def patch(self, if_metageneration_match: int | None = None) -> None:
+        assert if_metageneration_match == 1
+        self.requests.append("patch")
+
+
+class FakeBucket:
+    def __init__(self, _client: object, name: str) -> None:
+        self.name = name
+        self.requests: list[str] = []
+
+    def blob(self, blob_name: str, generation: int | None = None) -> FakeBlob:
+        return FakeBlob(self.requests, blob_name, generation)
+
+    def get_blob(self, blob_name: str) -> FakeBlob:
+        self.requests.append("get_blob")
+        blob = FakeBlob(self.requests, blob_name, 5)
+        blob.metadata = dict(METADATA)
+        blob.content_encoding = "gzip"
+        return blob
+
+
+@pytest.fixture
+def server(monkeypatch: pytest.MonkeyPatch) -> Iterator[fake_pc.FakePennantChase]:
+    yield from fake_pc.serve(monkeypatch)
+
+
+class FakeClient:
+    def __init__(self) -> None:
+        self.buckets: list[FakeBucket] = []
+
+    def bucket(self, bucket_name: str) -> FakeBucket:
+        self.buckets.append(FakeBucket(self, bucket_name))
+        return self.buckets[-1]
+
+
+@pytest.fixture
+def buckets(monkeypatch: pytest.MonkeyPatch) -> list[FakeBucket]:
+    client = FakeClient()
+    monkeypatch.setattr(main, "storage_client", lambda: client)
+    monkeypatch.setattr(main, "analysis_cache", cache.AnalysisCache())
+    return client.buckets
+
+
+def test_object_from_event(buckets: list[FakeBucket]) -> None:
+    event_data: dict[str, object] = {
+        "bucket": "box-scores",
+        "name": "game",
+        "generation": "5",
+        "metageneration": "1",
+        "contentEncoding": "gzip",
+        "metadata": METADATA,
+    }
+    entries = main.process_object("box-scores", "game", event_data)
+    # One request, for the box score.
+    assert buckets[0].requests == ["download"]
+    assert all(e.message.endswith("[Day 12]") for e in entries)
+
+
+def test_store_pdata(
+    buckets: list[FakeBucket], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(main, "store_pdata", True)
+    event_data: dict[str, object] = {
+        "bucket": "box-scores",
+        "name": "game",
+        "generation": "5",
+        "metageneration": "1",
+        "contentEncoding": "gzip",
+        "metadata": METADATA,
+    }
+    _ = main.process_object("box-scores", "game", event_data)
+    # And one storing its ProcessedData.
+    assert buckets[0].requests == ["download", "patch"]
+
+
+def test_object_fallback(buckets: list[FakeBucket]) -> None:
+    event_data: dict[str, object] = {"bucket": "box-scores", "name": "game"}
+    _ = main.process_object("box-scores", "game", event_data)
+    assert buckets[0].requests == ["get_blob", "download"]
+
+
+def test_event_metadata_pinned() -> None:
+    bucket = Bucket(None, "box-scores")  # pyright: ignore[reportArgumentType]
+    data: dict[str, object] = {
+        "generation": 9,
+        "metadata": {**METADATA, codec.METADATA_KEY: "x"},
+    }
+    box_score = main.object_from_event(bucket, "game", data)
+    assert box_score is not None
+    assert box_score.blob.generation == 9
+    assert box_score.metageneration is None
+    assert main.object_from_event(bucket, "game", {"generation": 9}) is None
+
+
+def test_streamed_matches_text(buckets: list[FakeBucket]) -> None:
+    event_data: dict[str, object] = {"bucket": "box-scores", "name": "game"}
+    entries = main.process_object("box-scores", "game", event_data)
+    expected = analyze.analyze(INPUT.read_text())
+    assert [e.message for e in entries] == [f"{m} [Day 12]" for m in expected]
+    # Keyed by the compressed page, whatever time it was compressed at.
+    key = cache.gzip_content_key(gzip.compress(INPUT.read_bytes(), mtime=0))
+    assert main.analysis_cache.get(key) is not None
+    assert len(buckets) == 1
+
+
+def test_content_cache_hit(
+    buckets: list[FakeBucket], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    _ = main.process_object("box-scores", "game")
+    inflated: list[bytes] = []
+
+    def inflate(data: bytes) -> list[bytes]:
+        inflated.append(data)
+        return []
+
+    monkeypatch.setattr(extract, "inflate", inflate)
+    entries = main.process_object("box-scores", "game-replay")
+    assert entries
+    assert inflated == []
+    assert main.analysis_cache.stats.hits == 1
+    assert len(buckets) == 2
+
+
+def test_skips_analyzed(
+    buckets: list[FakeBucket], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(main, "finished_events", idempotency.Idempotency())
+    attributes = {
+        "id": "1",
+        "source": "//storage.googleapis.com/projects/_/buckets/box-scores",
+        "type": "google.cloud.storage.object.v1.finalized",
+        "specversion": "1.0",
+    }
+    data: dict[str, object] = {
+        "bucket": "box-scores",
+        "name": "game",
+        "generation": "5",
+        "metadata": {**METADATA, analyze.ANALYZED_METADATA_KEY: "1"},
+    }
+    response = main.process_box_score(CloudEvent(attributes, data))
+    assert response.get_data() == b"Analyzed on upload"
+    assert buckets == []
+
+
+@pytest.mark.usefixtures("buckets")
+def test_concurrent_parses_bounded(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(main, "parse_slots", threading.BoundedSemaphore(2))
+    analyze_raw_tables = analyze.analyze_raw_tables
+    lock = threading.Lock()
+    running = [0]
+    most = [0]
+
+    def counted(raw_tables: list[extract.RawTable]) -> analyze.Analysis:
+        with lock:
+            running[0] += 1
+            most[0] = max(most[0], running[0])
+        time.sleep(0.01)
+        try:
+            return analyze_raw_tables(raw_tables)
+        finally:
+            with lock:
+                running[0] -= 1
+
+    monkeypatch.setattr(analyze, "analyze_raw_tables", counted)
+    monkeypatch.setattr(main, "analysis_cache", cache.AnalysisCache(max_entries=0))
+
+    def process(i: int) -> list[pcweb.ChatEntry]:
+        return main.process_object("box-scores", str(i), {"name": str(i)})
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(process, range(16)))
+    assert most[0] == 2
+    messages = {tuple(e.message for e in entries) for entries in results}
+    assert len(messages) == 1
+    assert messages.pop()
+
+
+@pytest.mark.usefixtures("buckets")
+def test_warm_up(
+    server: fake_pc.FakePennantChase, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    sender = outbox.ChatSender("1000", pcweb.SessionManager())
+    monkeypatch.setattr(main, "chat_sender", sender)
+    timings = main.warm_up()
+    assert list(timings) == ["storage", "events", "parse", "login"]
+    # Logged in, without fetching the chat or posting anything.
+    assert server.requests["/home/login"] == 1
+    assert server.requests["/socialRest/LeagueChat.aspx"] == 0
+    assert server.chat == []
+
+
+def test_warm_up_deadline() -> None:
+    release = threading.Event()
+    done: list[str] = []
+
+    def fail() -> None:
+        raise RuntimeError
+
+    def last() -> None:
+        done.append("last")
+
+    steps = {"fail": fail, "slow": release.wait, "last": last}
+    assert not main.warm_up_within(0.01, steps)
+    release.set()
+    # Still finishes in the background, failures and all.
+    for _ in range(100):
+        if done:
+            break
+        time.sleep(0.01)
+    assert done == ["last"]
+    assert main.warm_up_within(1, {"last": last})
+
+
+@pytest.mark.usefixtures("server")
+def test_timing(
+    buckets: list[FakeBucket],
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    monkeypatch.setattr(timing, "enabled", True)
+    monkeypatch.setattr(timing, "metrics", timing.Metrics())
+    monkeypatch.setattr(main, "finished_events", idempotency.Idempotency())
+    sender = outbox.ChatSender("1000", pcweb.SessionManager())
+    monkeypatch.setattr(main, "chat_sender", sender)
+    headers = {
+        "ce-id": "1",
+        "ce-source": "//storage.googleapis.com/projects/_/buckets/box-scores",
+        "ce-type": "google.cloud.storage.object.v1.finalized",
+        "ce-specversion": "1.0",
+    }
+    client = main.app.test_client()
+    response = client.post(
+        "/", headers=headers, json={"bucket": "box-scores", "name": "game"}
+    )
+    assert response.status_code == 200
+    assert buckets[0].requests == ["get_blob", "download"]
+    line = cast(dict[str, object], json.loads(capsys.readouterr().out.splitlines()[-1]))
+    assert line["object"] == "gs://box-scores/game"
+    assert line["analysis"] == "parse"
+    assert cast(int, line["download_bytes"]) > 0
+    assert line["outcome"] == "Processed box score"
+    stages = {"get_blob", "download", "parse_wait", "extract", "chat_post"}
+    assert stages <= set(cast(dict[str, float], line["stages_ms"]))
+    metrics = client.get("/metrics").get_data(as_text=True)
+    assert 'request="process_box_score",stage="download"' in metrics
+
+
+@pytest.mark.usefixtures("buckets", "server")
+def test_trace(
+    monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+) -> None:
+    monkeypatch.setattr(main, "finished_events", idempotency.Idempotency())
+    monkeypatch.setattr(
+        main, "chat_sender", outbox.ChatSender("1000", pcweb.SessionManager())
+    )
+    game = trace.Trace("abc")
+    game.mark("written", time.time() - 2)
+    game.mark("uploading", time.time() - 1)
+    attributes = {
+        "id": "1",
+        "source": "//storage.googleapis.com/projects/_/buckets/box-scores",
+        "type": "google.cloud.storage.object.v1.finalized",
+        "specversion": "1.0",
+    }
+    data: dict[str, object] = {
+        "bucket": "box-scores",
+        "name": "game",
+        "metadata": {**METADATA, **game.to_metadata()},
+    }
+    response = main.process_box_score(CloudEvent(attributes, data))
+    assert response.status_code == 200
+    [logged] = trace.read_log(capsys.readouterr().out)
+    assert logged.trace_id == "abc"
+    assert list(logged.hops) == ["written", "uploading", "received", "analyzed", "sent"]
+    assert 2 <= logged.latencies()["total"] < 10
+
+
+@pytest.mark.usefixtures("buckets", "server")
+def test_profile_header(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(profiling, "every", 0)
+    monkeypatch.setattr(profiling, "dest", str(tmp_path))
+    monkeypatch.setattr(main, "finished_events", idempotency.Idempotency())
+    sender = outbox.ChatSender("1000", pcweb.SessionManager())
+    monkeypatch.setattr(main, "chat_sender", sender)
+    headers = {
+        "ce-id": "1",
+        "ce-source": "//storage.googleapis.com/projects/_/buckets/box-scores",
+        "ce-type": "google.cloud.storage.object.v1.finalized",
+        "ce-specversion": "1.0",
+        profiling.HEADER: "1",
+    }
+    response = main.app.test_client().post(
+        "/", headers=headers, json={"bucket": "box-scores", "name": "game"}
+    )
+    assert response.status_code == 200
+    suffixes = sorted("".join(p.suffixes) for p in tmp_path.iterdir())
+    assert suffixes == [".allocations.txt", ".pstats"]
@@ -0,0 +1,109 @@
+import dataclasses
+import time
+from typing import TYPE_CHECKING
+
+import pytest
+
+from lib import ledger, outbox, pcweb
+from tests import fake_pc
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from pathlib import Path
+
+
+LOGIN = "/home/login"
+CHAT = "/socialRest/LeagueChat.aspx"
+SUBMIT = "/socialRest/LeagueSubmitChat.aspx"
+
+
+@pytest.fixture
+def server(monkeypatch: pytest.MonkeyPatch) -> Iterator[fake_pc.FakePennantChase]:
+    yield from fake_pc.serve(monkeypatch)
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = time.time()
+        self.slept: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def test_add_is_idempotent(tmp_path: Path) -> None:
+    box = outbox.SqliteOutbox(tmp_path / "outbox.db")
+    entries = [pcweb.ChatEntry("cycle", 1), pcweb.ChatEntry("no-hitter", 1)]
+    assert box.add("1000", "game1", entries) == 2
+    assert box.add("1000", "game1", entries) == 0
+    assert box.add("1000", "game2", entries[:1]) == 1
+    due = outbox.SqliteOutbox(tmp_path / "outbox.db").due(float("inf"), 10)
+    assert [item.entry for item in due] == [
+        dataclasses.replace(entries[0], game_id="game1"),
+        dataclasses.replace(entries[1], game_id="game1"),
+        dataclasses.replace(entries[0], game_id="game2"),
+    ]
+
+
+def test_drain_coalesces(server: fake_pc.FakePennantChase, tmp_path: Path) -> None:
+    box = outbox.SqliteOutbox(tmp_path / "outbox.db")
+    for i in range(15):
+        _ = box.add("1000", f"game{i}", [pcweb.ChatEntry(f"event {i}", 0)])
+    server.chat.append(("someone", fake_pc.chat_time(), "event 3"))
+    clock = Clock()
+    limiter = outbox.RateLimiter(2.0, clock=clock, sleep=clock.sleep)
+
+    result = outbox.drain(box, pcweb.SessionManager(), limiter=limiter)
+
+    assert len(result.posted) == 14
+    assert [item.game for item in result.already_sent] == ["game3"]
+    assert server.requests[LOGIN] == 1
+    assert server.requests[CHAT] == 1
+    assert server.requests[SUBMIT] == 14
+    assert clock.slept == [2.0] * 13
+    assert box.due(float("inf"), 100) == []
+
+
+def test_drain_retries(server: fake_pc.FakePennantChase, tmp_path: Path) -> None:
+    box = outbox.SqliteOutbox(tmp_path / "outbox.db")
+    _ = box.add("1000", "game", [pcweb.ChatEntry("cycle", 0)])
+    sessions = pcweb.SessionManager()
+    clock = Clock()
+    server.failing_submits = outbox.MAX_ATTEMPTS
+
+    for attempt in range(outbox.MAX_ATTEMPTS):
+        result = outbox.drain(box, sessions, clock=clock)
+        assert len(result.failed) == 1
+        assert outbox.drain(box, sessions, clock=clock).failed == []  # not yet due
+        clock.now += outbox.RETRY_DELAY * 2**attempt
+    # Given up on after MAX_ATTEMPTS.
+    assert box.due(float("inf"), 10) == []
+    assert server.chat == []
+
+
+def test_drain_recovers(server: fake_pc.FakePennantChase, tmp_path: Path) -> None:
+    box = outbox.SqliteOutbox(tmp_path / "outbox.db")
+    _ = box.add("1000", "game", [pcweb.ChatEntry("cycle", 0)])
+    clock = Clock()
+    server.failing_submits = 1
+    assert len(outbox.drain(box, pcweb.SessionManager(), clock=clock).failed) == 1
+    clock.now += outbox.RETRY_DELAY
+    assert len(outbox.drain(box, pcweb.SessionManager(), clock=clock).posted) == 1
+    assert [text for _, _, text in server.chat] == ["cycle"]
+
+
+def test_drain_lease_held(server: fake_pc.FakePennantChase, tmp_path: Path) -> None:
+    box = outbox.SqliteOutbox(tmp_path / "outbox.db")
+    entry = pcweb.ChatEntry("cycle", 0)
+    _ = box.add("1000", "game", [entry])
+    book = ledger.SqliteLedger()
+    key = ledger.key("1000", "game", pcweb.chat_key(entry))
+    assert book.acquire(key, "someone", time.time())
+    result = outbox.drain(box, pcweb.SessionManager(), ledger=book)
+    assert len(result.failed) == 1
+    assert server.chat == []
@@ -0,0 +1,232 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+import requests
+
+from lib import ledger, pcweb
+from tests import fake_pc
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+LOGIN = "/home/login"
+CHAT = "/socialRest/LeagueChat.aspx"
+SUBMIT = "/socialRest/LeagueSubmitChat.aspx"
+
+
+@pytest.fixture
+def server(monkeypatch: pytest.MonkeyPatch) -> Iterator[fake_pc.FakePennantChase]:
+    yield from fake_pc.serve(monkeypatch)
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = time.time()
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_login(server: fake_pc.FakePennantChase) -> None:
+    session = pcweb.login("1000")
+    # The league home page is fetched with the cookies the login set.
+    assert server.home_cookies == [{"session": session.cookies["session"]}]
+    assert session.cookies["session"] in server.tokens
+    assert session.cookies["lgid"] == "1000"
+
+
+def test_session_reused(server: fake_pc.FakePennantChase) -> None:
+    clock = Clock()
+    sessions = pcweb.SessionManager(max_age=60, clock=clock)
+    pc = sessions.get("1000")
+    pc.league_chat(pcweb.ChatEntry("one", 0))
+    sessions.get("1000").league_chat(pcweb.ChatEntry("two", 0))
+    assert server.requests[LOGIN] == 1
+    assert [text for _, _, text in server.chat] == ["one", "two"]
+
+    clock.now += 61
+    _ = sessions.get("1000")
+    assert server.requests[LOGIN] == 2
+
+
+def test_session_store(server: fake_pc.FakePennantChase, tmp_path: Path) -> None:
+    store = pcweb.FileSessionStore(tmp_path)
+    _ = pcweb.SessionManager(store=store).get("1000")
+    pc = pcweb.SessionManager(store=store).get("1000")
+    pc.league_chat(pcweb.ChatEntry("hi", 0))
+    assert server.requests[LOGIN] == 1
+    assert (tmp_path / (pcweb.SESSION_OBJECT_FMT % "1000")).stat().st_mode & 0o077 == 0
+
+
+def test_relogin_once(server: fake_pc.FakePennantChase, tmp_path: Path) -> None:
+    store = pcweb.FileSessionStore(tmp_path)
+    sessions = pcweb.SessionManager(store=store)
+    pc = sessions.get("1000")
+    server.tokens.clear()  # the site forgets the session
+    pc.league_chat(pcweb.ChatEntry("hi", 0))
+    assert server.requests[LOGIN] == 2
+    assert server.chat[-1][2] == "hi"
+    # The new session replaced the stale one everywhere.
+    assert store.load("1000") == pc.session
+    sessions.get("1000").league_chat(pcweb.ChatEntry("again", 0))
+    assert server.requests[LOGIN] == 2
+
+
+def test_shared_relogin(server: fake_pc.FakePennantChase) -> None:
+    sessions = pcweb.SessionManager()
+    pc = sessions.get("1000")
+    assert sessions.get("1000") is pc
+    server.tokens.clear()
+
+    def post(i: int) -> None:
+        pc.league_chat(pcweb.ChatEntry(f"message {i}", 0))
+
+    with ThreadPoolExecutor(8) as pool:
+        _ = list(pool.map(post, range(8)))
+    # Threads rejected together logged in again only once between them.
+    assert server.requests[LOGIN] == 2
+    assert len(server.chat) == 8
+    assert sessions.get("1000") is pc
+
+
+def test_relogin_fails(
+    server: fake_pc.FakePennantChase, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    pc = pcweb.SessionManager().get("1000")
+    monkeypatch.setattr(server, "tokens", set[str]())
+
+    def bad_login(league_id: str) -> pcweb.Session:
+        return pcweb.Session(league_id, {}, 0.0)
+
+    monkeypatch.setattr(pcweb, "login", bad_login)
+    with pytest.raises(pcweb.AuthError):
+        pc.league_chat(pcweb.ChatEntry("hi", 0))
+    assert server.chat == []
+
+
+def test_league_chat_many(server: fake_pc.FakePennantChase) -> None:
+    pc = pcweb.SessionManager().get("1000")
+    server.chat.append(("someone", fake_pc.chat_time(), "old news\xa0\xa0"))
+    entries = [
+        pcweb.ChatEntry("old news", 2),
+        pcweb.ChatEntry("no-hitter & more", 1),
+        pcweb.ChatEntry("old news", 3),
+        pcweb.ChatEntry("cycle", 0),
+        pcweb.ChatEntry("cycle", 0),
+    ]
+    server.requests.clear()
+
+    posted = pc.league_chat_many(entries)
+
+    assert posted == [entries[1], entries[2], entries[3]]
+    # One chat fetch and one submit per new message, rather than a fetch and a
+    # submit per entry.
+    assert server.requests[CHAT] == 1
+    assert server.requests[SUBMIT] == len(posted)
+    assert pc.chat_index() >= {"no-hitter & more\xa0", "old news\xa0\xa0\xa0", "cycle"}
+    assert pc.league_chat_many(entries) == []
+
+
+def test_chat_window(server: fake_pc.FakePennantChase) -> None:
+    pc = pcweb.SessionManager().get("1000")
+    long_ago = datetime.now(tz=UTC) - timedelta(days=30)
+    server.chat.append(("someone", fake_pc.chat_time(long_ago), "stale"))
+    server.chat.append(("someone", fake_pc.chat_time(), "fresh"))
+    entries = [pcweb.ChatEntry("stale", 0), pcweb.ChatEntry("fresh", 0)]
+    assert pc.league_chat_many(entries, timedelta(days=14)) == [entries[0]]
+    assert pc.league_chat_many(entries, None) == []
+
+
+def test_parse_chat() -> None:
+    server = fake_pc.FakePennantChase()
+    try:
+        server.chat = [
+            ("a", "10/01/2026 09:30:00 AM", "first & last\xa0"),
+            ("b", "10/02/2026 01:15:00 PM", "second"),
+        ]
+        page = server.chat_page()
+    finally:
+        server.server_close()
+    assert list(pcweb.parse_chat(page)) == [
+        pcweb.ChatLine("b", datetime(2026, 10, 2, 13, 15, tzinfo=UTC), "second"),
+        pcweb.ChatLine(
+            "a", datetime(2026, 10, 1, 9, 30, tzinfo=UTC), "first & last\xa0"
+        ),
+    ]
+    since = datetime(2026, 10, 2, tzinfo=UTC)
+    assert pcweb.recent_chat_keys(page, since) == {"second"}
+    # Oldest first: no early stop, so nothing recent is missed.
+    ascending = page.replace("<div", "\n<div").splitlines()
+    page = ascending[0] + "".join(reversed(ascending[1:]))
+    assert pcweb.recent_chat_keys(page, since) == {"second"}
+    assert pcweb.recent_chat_keys("<p>no times</p>", since) is None
+
+
+def test_shared_node_chat_window() -> None:
+    page = Path("testdata/league_chat_shared_node.html").read_text()
+    no_hitter = "Brewers: W.Hess  threw a no-hitter against the Nationals! [Day 12]"
+    lines = list(pcweb.parse_chat(page))
+    assert [line.author for line in lines] == ["thromer", "someone", "thromer"]
+    assert lines[0] == pcweb.ChatLine(
+        "thromer", datetime(2026, 10, 18, 12, 0, 5, tzinfo=UTC), no_hitter + "\xa0" * 2
+    )
+    since = datetime(2026, 10, 18, tzinfo=UTC)
+    assert pcweb.recent_chat_keys(page, since) == {
+        no_hitter + "\xa0" * 2,
+        "O'Neil & co. swept the Cubs",
+    }
+
+
+def test_shared_node_chat(server: fake_pc.FakePennantChase) -> None:
+    # Each line's author, time and message in one element.
+    server.page = Path("testdata/league_chat_shared_node.html").read_text()
+    keys = pcweb.chat_keys(server.page)
+    no_hitter = "Brewers: W.Hess  threw a no-hitter against the Nationals! [Day 12]"
+    assert pcweb.chat_key(pcweb.ChatEntry(no_hitter, 2)) in keys
+    assert "O'Neil & co. swept the Cubs" in keys
+    # The NBSPs tell years apart, and a message must be a whole message.
+    assert pcweb.chat_key(pcweb.ChatEntry(no_hitter, 1)) not in keys
+    assert "Brewers: W.Hess" not in keys
+    pc = pcweb.SessionManager().get("1000")
+    entries = [pcweb.ChatEntry(no_hitter, 2), pcweb.ChatEntry("Something new", 2)]
+    # The whole chat, as the page's times are fixed.
+    assert pc.league_chat_many(entries, None) == [entries[1]]
+    assert server.requests["/socialRest/LeagueSubmitChat.aspx"] == 1
+
+
+def test_ledger(server: fake_pc.FakePennantChase) -> None:
+    pc = pcweb.SessionManager().get("1000")
+    book = ledger.SqliteLedger()
+    entries = [pcweb.ChatEntry("cycle", 0, "game"), pcweb.ChatEntry("slam", 0, "game")]
+    assert pc.league_chat_many(entries, ledger=book) == entries
+    server.requests.clear()
+
+    # A redelivery is answered from the ledger alone.
+    assert pc.league_chat_many(entries, ledger=book) == []
+    assert server.requests == {}
+
+    # Another poster holds the lease on a new entry, so it isn't posted here.
+    other = pcweb.ChatEntry("no-hitter", 0, "game")
+    assert book.acquire(
+        ledger.key("1000", "game", pcweb.chat_key(other)), "someone", time.time()
+    )
+    assert pc.league_chat_many([other], ledger=book) == []
+    assert server.requests == {}
+    assert [text for _, _, text in server.chat] == ["cycle", "slam"]
+
+
+def test_ledger_release(server: fake_pc.FakePennantChase) -> None:
+    pc = pcweb.SessionManager().get("1000")
+    book = ledger.SqliteLedger()
+    entry = pcweb.ChatEntry("cycle", 0, "game")
+    server.failing_submits = 1
+    with pytest.raises(requests.HTTPError):
+        _ = pc.league_chat_many([entry], ledger=book)
+    # The failed attempt gave up its lease, so a retry needn't wait for it.
+    assert pc.league_chat_many([entry], ledger=book) == [entry]
@@ -0,0 +1,68 @@
+import itertools
+import pstats
+from typing import TYPE_CHECKING
+
+import pytest
+
+from lib import profiling
+
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+@pytest.fixture
+def dest(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr(profiling, "every", 0)
+    monkeypatch.setattr(profiling, "dest", str(tmp_path))
+    monkeypatch.setattr(profiling, "_requests", itertools.count())
+    return tmp_path
+
+
+def test_wanted(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(profiling, "_requests", itertools.count())
+    monkeypatch.setattr(profiling, "every", None)
+    assert not profiling.wanted("1")
+    monkeypatch.setattr(profiling, "every", 0)
+    assert not profiling.wanted()
+    assert profiling.wanted("1")
+    monkeypatch.setattr(profiling, "every", 3)
+    assert [profiling.wanted() for _ in range(6)] == [True, False, False] * 2
+    assert profiling.wanted("1")
+
+
+def allocate() -> list[bytearray]:
+    return [bytearray(1000) for _ in range(100)]
+
+
+def test_request(dest: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    with profiling.request("work"):
+        pass
+    assert list(dest.iterdir()) == []
+    with profiling.request("work", "1"):
+        kept = allocate()
+    assert kept
+    [stats_path] = dest.glob("*-work-*.pstats")
+    stats = pstats.Stats(str(stats_path)).get_stats_profile()
+    assert "allocate" in stats.func_profiles
+    [allocations] = dest.glob("*-work-*.allocations.txt")
+    assert "test_profiling.py" in allocations.read_text()
+    assert f"to {stats_path}" in capsys.readouterr().out
+
+
+def test_one_at_a_time(dest: Path) -> None:
+    with profiling.profile("outer"), profiling.profile("inner"):
+        pass
+    assert [p.name.split("-")[1] for p in dest.iterdir()] == ["outer", "outer"]
+
+
+def test_write_failure(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+) -> None:
+    # A file where the directory should be.
+    blocked = tmp_path / "blocked"
+    _ = blocked.write_text("")
+    monkeypatch.setattr(profiling, "dest", str(blocked / "profiles"))
+    with profiling.profile("work"):
+        pass
+    assert "failed to save profile of work" in capsys.readouterr().out
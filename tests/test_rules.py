@@ -0,0 +1,65 @@
+from dataclasses import dataclass
+
+import pytest
+
+from lib import rules
+
+
+@dataclass
+class Line:
+    Name: str
+    H: int
+    HR: int
+
+
+FIELDS = ["Name", "H", "HR"]
+RULES = [
+    rules.Rule("hits", "H >= 3", "{Name}: {H} hits", screen="H >= 3"),
+    rules.Rule("homers", "HR > 1 and H > 1", "{Name}: {HR} {{HR}}", screen="HR >= 2"),
+    rules.Rule("big homers", "HR >= 4", "{Name} x4", screen="HR >= 4"),
+    rules.Rule("hitless", "H == 0", "{Name} hitless", screen="H == 0"),
+]
+
+
+@pytest.mark.parametrize(
+    ("line", "expected"),
+    [
+        (Line("A", 1, 0), []),
+        (Line("B", 0, 0), ["B hitless"]),
+        (Line("C", 3, 1), ["C: 3 hits"]),
+        (Line("D", 2, 2), ["D: 2 {HR}"]),
+        (Line("E", 5, 5), ["E: 5 hits", "E: 5 {HR}", "E x4"]),
+    ],
+)
+def test_detector(line: Line, expected: list[str]) -> None:
+    detect = rules.compile_detector(RULES, FIELDS)
+    messages: list[str] = []
+    detect(line, messages)
+    assert messages == expected
+
+
+@pytest.mark.parametrize(
+    ("row", "expected"),
+    [(["A", "1", "1"], False), (["B", "0", "1"], True), (["C", "1", "2"], True)],
+)
+def test_screen(row: list[str], expected: bool) -> None:  # noqa: FBT001
+    screen = rules.compile_screen(RULES, ["H", "HR"])
+    assert screen(row, {"H": 1, "HR": 2}) is expected
+
+
+def test_screen_missing() -> None:
+    screen = rules.compile_screen([*RULES, rules.Rule("any", "H > 0", "{Name}")], [])
+    assert screen([], {})
+
+
+@pytest.mark.parametrize(
+    "rule",
+    [
+        rules.Rule("bad field", "RBI > 3", "{Name}"),
+        rules.Rule("bad message", "H > 3", "{Nickname}"),
+        rules.Rule("bad syntax", "H >", "{Name}"),
+    ],
+)
+def test_rule_errors(rule: rules.Rule) -> None:
+    with pytest.raises(rules.RuleError, match=rule.name):
+        _ = rules.compile_detector([rule], FIELDS)
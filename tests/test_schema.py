@@ -0,0 +1,62 @@
+from dataclasses import asdict, dataclass, field
+
+import pytest
+
+from lib import analyze, schema
+
+
+@dataclass
+class Line:
+    Name: str
+    H: int
+    Double: int = field(metadata={schema.COLUMN: "2B"})
+    XBH: int = field(metadata={schema.DERIVED: "Double + HR"})
+    HR: int
+    SF: int
+
+
+HEADERS = ("Player", "H", "SF", "2B", "HR", "H")
+
+
+def test_decoder() -> None:
+    decode = schema.compile_decoder(Line, HEADERS)
+    line: Line = decode(["x", "9", "1", "2", "3", "4"], Name="A")
+    # The last of the repeated H columns wins.
+    assert asdict(line) == {
+        "Name": "A",
+        "H": 4,
+        "Double": 2,
+        "XBH": 5,
+        "HR": 3,
+        "SF": 1,
+    }
+    assert schema.compile_decoder(Line, HEADERS) is decode
+
+
+def test_decoder_missing_column() -> None:
+    with pytest.raises(schema.SchemaError, match="'SF'"):
+        _ = schema.compile_decoder(Line, ("Player", "H", "2B", "HR"))
+
+
+def test_totaler() -> None:
+    total = schema.compile_totaler(Line)
+    assert total([Line("A", 1, 0, 1, 1, 0), Line("B", 2, 1, 1, 0, 1)]) == Line(
+        "", 3, 1, 2, 1, 1
+    )
+
+
+def test_direct_columns() -> None:
+    assert schema.direct_columns(Line) == ["H", "HR", "SF"]
+
+
+@pytest.mark.parametrize(
+    ("raw_ip", "outs"), [("0.0", 0), ("6.1", 19), ("9.2", 29), ("10.0.", 30)]
+)
+def test_ip_to_outs(raw_ip: str, outs: int) -> None:
+    assert analyze.ip_to_outs(raw_ip) == outs
+
+
+@pytest.mark.parametrize("raw_ip", ["", "6", ".1", "6.", "6.12", "6.x", "a.1"])
+def test_ip_to_outs_bad(raw_ip: str) -> None:
+    with pytest.raises(analyze.BoxscoreError):
+        _ = analyze.ip_to_outs(raw_ip)
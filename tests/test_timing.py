@@ -0,0 +1,72 @@
+import json
+import time
+from typing import cast
+
+import pytest
+
+from lib import timing
+
+
+@pytest.fixture
+def metrics(monkeypatch: pytest.MonkeyPatch) -> timing.Metrics:
+    monkeypatch.setattr(timing, "enabled", True)
+    monkeypatch.setattr(timing, "metrics", timing.Metrics())
+    return timing.metrics
+
+
+def test_disabled(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(timing, "enabled", False)
+    with timing.request("work") as trace:
+        assert trace is None
+        with timing.span("stage") as span:
+            assert span is None
+        timing.note(bytes=1)
+
+
+def test_request(metrics: timing.Metrics, capsys: pytest.CaptureFixture[str]) -> None:
+    with timing.request("work") as trace:
+        assert trace is not None
+        for _ in range(2):
+            with timing.span("nap"):
+                time.sleep(0.01)
+        timing.note(bytes=123, hit=False)
+    line = cast(dict[str, object], json.loads(capsys.readouterr().out))
+    assert line["request"] == "work"
+    assert line["bytes"] == 123
+    assert line["hit"] is False
+    stages_ms = cast(dict[str, float], line["stages_ms"])
+    assert list(stages_ms) == ["nap"]
+    assert 20 <= stages_ms["nap"] <= cast(float, line["total_ms"])
+    # Nothing is timed outside a request.
+    with timing.span("nap"):
+        pass
+    assert list(trace.stages) == ["nap"]
+    assert 'pc_stage_seconds_count{request="work",stage="nap"} 1' in (
+        metrics.exposition()
+    )
+
+
+def test_request_error(
+    metrics: timing.Metrics, capsys: pytest.CaptureFixture[str]
+) -> None:
+    with pytest.raises(ValueError, match=r"^$"), timing.request("work"):
+        raise ValueError
+    line = cast(dict[str, object], json.loads(capsys.readouterr().out))
+    assert line["error"] == "ValueError"
+    assert 'request="work",stage="total"' in metrics.exposition()
+
+
+def test_histogram() -> None:
+    h = timing.Histogram((0.1, 1))
+    for seconds in (0.05, 0.1, 0.5, 2):
+        h.observe(seconds)
+    assert h.counts == [2, 1, 1]
+    assert h.count == 4
+    metrics = timing.Metrics()
+    trace = timing.Trace("work", {"stage": 0.5})
+    metrics.observe(trace, 2)
+    text = metrics.exposition()
+    assert 'pc_stage_seconds_bucket{request="work",stage="stage",le="0.5"} 1' in text
+    assert 'pc_stage_seconds_bucket{request="work",stage="total",le="1"} 0' in text
+    assert 'pc_stage_seconds_bucket{request="work",stage="total",le="+Inf"} 1' in text
+    assert 'pc_stage_seconds_sum{request="work",stage="total"} 2' in text
@@ -0,0 +1,60 @@
+import json
+
+from lib import trace
+
+
+def test_metadata_round_trip() -> None:
+    game = trace.Trace("abc")
+    game.mark("written", 100.0)
+    game.mark("fetching", 101.25)
+    metadata = game.to_metadata()
+    assert metadata == {
+        "trace_id": "abc",
+        "trace_hops": "written=100.000,fetching=101.250",
+    }
+    assert trace.Trace.from_metadata(metadata) == game
+    assert trace.Trace.from_metadata({"day": "1"}) is None
+    # A garbled hop is dropped, not fatal.
+    garbled = {"trace_id": "abc", "trace_hops": "written=x,fetching=2"}
+    assert trace.Trace.from_metadata(garbled) == trace.Trace("abc", {"fetching": 2.0})
+
+
+def test_latencies() -> None:
+    # No "analyzed": store-in-gcs analyzes before it uploads.
+    hops = {"sent": 7.0, "written": 1.0, "fetching": 3.0, "uploading": 4.0}
+    assert trace.Trace("abc", hops).latencies() == {
+        "written>fetching": 2.0,
+        "fetching>uploading": 1.0,
+        "uploading>sent": 3.0,
+        "total": 6.0,
+    }
+    assert trace.Trace("abc", {"sent": 7.0}).latencies() == {}
+
+
+def test_read_log() -> None:
+    first = trace.Trace("a", {"written": 1.0, "sent": 3.0})
+    second = trace.Trace("b", {"received": 1.0, "analyzed": 2.0, "sent": 2.5})
+    lines = [
+        "Processing box score",
+        first.log_line(),
+        second.log_line(),
+        # A redelivered event's trace is only counted once.
+        trace.Trace("a", {"written": 1.0, "sent": 9.0}).log_line(),
+    ]
+    assert trace.read_log("\n".join(lines)) == [first, second]
+    exported = [{"jsonPayload": json.loads(second.log_line())}, {"textPayload": "x"}]
+    assert trace.read_log(json.dumps(exported)) == [second]
+    assert trace.latencies_by_hop([first, second]) == {
+        "written>sent": [2.0],
+        "received>analyzed": [1.0],
+        "analyzed>sent": [0.5],
+        "total": [1.5, 2.0],
+    }
+
+
+def test_percentile() -> None:
+    values = [float(i) for i in range(1, 101)]
+    assert trace.percentile(values, 50) == 50
+    assert trace.percentile(values, 99) == 99
+    assert trace.percentile(values, 100) == 100
+    assert trace.percentile([5.0], 0) == 5
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+"""Report how long games take to get from each hop of the pipeline to the next.
+
+Reads the trace lines that process-box-score and store-in-gcs log (see
+lib/trace.py) from the given files, or stdin, and prints latency
+percentiles for each hop and for the whole trip. Either service's raw
+output or a gcloud export works, e.g.
+
+  gcloud logging read 'jsonPayload.trace_id:*' --freshness=7d --format=json |
+      ./trace-report.py
+"""
+
+import argparse
+import sys
+from pathlib import Path
+from typing import cast
+
+from lib import trace
+
+
+PERCENTILES = (50, 90, 99)
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    _ = p.add_argument("logs", nargs="*", type=Path, help="log files (default: stdin)")
+    args = p.parse_args()
+    paths = cast(list[Path], args.logs)
+    texts = [path.read_text() for path in paths] if paths else [sys.stdin.read()]
+    traces = [t for text in texts for t in trace.read_log(text)]
+    if not traces:
+        print("no traces found", file=sys.stderr)
+        return 1
+    by_hop = trace.latencies_by_hop(traces)
+    header = "".join(f"{f'p{q} s':>9}" for q in PERCENTILES)
+    print(f"{'hop':<20} {'n':>5}{header} {'max s':>8}")
+    for hop, seconds in by_hop.items():
+        cells = "".join(f"{trace.percentile(seconds, q):>9.2f}" for q in PERCENTILES)
+        print(f"{hop:<20} {len(seconds):>5}{cells} {seconds[-1]:>8.2f}")
+    print(f"{len(traces)} traces")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())